@@ -0,0 +1,237 @@
+"""
+Admission Control - sheds load before it piles up behind the database
+Routes that need the database are put in a route class (orders, reporting
+or exports), and each class may only run `limit` requests at once per
+worker. A request that finds its class full waits up to the class's queue
+budget for a slot and is then turned away with a fast 503 and Retry-After,
+so at lunchtime a slow database costs customers a quick retry instead of
+holding every gunicorn thread. Routes in no class (the menu, static pages,
+the cached home page) are never held up
+
+Classes have a priority: while an order is waiting for a slot, no new
+reporting request is admitted, so /history and /analytics give way to
+order submission. A class can reserve a few slots that priority never
+holds back, so a steady stream of orders can't starve reporting entirely. Exports and the archive report have their own class, so
+a long streamed download never takes the history page's slots. Time a request already spent queued in front of the app
+(the X-Request-Start header set by Render/Heroku routers or nginx) counts
+against its budget. On top of the per-class limits, all classes together
+share a worker-wide thread_limit (GUNICORN_THREADS - 1 by default), which is
+what keeps a thread free for the menu. In-app order streams are a class
+too, since each one holds a thread for minutes.
+"""
+
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+import metrics
+
+
+ORDERS = 'orders'
+REPORTING = 'reporting'
+EXPORTS = 'exports'
+STREAMS = 'streams'
+
+admissions = metrics.registry.counter(
+    'lunchmenu_admission_total', 'Requests by route class and admission outcome', ('route_class', 'outcome'))
+queue_wait = metrics.registry.histogram(
+    'lunchmenu_admission_wait_seconds', 'Time requests waited for an admission slot', ('route_class',))
+
+
+class Rejected(Exception):
+    """Raised when a request can't be admitted; reason is 'queue_full' or 'timeout'"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RouteClass:
+    """Concurrency limit, queue budget and priority (lower goes first) for a group of routes
+
+    The first `reserved` requests running in the class are admitted even
+    while a higher-priority class is waiting.
+    """
+
+    def __init__(self, name, limit, queue_seconds, priority, max_queue, retry_after, reserved=0):
+        self.name = name
+        self.limit = limit
+        self.reserved = min(reserved, limit)
+        self.queue_seconds = queue_seconds
+        self.priority = priority
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+
+
+class AdmissionController:
+    """Admits requests to route classes, sharing one condition so priorities can be honoured"""
+
+    def __init__(self):
+        self.enabled = False
+        self.classes = {}
+        # Requests of every class running at once (None: only the class limits apply)
+        self.thread_limit = None
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def configure(self, name, limit, queue_seconds, priority, max_queue, retry_after=1, reserved=0):
+        with self._condition:
+            self.classes[name] = RouteClass(name, max(1, limit), queue_seconds, priority, max_queue, retry_after,
+                                            reserved)
+
+    def _admissible(self, route_class):
+        if route_class.active >= route_class.limit:
+            return False
+        if self.thread_limit is not None:
+            # Threads are held back for other classes' reserved slots while they have requests waiting
+            held = sum(min(other.waiting, other.reserved - other.active) for other in self.classes.values()
+                       if other is not route_class and other.active < other.reserved)
+            if self.active + held >= self.thread_limit:
+                return False
+        if route_class.active < route_class.reserved:
+            return True
+        return not any(other.waiting for other in self.classes.values() if other.priority < route_class.priority)
+
+    def acquire(self, name, already_waited=0.0):
+        """Take a slot in a route class, returning seconds waited or raising Rejected
+
+        already_waited is time the request spent queued before reaching the
+        app; a request that used up its budget there is rejected straight
+        away, since a backlog that long means the worker is overloaded.
+        """
+        route_class = self.classes[name]
+        if already_waited >= route_class.queue_seconds:
+            raise Rejected('timeout')
+        started = time.monotonic()
+        deadline = started + route_class.queue_seconds - already_waited
+        with self._condition:
+            if self._admissible(route_class):
+                route_class.active += 1
+                self.active += 1
+                return 0.0
+            if route_class.waiting >= route_class.max_queue:
+                raise Rejected('queue_full')
+            route_class.waiting += 1
+            try:
+                while not self._admissible(route_class):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected('timeout')
+                    self._condition.wait(remaining)
+                route_class.active += 1
+                self.active += 1
+            finally:
+                route_class.waiting -= 1
+                # Lower-priority requests may have been held back by this one
+                self._condition.notify_all()
+        return time.monotonic() - started
+
+    def release(self, name):
+        with self._condition:
+            self.classes[name].active -= 1
+            self.active -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        """Return {route_class: counters} as a dictionary"""
+        with self._condition:
+            return {name: {'active': route_class.active, 'waiting': route_class.waiting,
+                           'limit': route_class.limit, 'queue_ms': round(route_class.queue_seconds * 1000),
+                           'max_queue': route_class.max_queue, 'priority': route_class.priority,
+                           'reserved': route_class.reserved}
+                    for name, route_class in self.classes.items()}
+
+
+controller = AdmissionController()
+
+
+def upstream_wait(header):
+    """Seconds since the router stamped X-Request-Start (t=<sec|ms|us>), or 0 if unknown"""
+    if not header:
+        return 0.0
+    try:
+        stamp = float(header.split('=', 1)[-1])
+    except ValueError:
+        return 0.0
+    # Routers send seconds, milliseconds or microseconds since the epoch
+    if stamp > 1e14:
+        stamp /= 1e6
+    elif stamp > 1e11:
+        stamp /= 1e3
+    return max(0.0, time.time() - stamp)
+
+
+def busy_response(route_class):
+    """The fast 503 for a request that wasn't admitted"""
+    message = "We're very busy right now - please try again in a moment."
+    if request.path.startswith('/api/') or request.is_json:
+        response = jsonify({'error': 'Too busy, try again'})
+    else:
+        response = make_response(message)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(route_class.retry_after)
+    return response
+
+
+def admit(name):
+    """Run the route only once its route class has a free slot; answer 503 if none frees up in time"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not controller.enabled or name not in controller.classes:
+                return view(*args, **kwargs)
+            try:
+                waited = controller.acquire(name, upstream_wait(request.headers.get('X-Request-Start')))
+            except Rejected as e:
+                admissions.inc(1, name, e.reason)
+                return busy_response(controller.classes[name])
+            admissions.inc(1, name, 'admitted')
+            queue_wait.observe(waited, name)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                controller.release(name)
+                raise
+            if response.is_streamed:
+                # Streamed bodies (exports) keep using the database until the client has them
+                response.call_on_close(lambda: controller.release(name))
+            else:
+                controller.release(name)
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Configure the route classes from app.config and register their gauges"""
+    controller.enabled = app.config['ADMISSION_CONTROL']
+    controller.thread_limit = app.config['ADMISSION_THREAD_LIMIT']
+    controller.configure(ORDERS, app.config['ADMISSION_ORDER_LIMIT'], app.config['ADMISSION_ORDER_QUEUE_MS'] / 1000,
+                         priority=0, max_queue=app.config['ADMISSION_MAX_QUEUE'],
+                         retry_after=app.config['ADMISSION_RETRY_AFTER'])
+    controller.configure(REPORTING, app.config['ADMISSION_REPORTING_LIMIT'],
+                         app.config['ADMISSION_REPORTING_QUEUE_MS'] / 1000,
+                         priority=1, max_queue=app.config['ADMISSION_MAX_QUEUE'],
+                         retry_after=app.config['ADMISSION_RETRY_AFTER'] * 5,
+                         reserved=app.config['ADMISSION_REPORTING_RESERVED'])
+    controller.configure(EXPORTS, app.config['ADMISSION_EXPORT_LIMIT'],
+                         app.config['ADMISSION_REPORTING_QUEUE_MS'] / 1000,
+                         priority=2, max_queue=app.config['ADMISSION_MAX_QUEUE'],
+                         retry_after=app.config['ADMISSION_RETRY_AFTER'] * 5)
+    # Streams come last: they only start when nothing else is waiting
+    controller.configure(STREAMS, app.config['ORDER_FEED_MAX_SUBSCRIBERS'],
+                         app.config['ADMISSION_REPORTING_QUEUE_MS'] / 1000,
+                         priority=3, max_queue=app.config['ADMISSION_MAX_QUEUE'],
+                         retry_after=app.config['ADMISSION_RETRY_AFTER'] * 5)
+    metrics.registry.gauge('lunchmenu_admission_active', 'Admitted requests running in every route class',
+                           lambda: controller.active)
+    for name in (ORDERS, REPORTING, EXPORTS, STREAMS):
+        metrics.registry.gauge(f'lunchmenu_admission_{name}_active', f'{name.capitalize()} requests running',
+                               lambda name=name: controller.classes[name].active)
+        metrics.registry.gauge(f'lunchmenu_admission_{name}_waiting', f'{name.capitalize()} requests waiting for a slot',
+                               lambda name=name: controller.classes[name].waiting)
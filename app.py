@@ -3,56 +3,267 @@ Flask Web Application for Lunch Offer Menu - PROFESSIONAL WEBSITE
 Multi-page website with homepage, menu, locations, about, and admin features
 """
 
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, abort, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
-from functools import wraps
-from collections import defaultdict
+from sqlalchemy import and_, case, func, or_, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateIndex
+from werkzeug.security import safe_join
+import click
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
+from collections import deque
+import atexit
+import base64
+import csv
+import hashlib
+import io
+import json
+import math
 import secrets
 import os
+import tempfile
+import threading
+
+import admission
+import metrics
+import read_replica
+from menu_cache import MenuCache
+from order_archive import ArchiveUnavailable, OrderArchive, from_epoch_day, require_numpy
+from order_feed import OrderFeed
+from order_queue import QueueFullError, WriteBehindQueue
+from page_cache import PageCache
+from result_cache import TTLCache
+from pricing import LUNCH_OFFER_PRICE, UnknownItemError, deal_price, to_pence
+from profiler import RequestProfiler
+import promotions
 
 # Create Flask application
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+# Set SECRET_KEY in production so admin sessions work across all workers and restarts
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(16)
 
 # CONFIGURATION
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
 BUSINESS_NAME = "Fresh Bites Café"
 BUSINESS_TAGLINE = "Delicious Lunch Deals, Every Day"
 
+# Store locations - you can customize these (promotion rules can be limited to one of them)
+STORE_LOCATIONS = [
+    {
+        'name': 'City Centre',
+        'address': '123 High Street, London, EC1A 1BB',
+        'phone': '020 1234 5678',
+        'hours': 'Mon-Fri: 7am-6pm, Sat: 8am-4pm, Sun: Closed'
+    },
+    {
+        'name': 'Riverside',
+        'address': '45 River Walk, London, SE1 9PP',
+        'phone': '020 8765 4321',
+        'hours': 'Mon-Fri: 7am-6pm, Sat: 8am-4pm, Sun: Closed'
+    },
+    {
+        'name': 'Business District',
+        'address': '78 Corporate Plaza, London, EC2M 7PP',
+        'phone': '020 5555 6789',
+        'hours': 'Mon-Fri: 6:30am-7pm, Sat-Sun: Closed'
+    }
+]
+
 # DATABASE CONFIGURATION
-if os.environ.get('DATABASE_URL'):
-    database_url = os.environ.get('DATABASE_URL')
+def driver_url(database_url):
+    """Point postgres:// URLs (as Render gives them) at the pg8000 driver"""
     if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql+pg8000://', 1)
-    elif database_url.startswith('postgresql://'):
-        database_url = database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+        return database_url.replace('postgres://', 'postgresql+pg8000://', 1)
+    if database_url.startswith('postgresql://'):
+        return database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
+    return database_url
+
+
+if os.environ.get('DATABASE_URL'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = driver_url(os.environ.get('DATABASE_URL'))
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///orders.db'
 
+# READ REPLICA (optional): history, analytics and export read orders from here.
+# A session that wrote in the last DATABASE_REPLICA_LAG_WINDOW seconds keeps
+# reading the primary so it sees its own changes.
+if os.environ.get('DATABASE_REPLICA_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {read_replica.REPLICA_BIND: driver_url(os.environ['DATABASE_REPLICA_URL'])}
+app.config['DATABASE_REPLICA_LAG_WINDOW'] = float(os.environ.get('DATABASE_REPLICA_LAG_WINDOW', 10))
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Initialize database
-db = SQLAlchemy(app)
+# CONNECTION POOL
+# Pool checkouts are timed for /metrics. In-memory SQLite can't use a QueuePool.
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    is_postgres = app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': metrics.TimedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        # Fail fast instead of queueing for the default 30s when the pool is exhausted
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        # Replace connections before the server or a proxy drops them as idle
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        # Check connections are alive on checkout (one round trip); on by default for PostgreSQL
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1' if is_postgres else '0') == '1',
+    }
+
+# Bearer token that lets a Prometheus scraper read /metrics without an admin session
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# How often (seconds) each worker re-checks the shared menu version
+app.config['MENU_VERSION_CHECK_INTERVAL'] = float(os.environ.get('MENU_VERSION_CHECK_INTERVAL', 2.0))
+
+# HTTP caching: browser max-age for cacheable pages and for /static files
+app.config['PAGE_CACHE_MAX_AGE'] = int(os.environ.get('PAGE_CACHE_MAX_AGE', 300))
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+# Seconds the batched analytics dashboard result is reused (dropped early on new orders)
+app.config['ANALYTICS_CACHE_TTL'] = float(os.environ.get('ANALYTICS_CACHE_TTL', 30))
+
+# Order history pagination
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+app.config['HISTORY_MAX_PAGE_SIZE'] = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 500))
+
+# Quotes: largest menu (sandwiches x crisps x snacks) priced in advance, and
+# the most baskets one /api/quote call may price
+app.config['QUOTE_TABLE_MAX_COMBINATIONS'] = int(os.environ.get('QUOTE_TABLE_MAX_COMBINATIONS', 100000))
+app.config['QUOTE_MAX_BASKETS'] = int(os.environ.get('QUOTE_MAX_BASKETS', 500))
+
+# The store this deployment prices orders for (promotion rules can be limited
+# to one location); blank means only rules for every location apply
+app.config['STORE_LOCATION'] = os.environ.get('STORE_LOCATION', '')
+
+# Order durability: 'sync' commits each order before responding, 'write-behind'
+# queues orders in memory and commits them in batches from a background thread
+app.config['ORDER_DURABILITY'] = os.environ.get('ORDER_DURABILITY', 'sync')
+app.config['ORDER_QUEUE_SIZE'] = int(os.environ.get('ORDER_QUEUE_SIZE', 1000))
+app.config['ORDER_QUEUE_TIMEOUT'] = float(os.environ.get('ORDER_QUEUE_TIMEOUT', 0.5))
+app.config['ORDER_BATCH_SIZE'] = int(os.environ.get('ORDER_BATCH_SIZE', 50))
+app.config['ORDER_FLUSH_INTERVAL_MS'] = int(os.environ.get('ORDER_FLUSH_INTERVAL_MS', 100))
+app.config['ORDER_ID_BLOCK_SIZE'] = int(os.environ.get('ORDER_ID_BLOCK_SIZE', 100))
+
+# JSON order API: most orders per POST /api/orders, and how long an
+# Idempotency-Key (and the response it replays) is kept
+app.config['ORDER_API_MAX_BATCH'] = int(os.environ.get('ORDER_API_MAX_BATCH', 50))
+app.config['IDEMPOTENCY_KEY_TTL_HOURS'] = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Live order feed (/stream/orders): recent orders kept for reconnecting
+# screens, a directory for the sockets workers share orders through (blank:
+# this worker only), and the most open streams per worker. Each in-app
+# stream holds a worker thread, so screens should use order_feed_server.py
+app.config['ORDER_FEED_BUFFER'] = int(os.environ.get('ORDER_FEED_BUFFER', 1000))
+app.config['ORDER_FEED_SOCKET_DIR'] = os.environ.get('ORDER_FEED_SOCKET_DIR', '')
+app.config['ORDER_FEED_MAX_SUBSCRIBERS'] = int(os.environ.get('ORDER_FEED_MAX_SUBSCRIBERS', 1))
+app.config['ORDER_FEED_HEARTBEAT'] = float(os.environ.get('ORDER_FEED_HEARTBEAT', 15))
+app.config['ORDER_FEED_MAX_SECONDS'] = float(os.environ.get('ORDER_FEED_MAX_SECONDS', 300))
+app.config['ORDER_FEED_TOKEN'] = os.environ.get('ORDER_FEED_TOKEN')
+
+# Admission control: requests each route class may run at once per worker,
+# how long a request may wait for a slot before a 503, and how many may wait.
+# All classes together (in-app order streams too) stay below GUNICORN_THREADS
+# so the menu and static pages always get a thread
+app.config['ADMISSION_CONTROL'] = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+app.config['ADMISSION_THREAD_LIMIT'] = int(os.environ.get(
+    'ADMISSION_THREAD_LIMIT', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) - 1)))
+# SQLite commits one write at a time: a second admitted order would only
+# wait on the database lock, where the wait is neither bounded nor fair
+app.config['ADMISSION_ORDER_LIMIT'] = int(os.environ.get(
+    'ADMISSION_ORDER_LIMIT', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) - 1)
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') else 1))
+app.config['ADMISSION_ORDER_QUEUE_MS'] = int(os.environ.get('ADMISSION_ORDER_QUEUE_MS', 250))
+app.config['ADMISSION_REPORTING_LIMIT'] = int(os.environ.get(
+    'ADMISSION_REPORTING_LIMIT', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)))
+# Reporting slots that waiting orders can't hold back, so reports still load during a rush
+app.config['ADMISSION_REPORTING_RESERVED'] = int(os.environ.get('ADMISSION_REPORTING_RESERVED', 1))
+app.config['ADMISSION_REPORTING_QUEUE_MS'] = int(os.environ.get('ADMISSION_REPORTING_QUEUE_MS', 100))
+# Exports and the archive report hold their slot for the whole (streamed) scan
+app.config['ADMISSION_EXPORT_LIMIT'] = int(os.environ.get('ADMISSION_EXPORT_LIMIT', 1))
+app.config['ADMISSION_MAX_QUEUE'] = int(os.environ.get(
+    'ADMISSION_MAX_QUEUE', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)))
+app.config['ADMISSION_RETRY_AFTER'] = int(os.environ.get('ADMISSION_RETRY_AFTER', 1))
+
+# Request profiler: directory shared by the workers for the arm state and
+# saved profiles, and how often each worker checks whether it is armed
+app.config['PROFILER_DIR'] = os.environ.get(
+    'PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'lunchmenu-profiler'))
+app.config['PROFILER_POLL_SECONDS'] = float(os.environ.get('PROFILER_POLL_SECONDS', 1))
+app.config['PROFILER_SAMPLE_INTERVAL_MS'] = float(os.environ.get('PROFILER_SAMPLE_INTERVAL_MS', 5))
+
+# Most meals allowed in one catering (bulk) order
+app.config['CATERING_MAX_MEALS'] = int(os.environ.get('CATERING_MAX_MEALS', 500))
+
+# Order export/import: rows fetched per server-side cursor batch / inserted per chunk
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+# Directory for the columnar archive of closed days written by `flask compact-orders`
+app.config['ORDER_ARCHIVE_DIR'] = os.environ.get(
+    'ORDER_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'order_archive'))
+
+# Initialize database. Reporting reads of these tables may be sent to the replica.
+REPLICA_TABLES = ('order', 'catering_order', 'daily_sales', 'daily_item_sales')
+db = SQLAlchemy(app, session_options={'class_': read_replica.RoutingSession, 'replica_tables': REPLICA_TABLES})
+read_replica.init_app(app)
+admission.init_app(app)
+
+# Per-route latency, SQL and template metrics (exposed at /metrics)
+metrics.init_app(app)
 
 # DATABASE MODELS
 class Order(db.Model):
-    """Stores customer orders"""
+    """Stores customer orders (items as MenuItem ids, money in whole pence)
+
+    Item names come from the menu cache when orders are shown, so renaming a
+    MenuItem renames it in the order history too.
+    """
     id = db.Column(db.Integer, primary_key=True)
-    sandwich = db.Column(db.String(100), nullable=False)
-    crisps = db.Column(db.String(100), nullable=False)
-    snack = db.Column(db.String(100), nullable=False)
-    sandwich_price = db.Column(db.Float, nullable=False)
-    crisps_price = db.Column(db.Float, nullable=False)
-    snack_price = db.Column(db.Float, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
+    sandwich_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    crisps_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    snack_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    sandwich_pence = db.Column(db.Integer, nullable=False)
+    crisps_pence = db.Column(db.Integer, nullable=False)
+    snack_pence = db.Column(db.Integer, nullable=False)
+    total_pence = db.Column(db.Integer, nullable=False)
     offer_applied = db.Column(db.Boolean, nullable=False)
-    savings = db.Column(db.Float, default=0.0)
+    savings_pence = db.Column(db.Integer, nullable=False, default=0)
+    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Meals on this line (catering orders); item prices are per meal,
+    # total_pence and savings_pence cover the whole line
+    quantity = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    catering_order_id = db.Column(db.Integer, db.ForeignKey('catering_order.id'))
+    
+    __table_args__ = (
+        # Date range filters and the (order_date, id) keyset sort in history()
+        db.Index('ix_order_order_date_id', 'order_date', 'id'),
+        # Lines of one catering order
+        db.Index('ix_order_catering_order_id', 'catering_order_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Order {self.id}: {self.total_pence}p>'
+
+
+class CateringOrder(db.Model):
+    """A bulk order phoned in by a customer; its meals are Order lines with quantities"""
+    id = db.Column(db.Integer, primary_key=True)
+    customer_name = db.Column(db.String(100), nullable=False)
+    notes = db.Column(db.String(500))
+    meal_count = db.Column(db.Integer, nullable=False)
+    total_pence = db.Column(db.Integer, nullable=False)
+    savings_pence = db.Column(db.Integer, nullable=False, default=0)
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<Order {self.id}: {self.sandwich}>'
+        return f'<CateringOrder {self.id}: {self.meal_count} meals for {self.customer_name}>'
 
 
 class MenuItem(db.Model):
@@ -65,21 +276,137 @@ class MenuItem(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # filter_by(is_active=True) on its own and together with category
+        db.Index('ix_menu_item_is_active_category', 'is_active', 'category'),
+    )
+    
     def __repr__(self):
         return f'<MenuItem {self.name}>'
 
 
-# HELPER FUNCTIONS
-def get_menu_items():
-    """Get active menu items organized by category"""
-    items = MenuItem.query.filter_by(is_active=True).all()
+class PromotionRule(db.Model):
+    """An offer managed by the admin; see promotions.py for the kinds of rule"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'))
+    applies_to = db.Column(db.String(20), nullable=False, default='standard')
+    min_quantity = db.Column(db.Integer)
+    location = db.Column(db.String(100))
+    days = db.Column(db.Integer, nullable=False, default=promotions.EVERY_DAY)
+    start_time = db.Column(db.Time)
+    end_time = db.Column(db.Time)
+    starts_on = db.Column(db.Date)
+    ends_on = db.Column(db.Date)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PromotionRule {self.name}: {self.kind} £{self.price:.2f}>'
+
+
+class DailySales(db.Model):
+    """Per-day sales rollup, updated in the same transaction as each order"""
+    day = db.Column(db.Date, primary_key=True)
+    revenue_pence = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    offer_count = db.Column(db.Integer, nullable=False, default=0)
+    savings_pence = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailySales {self.day}: {self.order_count} orders>'
+
+
+class DailyItemSales(db.Model):
+    """Per-day, per-item sale counts, updated in the same transaction as each order"""
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyItemSales {self.day} item {self.item_id}: {self.count}>'
+
+
+class OrderIdBlock(db.Model):
+    """Single-row high-water mark for order ids handed out ahead of the INSERT (SQLite)"""
+    id = db.Column(db.Integer, primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<OrderIdBlock next={self.next_id}>'
+
+
+class MenuState(db.Model):
+    """Single-row table holding the menu version shared by all workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f'<MenuState v{self.version}>'
+
+
+class IdempotencyKey(db.Model):
+    """The response to an /api/orders request, replayed when a client retries with the same key"""
+    key = db.Column(db.String(100), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
-    sandwiches = {item.name: item.price for item in items if item.category == 'sandwich'}
-    crisps = {item.name: item.price for item in items if item.category == 'crisps'}
-    snacks = {item.name: item.price for item in items if item.category == 'snack'}
-    premium_sandwiches = [item.name for item in items if item.category == 'sandwich' and item.is_premium]
+    __table_args__ = (
+        # purge_idempotency_keys() deletes by age
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
     
-    return sandwiches, crisps, snacks, premium_sandwiches
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}: {self.status_code}>'
+
+
+# MENU CACHE
+def load_menu_items():
+    """Load every menu item (inactive ones are still needed to name old orders)"""
+    return MenuItem.query.all()
+
+
+def load_menu_version():
+    """Read the shared menu version (0 if it has never been bumped)"""
+    version = db.session.query(MenuState.version).filter_by(id=1).scalar()
+    return version or 0
+
+
+def bump_menu_version():
+    """Increment the shared menu version in the current transaction
+
+    Call this before db.session.commit() in any route that changes MenuItem
+    rows so every worker rebuilds its snapshot on its next version check.
+    """
+    updated = MenuState.query.filter_by(id=1).update({MenuState.version: MenuState.version + 1})
+    if not updated:
+        db.session.add(MenuState(id=1, version=1))
+
+
+menu_cache = MenuCache(load_menu_items, load_menu_version,
+                       check_interval=app.config['MENU_VERSION_CHECK_INTERVAL'])
+
+metrics.registry.gauge('lunchmenu_menu_cache_hits', 'Menu cache hits in this worker', lambda: menu_cache.hits)
+metrics.registry.gauge('lunchmenu_menu_cache_rebuilds', 'Menu snapshot rebuilds in this worker',
+                       lambda: menu_cache.rebuilds)
+
+
+def commit_menu_change():
+    """Commit a menu change, bumping the shared version and the local cache"""
+    bump_menu_version()
+    db.session.commit()
+    menu_cache.invalidate()
+
+
+# HELPER FUNCTIONS
+def get_menu_items():
+    """Get active menu items organized by category (served from the menu cache)"""
+    snapshot = menu_cache.get()
+    return snapshot.sandwiches, snapshot.crisps, snapshot.snacks, snapshot.premium_sandwiches
 
 
 def initialize_default_menu():
@@ -118,28 +445,532 @@ def initialize_default_menu():
         ]
         
         db.session.add_all(default_items)
-        db.session.commit()
+        commit_menu_change()
+
+
+def initialize_default_promotions():
+    """Add the standard lunch offer if no promotion rules exist"""
+    if PromotionRule.query.count() == 0:
+        db.session.add(PromotionRule(name='Lunch Offer', kind=promotions.MEAL_DEAL, price=LUNCH_OFFER_PRICE,
+                                     applies_to='standard'))
+        commit_menu_change()
+
+
+# PROMOTIONS
+def load_promotion_rules():
+    """Active promotion rules as immutable promotions.Rule tuples"""
+    return [promotions.rule_from_row(row) for row in PromotionRule.query.filter_by(is_active=True)]
+
+
+promotion_book = None
+promotion_book_lock = threading.Lock()
+
+
+def get_promotion_book(menu=None, day=None):
+    """Promotion rules compiled for a menu snapshot (the cached menu by default) and a day (today)
+
+    Rule changes bump the menu version, so the book is rebuilt once per menu
+    version and day: one query per worker, not one per order.
+    """
+    global promotion_book
+    if menu is None:
+        menu = menu_cache.get()
+    day = day or date.today()
+    book = promotion_book
+    if book is None or book.version != menu.version or book.day != day:
+        with promotion_book_lock:
+            book = promotion_book
+            if book is None or book.version != menu.version or book.day != day:
+                book = promotion_book = promotions.PromotionBook(
+                    menu, load_promotion_rules(), day, app.config['QUOTE_TABLE_MAX_COMBINATIONS'])
+    return book
+
+
+def get_quote_table(menu=None, location=None, when=None):
+    """The QuoteTable in force at a location (this store) and time (now, server local time)"""
+    when = when or datetime.now()
+    book = get_promotion_book(menu, when.date())
+    return book.table(location or app.config['STORE_LOCATION'] or None, promotions.minute_of_day(when))
+
 
+metrics.registry.gauge('lunchmenu_quote_table_combinations', 'Baskets priced in advance for the current menu',
+                       lambda: len(promotion_book) if promotion_book is not None else 0)
+metrics.registry.gauge('lunchmenu_promotion_rules', 'Promotion rules live today in this worker',
+                       lambda: len(promotion_book.rules) if promotion_book is not None else 0)
 
-lunch_offer_price = 5.00
+
+def quote_order(sandwich, crisp, snack, menu=None):
+    """Price a basket with a lookup in the quote table in force now"""
+    return get_quote_table(menu).quote(sandwich, crisp, snack)
+
+
+def build_order_row(quote, menu, order_date=None, quantity=1, pence=None):
+    """Turn a Quote into a dict of Order columns (item ids and pence) for save_orders()
+
+    pence is the line's (total_pence, savings_pence) from
+    QuoteTable.order_pence(), for orders of several lines that may earn
+    multi-buy offers.
+    """
+    if pence is not None:
+        total_pence, savings_pence = pence
+    else:
+        total_pence, savings_pence = to_pence(quote.total) * quantity, to_pence(quote.savings) * quantity
+    return {
+        'sandwich_id': menu.item_ids[quote.sandwich],
+        'crisps_id': menu.item_ids[quote.crisp],
+        'snack_id': menu.item_ids[quote.snack],
+        'sandwich_pence': to_pence(quote.sandwich_price),
+        'crisps_pence': to_pence(quote.crisp_price),
+        'snack_pence': to_pence(quote.snack_price),
+        'total_pence': total_pence,
+        'offer_applied': quote.offer_applied,
+        'savings_pence': savings_pence,
+        'order_date': order_date or datetime.utcnow(),
+        'quantity': quantity,
+    }
+
+
+def menu_naming(item_ids):
+    """Return a menu snapshot that can name every MenuItem id in item_ids
+
+    An item added moments ago may not be in this worker's snapshot yet, so
+    one rebuild is forced before giving up.
+    """
+    snapshot = menu_cache.get()
+    if not snapshot.items.keys() >= set(item_ids) - {None}:
+        menu_cache.invalidate()
+        snapshot = menu_cache.get()
+    return snapshot
+
+
+def item_name(menu, item_id):
+    """Current name of a MenuItem id, looked up in a menu snapshot"""
+    entry = menu.items.get(item_id)
+    return entry.name if entry else f'Item #{item_id}'
 
 
 def check_offer_eligibility(sandwich_choice):
-    """Check if the selected items qualify for the lunch offer"""
-    item = MenuItem.query.filter_by(name=sandwich_choice, category='sandwich').first()
-    if item:
-        return not item.is_premium
-    return True
+    """Check if a meal deal is on offer for this sandwich right now"""
+    table = get_quote_table()
+    return deal_price(table.menu, sandwich_choice, table.offer_price) is not None
 
 
 def calculate_total(sandwich, crisp, snack, qualifies_for_offer):
     """Calculate the total price"""
-    if qualifies_for_offer:
-        return lunch_offer_price
+    quote = quote_order(sandwich, crisp, snack)
+    return quote.total if qualifies_for_offer else quote.regular_total
+
+
+def get_order_stats():
+    """Order count, revenue, savings and offers applied, summed from the daily rollup"""
+    row = db.session.query(
+        func.coalesce(func.sum(DailySales.order_count), 0),
+        func.coalesce(func.sum(DailySales.revenue_pence), 0),
+        func.coalesce(func.sum(DailySales.savings_pence), 0),
+        func.coalesce(func.sum(DailySales.offer_count), 0),
+    ).one()
+    
+    return {
+        'total_orders': int(row[0]),
+        'total_revenue': int(row[1]) / 100,
+        'total_savings': int(row[2]) / 100,
+        'offers_applied': int(row[3]),
+    }
+
+
+# ORDER HISTORY PAGINATION
+def encode_history_cursor(order_date, order_id):
+    """Encode the (order_date, id) of the last row on a page as an opaque cursor"""
+    raw = f'{order_date.isoformat()}|{order_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_history_cursor(cursor):
+    """Decode a history cursor back to (order_date, id), raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_part, id_part = raw.split('|')
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+def history_page_query(cursor, limit):
+    """Build the keyset query for one history page (fetches limit + 1 rows)"""
+    query = db.session.query(
+        Order.id, Order.sandwich_id, Order.crisps_id, Order.snack_id, Order.total_pence,
+        Order.offer_applied, Order.savings_pence, Order.order_date,
+        Order.quantity, Order.catering_order_id,
+    )
+    
+    if cursor:
+        last_date, last_id = decode_history_cursor(cursor)
+        # The plain <= bound lets the database seek ix_order_order_date_id directly
+        query = query.filter(Order.order_date <= last_date, or_(
+            Order.order_date < last_date,
+            and_(Order.order_date == last_date, Order.id < last_id),
+        ))
+    
+    return query.order_by(Order.order_date.desc(), Order.id.desc()).limit(limit + 1)
+
+
+def get_history_page(cursor=None, limit=None):
+    """Return (orders, next_cursor) for one page of history, newest first
+
+    Uses keyset pagination on (order_date, id), so every page costs the same
+    however deep into the history it is. Orders are dicts with item names
+    from the menu cache and prices in pounds.
+    """
+    if limit is None:
+        limit = app.config['HISTORY_PAGE_SIZE']
+    limit = max(1, min(limit, app.config['HISTORY_MAX_PAGE_SIZE']))
+    
+    rows = history_page_query(cursor, limit).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].order_date, rows[-1].id)
+    
+    menu = menu_naming({item_id for row in rows for item_id in (row.sandwich_id, row.crisps_id, row.snack_id)})
+    orders = [{
+        'id': row.id,
+        'sandwich': item_name(menu, row.sandwich_id),
+        'crisps': item_name(menu, row.crisps_id),
+        'snack': item_name(menu, row.snack_id),
+        'total_price': row.total_pence / 100,
+        'offer_applied': row.offer_applied,
+        'savings': row.savings_pence / 100,
+        'order_date': row.order_date,
+        'quantity': row.quantity,
+        'catering_order_id': row.catering_order_id,
+    } for row in rows]
+    
+    return orders, next_cursor
+
+
+# ORDER WRITES
+def reserve_order_ids(count):
+    """Reserve count order ids in their own short transaction
+
+    PostgreSQL draws them from the Order id sequence. Other databases use the
+    OrderIdBlock high-water mark, which never hands out an id at or below
+    the current MAX(id).
+    """
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            rows = conn.execute(
+                text("SELECT nextval(pg_get_serial_sequence('\"order\"', 'id')) FROM generate_series(1, :count)"),
+                {'count': count})
+            return [row[0] for row in rows]
+        
+        max_id = select(func.coalesce(func.max(Order.id), 0)).scalar_subquery()
+        start = case((OrderIdBlock.next_id > max_id, OrderIdBlock.next_id), else_=max_id + 1)
+        updated = conn.execute(
+            OrderIdBlock.__table__.update().where(OrderIdBlock.id == 1).values(next_id=start + count)
+        ).rowcount
+        if not updated:
+            first = conn.execute(select(max_id)).scalar() + 1
+            conn.execute(OrderIdBlock.__table__.insert().values(id=1, next_id=first + count))
+            return list(range(first, first + count))
+        
+        next_id = conn.execute(select(OrderIdBlock.next_id).where(OrderIdBlock.id == 1)).scalar()
+        return list(range(next_id - count, next_id))
+
+
+class OrderIdAllocator:
+    """Hands out order ids from blocks reserved with reserve_order_ids()"""
+    
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._ids = deque()
+        self._lock = threading.Lock()
+    
+    def allocate(self, count):
+        """Return count unused order ids"""
+        with self._lock:
+            while len(self._ids) < count:
+                self._ids.extend(reserve_order_ids(max(self.block_size, count - len(self._ids))))
+            return [self._ids.popleft() for _ in range(count)]
+    
+    def release(self, ids):
+        """Give back allocated ids that were never used, to be handed out next"""
+        with self._lock:
+            self._ids.extendleft(reversed(list(ids)))
+
+
+# LIVE ORDER FEED
+order_feed = OrderFeed(app.config['ORDER_FEED_BUFFER'], app.config['ORDER_FEED_SOCKET_DIR'] or None)
+atexit.register(order_feed.close)
+
+metrics.registry.gauge('lunchmenu_order_feed_subscribers', 'Open /stream/orders connections in this worker',
+                       lambda: order_feed.subscribers)
+metrics.registry.gauge('lunchmenu_order_feed_published', 'Orders published to the live feed by this worker',
+                       lambda: order_feed.published)
+
+
+def publish_orders(rows, ids):
+    """Send newly committed orders to /stream/orders subscribers in every worker"""
+    menu = menu_cache.get()
+    order_feed.publish(((order_id, {
+        'id': order_id,
+        'sandwich': item_name(menu, row['sandwich_id']),
+        'crisps': item_name(menu, row['crisps_id']),
+        'snack': item_name(menu, row['snack_id']),
+        'quantity': row['quantity'],
+        'total': row['total_pence'] / 100,
+        'offer_applied': row['offer_applied'],
+        'order_date': row['order_date'].isoformat(),
+        'catering_order_id': row.get('catering_order_id'),
+    }) for row, order_id in zip(rows, ids)), location=app.config['STORE_LOCATION'])
+
+
+def write_order_batch(rows):
+    """Insert a batch of queued orders and their rollups in one transaction"""
+    with app.app_context():
+        try:
+            db.session.execute(db.insert(Order), rows)
+            record_order_rollups(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        publish_orders(rows, [row['id'] for row in rows])
+    orders_changed()
+
+
+order_id_allocator = OrderIdAllocator(app.config['ORDER_ID_BLOCK_SIZE'])
+order_queue = WriteBehindQueue(write_order_batch,
+                               max_size=app.config['ORDER_QUEUE_SIZE'],
+                               batch_size=app.config['ORDER_BATCH_SIZE'],
+                               flush_interval=app.config['ORDER_FLUSH_INTERVAL_MS'] / 1000)
+atexit.register(order_queue.drain)
+
+metrics.registry.gauge('lunchmenu_order_queue_depth', 'Orders waiting in the write-behind queue',
+                       lambda: order_queue.stats()['queued'])
+
+
+def save_orders(rows):
+    """Persist new order rows (dicts of Order columns) and return their ids
+
+    In 'sync' mode the rows and their rollups are committed before this
+    returns. In 'write-behind' mode ids are assigned up front and the rows
+    are queued for the background writer; QueueFullError is raised if the
+    queue has no room within ORDER_QUEUE_TIMEOUT seconds.
+    """
+    if app.config['ORDER_DURABILITY'] == 'write-behind':
+        ids = order_id_allocator.allocate(len(rows))
+        for row, order_id in zip(rows, ids):
+            row['id'] = order_id
+        order_queue.submit(rows, timeout=app.config['ORDER_QUEUE_TIMEOUT'])
+        read_replica.note_write()
+        return ids
+    
+    ids = insert_orders(rows)
+    db.session.commit()
+    publish_orders(rows, ids)
+    orders_changed()
+    return ids
+
+
+def insert_orders(rows):
+    """Insert order rows and their rollups in the current transaction (no commit), returning the ids
+
+    Rows without an 'id' get one from order_id_allocator, like queued
+    orders, so the two never collide. With every id known up front the rows
+    go in one multi-row INSERT; RETURNING would make SQLite send one INSERT
+    per row. Ids are reserved on a connection of their own, which SQLite
+    blocks behind any transaction that has already written, so give the
+    rows ids before writing anything else in the same transaction.
+    """
+    missing = [row for row in rows if 'id' not in row]
+    for row, order_id in zip(missing, order_id_allocator.allocate(len(missing))):
+        row['id'] = order_id
+    db.session.execute(db.insert(Order), rows)
+    record_order_rollups(rows)
+    return [row['id'] for row in rows]
+
+
+# IDEMPOTENCY KEYS
+def idempotency_cutoff():
+    """Keys created before this have expired"""
+    return datetime.utcnow() - timedelta(hours=app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+
+
+def find_idempotency_key(key):
+    """The stored IdempotencyKey for key, or None if there isn't one (expired keys are deleted)"""
+    stored = db.session.get(IdempotencyKey, key)
+    if stored is not None and stored.created_at < idempotency_cutoff():
+        # Committed on its own, so the transaction that saves the orders hasn't written before their ids are reserved
+        db.session.delete(stored)
+        db.session.commit()
+        return None
+    return stored
+
+
+def purge_idempotency_keys():
+    """Delete expired idempotency keys, returning how many were removed"""
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < idempotency_cutoff()).delete(
+        synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+# CATERING ORDERS
+def save_catering_order(customer_name, lines, notes=None):
+    """Price and save a bulk order in one transaction, returning the CateringOrder
+
+    lines is a list of (sandwich, crisp, snack, quantity). Identical baskets
+    are merged into one Order line, every basket is priced from the quote
+    table before anything is written, and all lines go in one multi-row
+    INSERT. Catering orders are always written synchronously. Raises
+    UnknownItemError or ValueError if the order can't be taken.
+    """
+    if not customer_name:
+        raise ValueError('Please enter the customer name')
+    
+    quantities = {}
+    for sandwich, crisp, snack, quantity in lines:
+        if quantity < 1:
+            raise ValueError('Quantities must be at least 1')
+        basket = (sandwich, crisp, snack)
+        quantities[basket] = quantities.get(basket, 0) + quantity
+    meal_count = sum(quantities.values())
+    if not meal_count:
+        raise ValueError('A catering order needs at least one meal')
+    if meal_count > app.config['CATERING_MAX_MEALS']:
+        raise ValueError(f"A catering order can have at most {app.config['CATERING_MAX_MEALS']} meals")
+    
+    menu = menu_cache.get()
+    table = get_quote_table(menu)
+    order_date = datetime.utcnow()
+    priced = [(table.quote(*basket), quantity) for basket, quantity in quantities.items()]
+    # Multi-buys count each item across every line of the order
+    rows = [build_order_row(quote, menu, order_date, quantity, pence)
+            for (quote, quantity), pence in zip(priced, table.order_pence(priced))]
+    
+    # Reserved before the header insert, see insert_orders()
+    for row, order_id in zip(rows, order_id_allocator.allocate(len(rows))):
+        row['id'] = order_id
+    
+    catering_order = CateringOrder(
+        customer_name=customer_name,
+        notes=notes or None,
+        meal_count=meal_count,
+        total_pence=sum(row['total_pence'] for row in rows),
+        savings_pence=sum(row['savings_pence'] for row in rows),
+        order_date=order_date,
+    )
+    try:
+        db.session.add(catering_order)
+        db.session.flush()
+        for row in rows:
+            row['catering_order_id'] = catering_order.id
+        ids = insert_orders(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    publish_orders(rows, ids)
+    orders_changed()
+    return catering_order
+
+
+def get_catering_lines(catering_order_id):
+    """The lines of a catering order as dicts with item names and prices in pounds"""
+    rows = db.session.query(
+        Order.id, Order.sandwich_id, Order.crisps_id, Order.snack_id, Order.sandwich_pence,
+        Order.crisps_pence, Order.snack_pence, Order.total_pence, Order.savings_pence,
+        Order.offer_applied, Order.quantity,
+    ).filter(Order.catering_order_id == catering_order_id).order_by(Order.id).all()
+    
+    menu = menu_naming({item_id for row in rows for item_id in (row.sandwich_id, row.crisps_id, row.snack_id)})
+    return [{
+        'id': row.id,
+        'sandwich': item_name(menu, row.sandwich_id),
+        'crisps': item_name(menu, row.crisps_id),
+        'snack': item_name(menu, row.snack_id),
+        'unit_price': (row.total_pence // row.quantity) / 100,
+        'regular_unit_price': (row.sandwich_pence + row.crisps_pence + row.snack_pence) / 100,
+        'quantity': row.quantity,
+        'total_price': row.total_pence / 100,
+        'savings': row.savings_pence / 100,
+        'offer_applied': row.offer_applied,
+    } for row in rows]
+
+
+def catering_order_payload(catering_order):
+    """JSON confirmation for a catering order"""
+    return {
+        'id': catering_order.id,
+        'customer_name': catering_order.customer_name,
+        'notes': catering_order.notes,
+        'meal_count': catering_order.meal_count,
+        'total_price': catering_order.total_pence / 100,
+        'savings': catering_order.savings_pence / 100,
+        'order_date': catering_order.order_date.isoformat(),
+        'lines': get_catering_lines(catering_order.id),
+    }
+
+
+# PAGE CACHE
+page_cache = PageCache()
+
+metrics.registry.gauge('lunchmenu_page_cache_hits', 'Rendered page cache hits in this worker',
+                       lambda: page_cache.hits)
+
+
+def cached_page_response(key, render, max_age=None):
+    """Serve a rendered page from the page cache with ETag/304, Cache-Control and gzip
+
+    key must change whenever the page output would change. With max_age=None
+    browsers must revalidate every time (cheap, thanks to the ETag).
+    """
+    page = page_cache.get(key, render)
+    
+    if page.gzip_body is not None and request.accept_encodings['gzip']:
+        body, etag, encoding = page.gzip_body, page.gzip_etag, 'gzip'
+    else:
+        body, etag, encoding = page.body, page.etag, None
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='text/html')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if max_age is None:
+        response.cache_control.no_cache = True
     else:
-        sandwiches, crisps, snacks, _ = get_menu_items()
-        total = sandwiches.get(sandwich, 0) + crisps.get(crisp, 0) + snacks.get(snack, 0)
-        return total
+        response.cache_control.max_age = max_age
+    return response
+
+
+@lru_cache(maxsize=None)
+def static_file_version(filename):
+    """Short hash of a static file's contents, or None if there is no such file
+
+    Read once per worker; a deploy starts new workers, so it sees the new files.
+    """
+    path = safe_join(app.static_folder, filename)
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except (OSError, TypeError):
+        return None
+
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    """Add ?v=<content hash> to static URLs, so changed CSS gets a new URL instead of a stale cached copy"""
+    if endpoint == 'static' and 'v' not in values:
+        version = static_file_version(values.get('filename'))
+        if version:
+            values['v'] = version
 
 
 # ADMIN AUTHENTICATION DECORATOR
@@ -157,26 +988,33 @@ def admin_required(f):
 @app.route('/')
 def home():
     """Homepage"""
-    return render_template('home.html', business_name=BUSINESS_NAME, tagline=BUSINESS_TAGLINE)
+    return cached_page_response(
+        ('home.html',),
+        lambda: render_template('home.html', business_name=BUSINESS_NAME, tagline=BUSINESS_TAGLINE),
+        max_age=app.config['PAGE_CACHE_MAX_AGE'])
 
 
 @app.route('/menu')
 def menu():
     """Menu page - display the menu selection form"""
     try:
-        sandwiches, crisps, snacks, premium_sandwiches = get_menu_items()
-        return render_template('menu.html', 
-                             sandwiches=sandwiches,
-                             crisps=crisps,
-                             snacks=snacks,
-                             premium_sandwiches=premium_sandwiches,
-                             business_name=BUSINESS_NAME)
+        snapshot = menu_cache.get()
+        # Keyed by menu version, so admin edits produce a new page (and ETag)
+        return cached_page_response(
+            ('menu.html', snapshot.version),
+            lambda: render_template('menu.html', 
+                                  sandwiches=snapshot.sandwiches,
+                                  crisps=snapshot.crisps,
+                                  snacks=snapshot.snacks,
+                                  premium_sandwiches=snapshot.premium_sandwiches,
+                                  business_name=BUSINESS_NAME))
     except Exception as e:
         print(f"Menu error: {e}")
         # Initialize database if needed
         try:
             db.create_all()
             initialize_default_menu()
+            initialize_default_promotions()
             return redirect(url_for('menu'))
         except:
             return "Database initialization required. Please contact administrator.", 500
@@ -185,208 +1023,641 @@ def menu():
 @app.route('/locations')
 def locations():
     """Locations page"""
-    # You can customize these locations
-    store_locations = [
-        {
-            'name': 'City Centre',
-            'address': '123 High Street, London, EC1A 1BB',
-            'phone': '020 1234 5678',
-            'hours': 'Mon-Fri: 7am-6pm, Sat: 8am-4pm, Sun: Closed'
-        },
-        {
-            'name': 'Riverside',
-            'address': '45 River Walk, London, SE1 9PP',
-            'phone': '020 8765 4321',
-            'hours': 'Mon-Fri: 7am-6pm, Sat: 8am-4pm, Sun: Closed'
-        },
-        {
-            'name': 'Business District',
-            'address': '78 Corporate Plaza, London, EC2M 7PP',
-            'phone': '020 5555 6789',
-            'hours': 'Mon-Fri: 6:30am-7pm, Sat-Sun: Closed'
-        }
-    ]
-    return render_template('locations.html', 
-                         locations=store_locations,
-                         business_name=BUSINESS_NAME)
+    return cached_page_response(
+        ('locations.html',),
+        lambda: render_template('locations.html', 
+                              locations=STORE_LOCATIONS,
+                              business_name=BUSINESS_NAME),
+        max_age=app.config['PAGE_CACHE_MAX_AGE'])
 
 
 @app.route('/about')
 def about():
     """About page"""
-    return render_template('about.html', business_name=BUSINESS_NAME)
+    return cached_page_response(
+        ('about.html',),
+        lambda: render_template('about.html', business_name=BUSINESS_NAME),
+        max_age=app.config['PAGE_CACHE_MAX_AGE'])
 
 
 @app.route('/calculate', methods=['POST'])
+@admission.admit(admission.ORDERS)
 def calculate():
     """Process the form submission, save to database, and show results"""
     sandwich_choice = request.form.get('sandwich')
     crisp_choice = request.form.get('crisp')
     snack_choice = request.form.get('snack')
     
-    sandwiches, crisps, snacks, premium_sandwiches = get_menu_items()
+    menu = menu_cache.get()
     
+    error = None
     if not sandwich_choice or not crisp_choice or not snack_choice:
+        error = "Please select one item from each category"
+    else:
+        try:
+            quote = quote_order(sandwich_choice, crisp_choice, snack_choice, menu=menu)
+        except UnknownItemError as e:
+            error = f"Sorry, {e.name} is no longer on the menu"
+    
+    if error:
         return render_template('menu.html',
-                             sandwiches=sandwiches,
-                             crisps=crisps,
-                             snacks=snacks,
-                             premium_sandwiches=premium_sandwiches,
+                             sandwiches=menu.sandwiches,
+                             crisps=menu.crisps,
+                             snacks=menu.snacks,
+                             premium_sandwiches=menu.premium_sandwiches,
                              business_name=BUSINESS_NAME,
-                             error="Please select one item from each category")
-    
-    qualifies = check_offer_eligibility(sandwich_choice)
-    total = calculate_total(sandwich_choice, crisp_choice, snack_choice, qualifies)
-    
-    savings = 0
-    if qualifies:
-        regular_total = sandwiches[sandwich_choice] + crisps[crisp_choice] + snacks[snack_choice]
-        savings = regular_total - total
-    
-    new_order = Order(
-        sandwich=sandwich_choice,
-        crisps=crisp_choice,
-        snack=snack_choice,
-        sandwich_price=sandwiches[sandwich_choice],
-        crisps_price=crisps[crisp_choice],
-        snack_price=snacks[snack_choice],
-        total_price=total,
-        offer_applied=qualifies,
-        savings=savings
-    )
+                             error=error)
     
-    db.session.add(new_order)
-    db.session.commit()
+    order = build_order_row(quote, menu)
+    
+    try:
+        order_id = save_orders([order])[0]
+    except QueueFullError:
+        return "We're very busy right now - please try again in a moment.", 503, {'Retry-After': '1'}
     
     return render_template('result.html',
-                         sandwich=sandwich_choice,
-                         crisp=crisp_choice,
-                         snack=snack_choice,
-                         qualifies=qualifies,
-                         total=total,
-                         savings=savings,
-                         sandwich_price=sandwiches[sandwich_choice],
-                         crisp_price=crisps[crisp_choice],
-                         snack_price=snacks[snack_choice],
-                         order_id=new_order.id,
+                         sandwich=quote.sandwich,
+                         crisp=quote.crisp,
+                         snack=quote.snack,
+                         qualifies=quote.offer_applied,
+                         total=quote.total,
+                         savings=quote.savings,
+                         sandwich_price=quote.sandwich_price,
+                         crisp_price=quote.crisp_price,
+                         snack_price=quote.snack_price,
+                         order_id=order_id,
                          business_name=BUSINESS_NAME)
 
 
-@app.route('/history')
-def history():
-    """Display all past orders from the database"""
-    all_orders = Order.query.order_by(Order.order_date.desc()).all()
-    
-    total_orders = len(all_orders)
-    total_revenue = sum(order.total_price for order in all_orders)
-    total_savings = sum(order.savings for order in all_orders)
-    offers_applied = sum(1 for order in all_orders if order.offer_applied)
-    
-    return render_template('history.html',
-                         orders=all_orders,
-                         total_orders=total_orders,
-                         total_revenue=total_revenue,
-                         total_savings=total_savings,
-                         offers_applied=offers_applied,
-                         business_name=BUSINESS_NAME)
-
+@app.route('/api/quote', methods=['POST'])
+def api_quote():
+    """API endpoint that prices a list of baskets in one call (nothing is saved)
 
-# ANALYTICS ROUTES
-@app.route('/analytics')
-@admin_required
-def analytics():
-    """Sales analytics dashboard with charts"""
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=30)
+    Body: {"baskets": [{"sandwich": ..., "crisp": ..., "snack": ...}, ...]}, with
+    an optional "location" to price for another store. The totals price the
+    baskets as one order, multi-buys included, so they match what
+    /api/orders charges for the same batch.
+    """
+    payload = request.get_json(silent=True)
+    baskets = payload.get('baskets') if isinstance(payload, dict) else payload
+    if not isinstance(baskets, list):
+        return jsonify({'error': 'Send {"baskets": [{"sandwich": ..., "crisp": ..., "snack": ...}, ...]}'}), 400
+    if len(baskets) > app.config['QUOTE_MAX_BASKETS']:
+        return jsonify({'error': f"At most {app.config['QUOTE_MAX_BASKETS']} baskets per request"}), 400
     
-    all_orders = Order.query.all()
-    recent_orders = Order.query.filter(Order.order_date >= start_date).all()
+    location = payload.get('location') if isinstance(payload, dict) else None
+    if location is not None and not isinstance(location, str):
+        return jsonify({'error': 'location must be a store name'}), 400
+    menu = menu_cache.get()
+    table = get_quote_table(menu, location)
+    quotes = []
+    priced = []
+    errors = 0
+    for basket in baskets:
+        if not isinstance(basket, dict):
+            basket = {}
+        try:
+            quote = table.quote(basket.get('sandwich'), basket.get('crisp', basket.get('crisps')),
+                                basket.get('snack'))
+        except UnknownItemError as e:
+            errors += 1
+            quotes.append({'error': str(e), 'category': e.category, 'name': e.name})
+            continue
+        priced.append((quote, 1))
+        quotes.append(quote._asdict())
     
-    total_orders = len(all_orders)
-    total_revenue = sum(order.total_price for order in all_orders)
-    total_savings = sum(order.savings for order in all_orders)
-    avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+    pence = table.order_pence(priced)
+    total_pence = sum(line[0] for line in pence)
+    savings_pence = sum(line[1] for line in pence)
+    offers_applied = sum(1 for quote, _ in priced if quote.offer_applied)
     
-    return render_template('analytics.html',
-                         total_orders=total_orders,
-                         total_revenue=total_revenue,
-                         total_savings=total_savings,
-                         avg_order_value=avg_order_value,
-                         business_name=BUSINESS_NAME)
+    return jsonify({
+        'menu_version': menu.version,
+        'quotes': quotes,
+        'totals': {
+            'baskets': len(baskets) - errors,
+            'total': total_pence / 100,
+            'savings': savings_pence / 100,
+            'offers_applied': offers_applied,
+            'errors': errors,
+        },
+    })
 
 
-@app.route('/api/analytics/daily-sales')
-@admin_required
-def api_daily_sales():
-    """API endpoint for daily sales data"""
-    days = int(request.args.get('days', 30))
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
+def replay_response(stored):
+    """Response for a retried /api/orders request, as first sent"""
+    return Response(stored.response, status=stored.status_code, mimetype='application/json',
+                    headers={'Idempotent-Replayed': 'true'})
+
+
+@app.route('/api/orders', methods=['POST'])
+@admission.admit(admission.ORDERS)
+def api_orders():
+    """Place one order or a batch as JSON - the lean alternative to posting /calculate
+
+    Body: {"sandwich": ..., "crisp": ..., "snack": ...} or {"orders": [...]}.
+    All orders are priced before any is saved, so a batch is all or nothing:
+    items that aren't on the menu (or aren't names at all) are reported by
+    index with a 400.
+    Send an Idempotency-Key header to make retries safe: a repeat of the
+    same request gets the first response back instead of new orders.
+    """
+    payload = request.get_json(silent=True)
+    baskets = payload.get('orders', [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(baskets, list) or not baskets:
+        return jsonify({'error': 'Send {"sandwich": ..., "crisp": ..., "snack": ...} or {"orders": [...]}'}), 400
+    if len(baskets) > app.config['ORDER_API_MAX_BATCH']:
+        return jsonify({'error': f"At most {app.config['ORDER_API_MAX_BATCH']} orders per request"}), 400
     
-    orders = Order.query.filter(Order.order_date >= start_date).all()
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= 100:
+        return jsonify({'error': 'Idempotency-Key must be 1-100 characters'}), 400
+    request_hash = hashlib.sha256(request.get_data()).hexdigest()
+    if key is not None:
+        stored = find_idempotency_key(key)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            return replay_response(stored)
     
-    daily_sales = defaultdict(float)
-    daily_orders = defaultdict(int)
+    menu = menu_cache.get()
+    table = get_quote_table(menu)
+    quotes = []
+    errors = []
+    for index, basket in enumerate(baskets):
+        if not isinstance(basket, dict):
+            basket = {}
+        try:
+            quotes.append(table.quote(basket.get('sandwich'), basket.get('crisp', basket.get('crisps')),
+                                      basket.get('snack')))
+        except UnknownItemError as e:
+            errors.append({'index': index, 'error': str(e), 'category': e.category, 'name': e.name})
+    if errors:
+        return jsonify({'errors': errors}), 400
     
-    for order in orders:
-        date_key = order.order_date.strftime('%Y-%m-%d')
-        daily_sales[date_key] += order.total_price
-        daily_orders[date_key] += 1
+    # A batch is one order, so multi-buys count items across all of it
+    pence = table.order_pence([(quote, 1) for quote in quotes])
+    rows = [build_order_row(quote, menu, pence=line_pence) for quote, line_pence in zip(quotes, pence)]
+    if key is None:
+        try:
+            ids = save_orders(rows)
+        except QueueFullError:
+            return jsonify({'error': 'Too busy, try again'}), 503, {'Retry-After': '1'}
+    else:
+        # The orders and the key commit together, so a retry can never double up
+        ids = insert_orders(rows)
     
-    dates = sorted(daily_sales.keys())
-    sales = [daily_sales[date] for date in dates]
-    order_counts = [daily_orders[date] for date in dates]
+    body = json.dumps({
+        'orders': [{'id': order_id, 'total': row['total_pence'] / 100, 'savings': row['savings_pence'] / 100,
+                    'offer_applied': quote.offer_applied} for order_id, quote, row in zip(ids, quotes, rows)],
+        'total': sum(row['total_pence'] for row in rows) / 100,
+    }, separators=(',', ':'))
     
-    return jsonify({
-        'dates': dates,
-        'sales': sales,
-        'orders': order_counts
-    })
+    if key is not None:
+        db.session.add(IdempotencyKey(key=key, request_hash=request_hash, status_code=201, response=body))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request with the same key won; its orders stand and ours are rolled back
+            db.session.rollback()
+            stored = db.session.get(IdempotencyKey, key)
+            if stored is None:
+                raise
+            if stored.request_hash != request_hash:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            return replay_response(stored)
+        publish_orders(rows, ids)
+        orders_changed()
+    
+    return Response(body, status=201, mimetype='application/json')
 
 
-@app.route('/api/analytics/top-items')
-@admin_required
-def api_top_items():
-    """API endpoint for top selling items by category"""
-    all_orders = Order.query.all()
-    
-    sandwich_counts = defaultdict(int)
-    crisps_counts = defaultdict(int)
-    snack_counts = defaultdict(int)
-    
-    for order in all_orders:
-        sandwich_counts[order.sandwich] += 1
-        crisps_counts[order.crisps] += 1
-        snack_counts[order.snack] += 1
-    
-    top_sandwiches = sorted(sandwich_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_crisps = sorted(crisps_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_snacks = sorted(snack_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    
+@app.route('/stream/orders')
+@admission.admit(admission.STREAMS)
+def stream_orders():
+    """New orders as Server-Sent Events, for kitchen screens (admin session or ?token=ORDER_FEED_TOKEN)
+
+    A reconnecting EventSource sends Last-Event-ID and gets the orders it
+    missed from the feed's buffer. ?location= limits the stream to one store.
+    The generator runs without an app context, so an open stream holds no
+    database connection, but it does hold a worker thread and an admission
+    slot; order_feed_server.py serves screens without either.
+    """
+    token = app.config['ORDER_FEED_TOKEN']
+    authorized = session.get('admin_logged_in') or (
+        token and secrets.compare_digest(request.args.get('token', ''), token))
+    if not authorized:
+        return 'Unauthorized', 401
+    if not order_feed.try_subscribe(app.config['ORDER_FEED_MAX_SUBSCRIBERS']):
+        return 'Too many open order streams', 503, {'Retry-After': '5'}
+
+    stream = order_feed.stream(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+                               location=request.args.get('location'),
+                               heartbeat=app.config['ORDER_FEED_HEARTBEAT'],
+                               max_seconds=app.config['ORDER_FEED_MAX_SECONDS'])
+
+    def events():
+        try:
+            yield from stream
+        finally:
+            order_feed.unsubscribe()
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/history')
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def history():
+    """Display past orders one page at a time, newest first"""
+    cursor = request.args.get('cursor')
+    try:
+        orders, next_cursor = get_history_page(cursor, request.args.get('limit', type=int))
+    except ValueError:
+        abort(400)
+    
+    stats = get_order_stats()
+    
+    return render_template('history.html',
+                         orders=orders,
+                         next_cursor=next_cursor,
+                         is_first_page=not cursor,
+                         limit=request.args.get('limit', type=int),
+                         total_orders=stats['total_orders'],
+                         total_revenue=stats['total_revenue'],
+                         total_savings=stats['total_savings'],
+                         offers_applied=stats['offers_applied'],
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/api/history')
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def api_history():
+    """API endpoint for one page of order history (JSON)"""
+    try:
+        orders, next_cursor = get_history_page(request.args.get('cursor'),
+                                               request.args.get('limit', type=int))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
     return jsonify({
-        'sandwiches': {
-            'labels': [item[0] for item in top_sandwiches],
-            'data': [item[1] for item in top_sandwiches]
+        'orders': [dict(order, order_date=order['order_date'].isoformat() if order['order_date'] else None)
+                   for order in orders],
+        'next_cursor': next_cursor,
+        'stats': get_order_stats(),
+    })
+
+
+# SALES ROLLUPS
+# DailySales and DailyItemSales are kept up to date by record_order_rollups()
+# in the same transaction as each Order insert, so dashboard reads never scan
+# the Order table. `flask rebuild-rollups` recomputes them from raw orders.
+ROLLUP_ITEM_COLUMNS = ('sandwich_id', 'crisps_id', 'snack_id')
+
+
+def date_key(value):
+    """Normalise a SQL date() result to a 'YYYY-MM-DD' string"""
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def upsert_increments(model, key_columns, rows):
+    """Insert rollup rows, adding to the existing counters on key conflicts
+
+    rows is a list of dicts with unique keys. SQLite and PostgreSQL get a
+    single multi-row INSERT ... ON CONFLICT DO UPDATE; other databases fall
+    back to UPDATE-then-INSERT per row.
+    """
+    if not rows:
+        return
+    
+    value_columns = [column for column in rows[0] if column not in key_columns]
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: getattr(model, column) + stmt.excluded[column] for column in value_columns},
+        )
+        db.session.execute(stmt)
+        return
+    
+    for row in rows:
+        keys = {column: row[column] for column in key_columns}
+        updated = model.query.filter_by(**keys).update(
+            {getattr(model, column): getattr(model, column) + row[column] for column in value_columns},
+            synchronize_session=False,
+        )
+        if not updated:
+            db.session.add(model(**row))
+
+
+def record_order_rollups(orders):
+    """Add a batch of new order rows (dicts of Order columns) to the daily rollups (caller commits)"""
+    daily = {}
+    items = {}
+    
+    for order in orders:
+        day = order['order_date'].date()
+        totals = daily.setdefault(day, {'day': day, 'revenue_pence': 0, 'order_count': 0,
+                                        'offer_count': 0, 'savings_pence': 0})
+        # A catering line counts as quantity meals
+        quantity = order['quantity']
+        totals['revenue_pence'] += order['total_pence']
+        totals['order_count'] += quantity
+        totals['offer_count'] += quantity if order['offer_applied'] else 0
+        totals['savings_pence'] += order.get('savings_pence') or 0
+        
+        for column in ROLLUP_ITEM_COLUMNS:
+            item_id = order[column]
+            row = items.setdefault((day, item_id), {'day': day, 'item_id': item_id, 'count': 0})
+            row['count'] += quantity
+    
+    upsert_increments(DailySales, ('day',), list(daily.values()))
+    upsert_increments(DailyItemSales, ('day', 'item_id'), list(items.values()))
+
+
+def compute_daily_rollups(start_day, end_day):
+    """Aggregate raw orders for days in [start_day, end_day) into rollup rows"""
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+    day = func.date(Order.order_date)
+    in_range = and_(Order.order_date >= start, Order.order_date < end)
+    
+    daily_rows = db.session.query(
+        day,
+        func.sum(Order.total_pence),
+        func.sum(Order.quantity),
+        func.sum(case((Order.offer_applied, Order.quantity), else_=0)),
+        func.coalesce(func.sum(Order.savings_pence), 0),
+    ).filter(in_range).group_by(day).all()
+    
+    daily = [{
+        'day': date.fromisoformat(date_key(row[0])),
+        'revenue_pence': int(row[1]),
+        'order_count': int(row[2]),
+        'offer_count': int(row[3]),
+        'savings_pence': int(row[4]),
+    } for row in daily_rows]
+    
+    # An item moved to another category can show up in two columns on one day
+    items = {}
+    for attribute in ROLLUP_ITEM_COLUMNS:
+        column = getattr(Order, attribute)
+        item_rows = db.session.query(day, column, func.sum(Order.quantity)) \
+            .filter(in_range).group_by(day, column).all()
+        for row_day, item_id, count in item_rows:
+            key = (date.fromisoformat(date_key(row_day)), item_id)
+            row = items.setdefault(key, {'day': key[0], 'item_id': item_id, 'count': 0})
+            row['count'] += int(count)
+    
+    return daily, list(items.values())
+
+
+def rebuild_rollups(batch_days=31, check_only=False):
+    """Recompute the rollup tables from the Order table, one batch of days at a time
+
+    With check_only=True nothing is written; the days whose stored rollup
+    differs from the raw orders are returned instead.
+    """
+    first, last = db.session.query(func.min(Order.order_date), func.max(Order.order_date)).one()
+    mismatched_days = []
+    if first is None:
+        if not check_only:
+            DailyItemSales.query.delete()
+            DailySales.query.delete()
+            db.session.commit()
+        return mismatched_days
+    
+    if not check_only:
+        # Rollup rows outside the order date range can't be recomputed, so clear them up front
+        start_day = first.date()
+        end_day = last.date() + timedelta(days=1)
+        for model in (DailyItemSales, DailySales):
+            model.query.filter(or_(model.day < start_day, model.day >= end_day)).delete()
+        db.session.commit()
+    
+    batch_start = first.date()
+    end_day = last.date() + timedelta(days=1)
+    while batch_start < end_day:
+        batch_end = min(batch_start + timedelta(days=batch_days), end_day)
+        daily, items = compute_daily_rollups(batch_start, batch_end)
+        
+        if check_only:
+            stored = {row.day: row for row in DailySales.query.filter(
+                DailySales.day >= batch_start, DailySales.day < batch_end)}
+            for row in daily:
+                existing = stored.pop(row['day'], None)
+                if (existing is None
+                        or existing.order_count != row['order_count']
+                        or existing.offer_count != row['offer_count']
+                        or existing.revenue_pence != row['revenue_pence']
+                        or existing.savings_pence != row['savings_pence']):
+                    mismatched_days.append(row['day'])
+            mismatched_days.extend(stored)
+        else:
+            for model in (DailyItemSales, DailySales):
+                model.query.filter(model.day >= batch_start, model.day < batch_end).delete()
+            if daily:
+                db.session.execute(db.insert(DailySales), daily)
+            if items:
+                db.session.execute(db.insert(DailyItemSales), items)
+            db.session.commit()
+        
+        batch_start = batch_end
+    
+    if not check_only:
+        orders_changed()
+    return sorted(mismatched_days)
+
+
+@app.cli.command('rebuild-rollups')
+@click.option('--batch-days', default=31, show_default=True, help='Days of orders to aggregate per batch.')
+@click.option('--check', is_flag=True, help='Only report days whose rollup differs from the raw orders.')
+def rebuild_rollups_command(batch_days, check):
+    """Recompute the daily sales rollup tables from the Order table"""
+    mismatched_days = rebuild_rollups(batch_days=batch_days, check_only=check)
+    if check:
+        if mismatched_days:
+            click.echo(f'{len(mismatched_days)} day(s) out of sync: '
+                       + ', '.join(day.isoformat() for day in mismatched_days))
+            raise SystemExit(1)
+        click.echo('Rollups match the Order table')
+    else:
+        click.echo('Rollups rebuilt')
+
+
+# ANALYTICS QUERIES
+dashboard_cache = TTLCache(ttl=app.config['ANALYTICS_CACHE_TTL'])
+
+
+def orders_changed():
+    """Drop cached analytics after orders (or their rollups) change"""
+    dashboard_cache.invalidate()
+
+
+def get_dashboard_data(days=30):
+    """Everything the analytics page shows, from one pass over each rollup table"""
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
+    
+    total_orders = offers_applied = revenue_pence = savings_pence = 0
+    daily = {'dates': [], 'sales': [], 'orders': []}
+    
+    for day, day_revenue, order_count, offer_count, day_savings in db.session.query(
+            DailySales.day, DailySales.revenue_pence, DailySales.order_count,
+            DailySales.offer_count, DailySales.savings_pence).order_by(DailySales.day):
+        total_orders += order_count
+        revenue_pence += day_revenue
+        savings_pence += day_savings
+        offers_applied += offer_count
+        if day >= start_day:
+            daily['dates'].append(day.isoformat())
+            daily['sales'].append(day_revenue / 100)
+            daily['orders'].append(order_count)
+    total_revenue = revenue_pence / 100
+    
+    top_items = top_items_payload(get_item_counts())
+    
+    return {
+        'stats': {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'total_savings': savings_pence / 100,
+            'offers_applied': offers_applied,
+            'avg_order_value': total_revenue / total_orders if total_orders > 0 else 0,
         },
-        'crisps': {
-            'labels': [item[0] for item in top_crisps],
-            'data': [item[1] for item in top_crisps]
+        'daily_sales': daily,
+        'top_items': top_items,
+        'offer_stats': {
+            'labels': ['Lunch Offer Applied', 'Regular Pricing'],
+            'data': [offers_applied, total_orders - offers_applied]
         },
-        'snacks': {
-            'labels': [item[0] for item in top_snacks],
-            'data': [item[1] for item in top_snacks]
-        }
-    })
+    }
+
+
+def get_item_counts():
+    """{item_id: units sold} over all days, from the item rollup"""
+    return {item_id: int(count) for item_id, count in db.session.query(
+        DailyItemSales.item_id, func.sum(DailyItemSales.count)).group_by(DailyItemSales.item_id)}
+
+
+def top_items_by_category(item_counts, limit=5):
+    """Split {item_id: count} into the top (name, count) pairs of each category
+
+    Names and categories come from the menu cache, so renamed items keep
+    their sales history.
+    """
+    menu = menu_naming(item_counts)
+    by_category = {'sandwich': [], 'crisps': [], 'snack': []}
+    for item_id, count in item_counts.items():
+        entry = menu.items.get(item_id)
+        if entry is not None:
+            by_category.setdefault(entry.category, []).append((entry.name, count))
+    return {category: sorted(items, key=lambda item: (-item[1], item[0]))[:limit]
+            for category, items in by_category.items()}
+
+
+def top_items_payload(item_counts, limit=5):
+    """Chart labels/data for the top items of each category"""
+    top = top_items_by_category(item_counts, limit)
+    return {key: {'labels': [item[0] for item in top[category]], 'data': [item[1] for item in top[category]]}
+            for category, key in (('sandwich', 'sandwiches'), ('crisps', 'crisps'), ('snack', 'snacks'))}
+
+
+def get_cached_dashboard(days=30):
+    """get_dashboard_data() memoised for ANALYTICS_CACHE_TTL seconds per days value
+
+    Results read from the replica are cached apart from primary ones, so a
+    session that just wrote never gets an older replica result.
+    """
+    return dashboard_cache.get_or_compute(('dashboard', days, read_replica.reading_replica()),
+                                          lambda: get_dashboard_data(days))
+
+
+def get_daily_sales(days=30):
+    """Revenue and order count per day for the last N days, oldest first"""
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
+    
+    rows = db.session.query(DailySales.day, DailySales.revenue_pence, DailySales.order_count) \
+        .filter(DailySales.day >= start_day) \
+        .order_by(DailySales.day) \
+        .all()
+    
+    return {
+        'dates': [row[0].isoformat() for row in rows],
+        'sales': [row[1] / 100 for row in rows],
+        'orders': [row[2] for row in rows]
+    }
+
+
+def get_top_items(category, limit=5):
+    """Most ordered items in a category as (name, count) pairs"""
+    return top_items_by_category(get_item_counts(), limit).get(category, [])
+
+
+def get_offer_counts():
+    """Return (offer_count, regular_count) from one aggregate query"""
+    stats = get_order_stats()
+    offer_count = stats['offers_applied']
+    return offer_count, stats['total_orders'] - offer_count
+
+
+# ANALYTICS ROUTES
+@app.route('/analytics')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def analytics():
+    """Sales analytics dashboard with charts"""
+    stats = get_cached_dashboard()['stats']
+    
+    return render_template('analytics.html',
+                         total_orders=stats['total_orders'],
+                         total_revenue=stats['total_revenue'],
+                         total_savings=stats['total_savings'],
+                         avg_order_value=stats['avg_order_value'],
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/api/analytics/dashboard')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def api_dashboard():
+    """API endpoint for all analytics page data in one payload"""
+    days = max(1, min(request.args.get('days', 30, type=int), 3650))
+    return jsonify(get_cached_dashboard(days))
+
+
+@app.route('/api/analytics/daily-sales')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def api_daily_sales():
+    """API endpoint for daily sales data"""
+    days = int(request.args.get('days', 30))
+    return jsonify(get_daily_sales(days))
+
+
+@app.route('/api/analytics/top-items')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
+def api_top_items():
+    """API endpoint for top selling items by category"""
+    return jsonify(top_items_payload(get_item_counts()))
 
 
 @app.route('/api/analytics/offer-stats')
 @admin_required
+@read_replica.replica_reads
+@admission.admit(admission.REPORTING)
 def api_offer_stats():
     """API endpoint for offer vs regular pricing stats"""
-    all_orders = Order.query.all()
-    
-    offer_count = sum(1 for order in all_orders if order.offer_applied)
-    regular_count = len(all_orders) - offer_count
+    offer_count, regular_count = get_offer_counts()
     
     return jsonify({
         'labels': ['Lunch Offer Applied', 'Regular Pricing'],
@@ -440,6 +1711,7 @@ def admin_dashboard():
         try:
             db.create_all()
             initialize_default_menu()
+            initialize_default_promotions()
             flash('Database initialized. Please try again.', 'success')
             return redirect(url_for('admin_dashboard'))
         except Exception as e2:
@@ -470,7 +1742,7 @@ def admin_add_item():
         )
         
         db.session.add(new_item)
-        db.session.commit()
+        commit_menu_change()
         
         flash(f'Added "{name}" successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
@@ -491,7 +1763,7 @@ def admin_edit_item(item_id):
         item.is_premium = request.form.get('is_premium') == 'on'
         item.is_active = request.form.get('is_active') == 'on'
         
-        db.session.commit()
+        commit_menu_change()
         
         flash(f'Updated "{item.name}" successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
@@ -505,25 +1777,1327 @@ def admin_delete_item(item_id):
     """Delete a menu item (soft delete - just marks as inactive)"""
     item = MenuItem.query.get_or_404(item_id)
     item.is_active = False
-    db.session.commit()
+    commit_menu_change()
     
     flash(f'Deleted "{item.name}" successfully!', 'success')
     return redirect(url_for('admin_dashboard'))
 
 
-# Create database tables and initialize menu
-with app.app_context():
+# BULK MENU CHANGES
+MENU_CATEGORIES = ('sandwich', 'crisps', 'snack')
+MENU_COLUMNS = ('name', 'category', 'price', 'is_premium', 'is_active')
+MENU_REQUIRED_COLUMNS = ('name', 'category', 'price')
+MENU_FORMATS = {'csv': 'text/csv', 'json': 'application/json'}
+
+
+def read_menu_records(stream, fmt='csv'):
+    """Menu item records (dicts) from a CSV or JSON upload
+
+    JSON may be a list of items or {"items": [...]}; CSV needs a header row
+    with name, category and price columns (is_premium and is_active are optional).
+    Raises ValueError for a file without items, so an empty or mislabelled
+    upload can never deactivate the whole menu.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        missing = [column for column in MENU_REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"The CSV header needs {', '.join(MENU_REQUIRED_COLUMNS)} columns "
+                             f"(missing {', '.join(missing)})")
+        records = list(reader)
+    else:
+        records = json.load(stream)
+        if isinstance(records, dict):
+            records = records.get('items')
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError('Send a list of items or {"items": [...]}')
+    if not records:
+        raise ValueError('The file has no menu items')
+    return records
+
+
+def parse_flag(value):
+    """True/False from a CSV or JSON value, or None if it was left blank"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on'):
+        return True
+    if str(value).strip().lower() in ('0', 'false', 'no', 'n', 'off'):
+        return False
+    raise ValueError(f'{value!r} is not true or false')
+
+
+def plan_menu_changes(records, deactivate_missing=False):
+    """Diff uploaded items against the MenuItem table, returning (plan, errors)
+
+    Items are matched by name, using one query for every existing row.
+    plan holds the rows to insert, the changed rows to update (by id) and
+    the ids to deactivate; nothing is written. Blank is_premium/is_active
+    values keep an existing item's setting. With deactivate_missing, active
+    items that aren't in the upload are switched off (a full seasonal menu).
+    """
+    existing = {row.name: row for row in db.session.execute(
+        select(MenuItem.id, MenuItem.name, MenuItem.category, MenuItem.price, MenuItem.is_premium,
+               MenuItem.is_active))}
+    plan = {'create': [], 'update': [], 'deactivate': [], 'unchanged': 0}
+    errors = []
+    seen = set()
+    
+    for index, record in enumerate(records):
+        name = str(record.get('name') or '').strip()
+        try:
+            if not name:
+                raise ValueError('name is missing')
+            if name in seen:
+                raise ValueError(f'"{name}" appears more than once')
+            seen.add(name)
+            category = str(record.get('category') or '').strip().lower()
+            if category not in MENU_CATEGORIES:
+                raise ValueError(f'category must be one of {", ".join(MENU_CATEGORIES)}')
+            try:
+                price = float(record.get('price'))
+            except (TypeError, ValueError):
+                raise ValueError('price must be a number') from None
+            if not math.isfinite(price):
+                raise ValueError('price must be a number')
+            if price < 0:
+                raise ValueError('prices cannot be negative')
+            is_premium = parse_flag(record.get('is_premium'))
+            is_active = parse_flag(record.get('is_active'))
+        except ValueError as e:
+            errors.append({'index': index, 'name': name, 'error': str(e)})
+            continue
+        
+        row = existing.get(name)
+        if row is None:
+            plan['create'].append({'name': name, 'category': category, 'price': price,
+                                   'is_premium': bool(is_premium), 'is_active': is_active is not False})
+            continue
+        values = {'category': category, 'price': price,
+                  'is_premium': row.is_premium if is_premium is None else is_premium,
+                  'is_active': row.is_active if is_active is None else is_active}
+        if (values['category'], to_pence(values['price']), bool(values['is_premium']), bool(values['is_active'])) == (
+                row.category, to_pence(row.price), bool(row.is_premium), bool(row.is_active)):
+            plan['unchanged'] += 1
+        else:
+            plan['update'].append(dict(values, id=row.id, name=name, old_price=row.price))
+    
+    if deactivate_missing:
+        plan['deactivate'] = [{'id': row.id, 'name': row.name} for name, row in existing.items()
+                              if row.is_active and name not in seen]
+    return plan, errors
+
+
+def apply_menu_plan(plan):
+    """Write a plan_menu_changes() plan in one transaction with one menu version bump"""
+    if not (plan['create'] or plan['update'] or plan['deactivate']):
+        return
+    try:
+        if plan['create']:
+            db.session.execute(db.insert(MenuItem), plan['create'])
+        if plan['update']:
+            db.session.execute(db.update(MenuItem), [{column: row[column] for column in (
+                'id', 'category', 'price', 'is_premium', 'is_active')} for row in plan['update']])
+        if plan['deactivate']:
+            db.session.execute(db.update(MenuItem).where(MenuItem.id.in_([row['id'] for row in plan['deactivate']]))
+                               .values(is_active=False))
+        commit_menu_change()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def plan_price_adjustment(category, percent, round_to_pence=1):
+    """Plan a percentage change to every active price in a category, rounded to round_to_pence
+
+    Returns a plan in the plan_menu_changes() shape, so apply_menu_plan()
+    writes it. Raises ValueError for an unknown category or a cut of 100% or more.
+    """
+    if category not in MENU_CATEGORIES:
+        raise ValueError(f'category must be one of {", ".join(MENU_CATEGORIES)}')
+    if not math.isfinite(percent):
+        raise ValueError('percent must be a number')
+    if percent <= -100:
+        raise ValueError('Prices can be cut by less than 100%')
+    if round_to_pence < 1:
+        raise ValueError('Round to at least 1p')
+    
+    plan = {'create': [], 'update': [], 'deactivate': [], 'unchanged': 0}
+    rows = db.session.execute(
+        select(MenuItem.id, MenuItem.name, MenuItem.category, MenuItem.price, MenuItem.is_premium)
+        .where(MenuItem.category == category, MenuItem.is_active.is_(True)))
+    for row in rows:
+        pence = round(to_pence(row.price) * (1 + percent / 100) / round_to_pence) * round_to_pence
+        if pence == to_pence(row.price):
+            plan['unchanged'] += 1
+            continue
+        plan['update'].append({'id': row.id, 'name': row.name, 'category': row.category, 'price': pence / 100,
+                               'is_premium': row.is_premium, 'is_active': True, 'old_price': row.price})
+    return plan
+
+
+def menu_plan_summary(plan):
+    """JSON-friendly description of a plan"""
+    return {
+        'created': [row['name'] for row in plan['create']],
+        'updated': [{'name': row['name'], 'old_price': row['old_price'], 'price': row['price']}
+                    for row in plan['update']],
+        'deactivated': [row['name'] for row in plan['deactivate']],
+        'unchanged': plan['unchanged'],
+    }
+
+
+def iter_menu_csv():
+    """The whole menu as CSV, in the format read_menu_records() accepts"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MENU_COLUMNS)
+    for item in MenuItem.query.order_by(MenuItem.category, MenuItem.name):
+        writer.writerow((item.name, item.category, f'{item.price:.2f}', int(bool(item.is_premium)),
+                         int(bool(item.is_active))))
+    return buffer.getvalue()
+
+
+@app.route('/admin/menu/bulk', methods=['GET', 'POST'])
+@admin_required
+def admin_menu_bulk():
+    """Upload a whole menu or change a category's prices in one go"""
+    plan = None
+    errors = []
+    preview = request.form.get('preview') == 'on'
+    if request.method == 'POST':
+        try:
+            if request.form.get('action') == 'adjust':
+                plan = plan_price_adjustment(request.form.get('category'),
+                                             float(request.form.get('percent') or 0),
+                                             int(request.form.get('round_to') or 1))
+            else:
+                upload = request.files.get('file')
+                if upload is None or not upload.filename:
+                    raise ValueError('Please choose a CSV or JSON file')
+                fmt = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+                plan, errors = plan_menu_changes(read_menu_records(upload.stream, fmt),
+                                                 deactivate_missing=request.form.get('deactivate_missing') == 'on')
+        except (KeyError, ValueError) as e:
+            flash(str(e), 'error')
+            plan = None
+        
+        if errors:
+            flash(f'{len(errors)} rows have problems - nothing was changed', 'error')
+        elif plan is not None and not preview:
+            apply_menu_plan(plan)
+            flash(f"Menu updated: {len(plan['create'])} added, {len(plan['update'])} changed, "
+                  f"{len(plan['deactivate'])} deactivated", 'success')
+            return redirect(url_for('admin_dashboard'))
+    
+    return render_template('admin_menu_bulk.html',
+                         plan=plan,
+                         errors=errors,
+                         categories=MENU_CATEGORIES,
+                         form=request.form,
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/api/menu/export')
+@admin_required
+def api_menu_export():
+    """Download the menu as CSV, ready to edit and upload again"""
+    return Response(iter_menu_csv(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=menu.csv'})
+
+
+@app.route('/api/menu/import', methods=['POST'])
+@admin_required
+def api_menu_import():
+    """Apply a CSV or JSON menu upload (?format=csv|json, ?deactivate_missing=1, ?dry_run=1)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in MENU_FORMATS:
+        return jsonify({'error': 'format must be csv or json'}), 400
+    
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+    try:
+        plan, errors = plan_menu_changes(read_menu_records(stream, fmt),
+                                         deactivate_missing=request.args.get('deactivate_missing') == '1')
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid menu file: {e}'}), 400
+    if errors:
+        return jsonify({'errors': errors}), 400
+    if request.args.get('dry_run') != '1':
+        apply_menu_plan(plan)
+    return jsonify(menu_plan_summary(plan))
+
+
+@app.route('/api/menu/adjust-prices', methods=['POST'])
+@admin_required
+def api_menu_adjust_prices():
+    """Change every active price in a category by a percentage
+
+    Body: {"category": "crisps", "percent": 10, "round_to": 5} (round_to is
+    in pence, default 1). Add "dry_run": true to see the new prices first.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        plan = plan_price_adjustment(payload.get('category'), float(payload.get('percent')),
+                                     int(payload.get('round_to') or 1))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not payload.get('dry_run'):
+        apply_menu_plan(plan)
+    return jsonify(menu_plan_summary(plan))
+
+
+def parse_promotion_form(form):
+    """PromotionRule columns from the admin form, raising ValueError if something is missing or invalid"""
+    name = form.get('name', '').strip()
+    kind = form.get('kind')
+    if not name:
+        raise ValueError('Please give the promotion a name')
+    if kind not in promotions.RULE_KINDS:
+        raise ValueError('Please choose a kind of promotion')
     try:
-        db.create_all()
-        print("Database tables created successfully")
-        initialize_default_menu()
-        print("Default menu initialized")
+        price = float(form.get('price', ''))
+    except ValueError:
+        raise ValueError('Please enter a valid price') from None
+    if price < 0:
+        raise ValueError('Prices cannot be negative')
+    
+    item_id = int(form['item_id']) if form.get('item_id') else None
+    applies_to = form.get('applies_to') or 'standard'
+    if applies_to not in promotions.DEAL_SCOPES:
+        raise ValueError('Please choose which sandwiches the deal covers')
+    min_quantity = int(form['min_quantity']) if form.get('min_quantity') else None
+    if kind in (promotions.ITEM_PRICE, promotions.MULTI_BUY) or applies_to == 'item':
+        if item_id is None or db.session.get(MenuItem, item_id) is None:
+            raise ValueError('Please choose the menu item this promotion is for')
+    if kind == promotions.MULTI_BUY and (min_quantity is None or min_quantity < 2):
+        raise ValueError('A multi-buy needs a quantity of at least 2')
+    
+    days = sum(1 << int(day) for day in form.getlist('days'))
+    if not days:
+        raise ValueError('Please choose at least one day')
+    start_time = datetime.strptime(form['start_time'], '%H:%M').time() if form.get('start_time') else None
+    end_time = datetime.strptime(form['end_time'], '%H:%M').time() if form.get('end_time') else None
+    starts_on = date.fromisoformat(form['starts_on']) if form.get('starts_on') else None
+    ends_on = date.fromisoformat(form['ends_on']) if form.get('ends_on') else None
+    if starts_on and ends_on and ends_on < starts_on:
+        raise ValueError('The end date is before the start date')
+    
+    return {
+        'name': name,
+        'kind': kind,
+        'price': price,
+        'item_id': item_id,
+        'applies_to': applies_to,
+        'min_quantity': min_quantity if kind == promotions.MULTI_BUY else None,
+        'location': form.get('location') or None,
+        'days': days,
+        'start_time': start_time,
+        'end_time': end_time,
+        'starts_on': starts_on,
+        'ends_on': ends_on,
+    }
+
+
+@app.route('/admin/promotions', methods=['GET', 'POST'])
+@admin_required
+def admin_promotions():
+    """List promotion rules and add new ones"""
+    if request.method == 'POST':
+        try:
+            rule = PromotionRule(**parse_promotion_form(request.form))
+        except ValueError as e:
+            flash(str(e), 'error')
+        else:
+            db.session.add(rule)
+            commit_menu_change()
+            flash(f'Added promotion "{rule.name}"', 'success')
+            return redirect(url_for('admin_promotions'))
+    
+    menu = menu_cache.get()
+    now = datetime.now()
+    location = app.config['STORE_LOCATION'] or None
+    live = get_promotion_book(menu, now.date()).live_rules(location, promotions.minute_of_day(now))
+    rules = PromotionRule.query.order_by(PromotionRule.is_active.desc(), PromotionRule.kind, PromotionRule.id).all()
+    return render_template('admin_promotions.html',
+                         rules=rules,
+                         live_ids={rule.id for rule in live},
+                         items=sorted((entry for entry in menu.items.values() if entry.is_active),
+                                      key=lambda entry: (entry.category, entry.name)),
+                         item_names={entry.id: entry.name for entry in menu.items.values()},
+                         locations=[store['name'] for store in STORE_LOCATIONS],
+                         store_location=location,
+                         weekdays=promotions.WEEKDAYS,
+                         describe_days=promotions.describe_days,
+                         form=request.form,
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/admin/promotions/<int:rule_id>/toggle', methods=['POST'])
+@admin_required
+def admin_toggle_promotion(rule_id):
+    """Switch a promotion on or off"""
+    rule = db.get_or_404(PromotionRule, rule_id)
+    rule.is_active = not rule.is_active
+    commit_menu_change()
+    
+    flash(f'{"Enabled" if rule.is_active else "Disabled"} "{rule.name}"', 'success')
+    return redirect(url_for('admin_promotions'))
+
+
+@app.route('/admin/promotions/<int:rule_id>/delete', methods=['POST'])
+@admin_required
+def admin_delete_promotion(rule_id):
+    """Delete a promotion rule (orders keep the prices they were charged)"""
+    rule = db.get_or_404(PromotionRule, rule_id)
+    name = rule.name
+    db.session.delete(rule)
+    commit_menu_change()
+    
+    flash(f'Deleted "{name}"', 'success')
+    return redirect(url_for('admin_promotions'))
+
+
+@app.route('/admin/catering', methods=['GET', 'POST'])
+@admin_required
+@admission.admit(admission.ORDERS)
+def admin_catering():
+    """Take a phoned-in catering order: many meals, one transaction"""
+    menu = menu_cache.get()
+    
+    if request.method == 'POST':
+        lines = []
+        for sandwich, crisp, snack, quantity in zip(request.form.getlist('sandwich'), request.form.getlist('crisp'),
+                                                    request.form.getlist('snack'), request.form.getlist('quantity')):
+            # Blank rows of the form are skipped
+            if not (sandwich and crisp and snack) or not quantity.strip():
+                continue
+            try:
+                lines.append((sandwich, crisp, snack, int(quantity)))
+            except ValueError:
+                flash(f'"{quantity}" is not a valid quantity', 'error')
+                break
+        else:
+            try:
+                catering_order = save_catering_order(request.form.get('customer_name', '').strip(), lines,
+                                                     notes=request.form.get('notes', '').strip())
+            except UnknownItemError as e:
+                flash(f'{e.name} is no longer on the menu', 'error')
+            except ValueError as e:
+                flash(str(e), 'error')
+            else:
+                return redirect(url_for('admin_catering_order', catering_order_id=catering_order.id))
+    
+    return render_template('admin_catering.html',
+                         sandwiches=menu.sandwiches,
+                         crisps=menu.crisps,
+                         snacks=menu.snacks,
+                         line_count=10,
+                         form=request.form,
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/admin/catering/<int:catering_order_id>')
+@admin_required
+def admin_catering_order(catering_order_id):
+    """Confirmation for one catering order"""
+    catering_order = db.get_or_404(CateringOrder, catering_order_id)
+    return render_template('catering_result.html',
+                         order=catering_order_payload(catering_order),
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/api/catering-orders', methods=['POST'])
+@admin_required
+@admission.admit(admission.ORDERS)
+def api_catering_orders():
+    """API endpoint to place a catering order
+
+    Body: {"customer_name": ..., "notes": ..., "lines": [{"sandwich": ...,
+    "crisp": ..., "snack": ..., "quantity": 12}, ...]}
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('lines'), list):
+        return jsonify({'error': 'Send {"customer_name": ..., "lines": [...]}'}), 400
+    try:
+        lines = [(line.get('sandwich'), line.get('crisp', line.get('crisps')), line.get('snack'),
+                  int(line.get('quantity', 1))) for line in payload['lines']]
+        catering_order = save_catering_order(str(payload.get('customer_name') or '').strip(), lines,
+                                             notes=payload.get('notes'))
+    except UnknownItemError as e:
+        return jsonify({'error': str(e), 'category': e.category, 'name': e.name}), 400
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(catering_order_payload(catering_order)), 201
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics for this worker (admin session or METRICS_TOKEN bearer token)"""
+    token = app.config['METRICS_TOKEN']
+    authorized = session.get('admin_logged_in') or (
+        token and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+    if not authorized:
+        return 'Unauthorized', 401
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/order-queue/stats')
+@admin_required
+def api_order_queue_stats():
+    """API endpoint for write-behind order queue counters"""
+    return jsonify(dict(order_queue.stats(), durability=app.config['ORDER_DURABILITY']))
+
+
+@app.route('/api/menu-cache/stats')
+@admin_required
+def api_menu_cache_stats():
+    """API endpoint for menu cache hit/miss/rebuild counters"""
+    return jsonify(menu_cache.stats())
+
+
+@app.route('/api/admission/stats')
+@admin_required
+def api_admission_stats():
+    """API endpoint for admission control slots and queues per route class"""
+    return jsonify(dict(admission.controller.stats(), enabled=admission.controller.enabled,
+                        thread_limit=admission.controller.thread_limit, active=admission.controller.active))
+
+
+# ORDER EXPORT / IMPORT
+EXPORT_COLUMNS = ('id', 'order_date', 'sandwich', 'crisps', 'snack', 'sandwich_price',
+                  'crisps_price', 'snack_price', 'total_price', 'offer_applied', 'savings', 'quantity')
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Exports carry item names and prices in pounds, so a file can be loaded into
+# a database whose MenuItem ids differ
+EXPORT_ITEM_COLUMNS = (('sandwich', 'sandwich_id'), ('crisps', 'crisps_id'), ('snack', 'snack_id'))
+EXPORT_PRICE_COLUMNS = (('sandwich_price', 'sandwich_pence'), ('crisps_price', 'crisps_pence'),
+                        ('snack_price', 'snack_pence'), ('total_price', 'total_pence'),
+                        ('savings', 'savings_pence'))
+
+
+def parse_date_arg(value):
+    """Parse an optional YYYY-MM-DD query argument, raising ValueError if invalid"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def iter_order_export(fmt='csv', start=None, end=None, batch_size=None):
+    """Yield an order export as text chunks, one chunk per batch of rows
+
+    Rows are streamed with yield_per (a server-side cursor where the driver
+    supports one), so memory use doesn't grow with the size of the table.
+    end is exclusive.
+    """
+    if batch_size is None:
+        batch_size = app.config['EXPORT_BATCH_SIZE']
+    
+    query = select(Order.id, Order.order_date, Order.offer_applied, Order.quantity,
+                   *[getattr(Order, column) for _, column in EXPORT_ITEM_COLUMNS + EXPORT_PRICE_COLUMNS])
+    if start:
+        query = query.where(Order.order_date >= start)
+    if end:
+        query = query.where(Order.order_date < end)
+    query = query.order_by(Order.id).execution_options(yield_per=batch_size)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(EXPORT_COLUMNS)
+    
+    for partition in db.session.execute(query).partitions():
+        menu = menu_naming({row._mapping[column] for row in partition for _, column in EXPORT_ITEM_COLUMNS})
+        for row in partition:
+            row = row._mapping
+            values = {
+                'id': row['id'],
+                'order_date': row['order_date'].isoformat() if row['order_date'] else None,
+                'offer_applied': row['offer_applied'],
+                'quantity': row['quantity'],
+            }
+            for name, column in EXPORT_ITEM_COLUMNS:
+                values[name] = item_name(menu, row[column])
+            for name, column in EXPORT_PRICE_COLUMNS:
+                values[name] = row[column] / 100
+            if fmt == 'csv':
+                writer.writerow(values[column] for column in EXPORT_COLUMNS)
+            else:
+                buffer.write(json.dumps(values) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def parse_order_record(record):
+    """Convert one exported record (CSV strings or JSON values) to typed values
+
+    Items are still names here; import_orders() turns them into MenuItem ids.
+    """
+    row = {
+        'sandwich': record['sandwich'],
+        'crisps': record['crisps'],
+        'snack': record['snack'],
+        'sandwich_price': float(record['sandwich_price']),
+        'crisps_price': float(record['crisps_price']),
+        'snack_price': float(record['snack_price']),
+        'total_price': float(record['total_price']),
+        'offer_applied': record['offer_applied'] in (True, 1, '1', 'true', 'True'),
+        'savings': float(record.get('savings') or 0),
+        'order_date': datetime.fromisoformat(record['order_date']),
+        # Files exported before catering orders have no quantity column
+        'quantity': int(record.get('quantity') or 1),
+    }
+    if record.get('id') not in (None, ''):
+        row['id'] = int(record['id'])
+    return row
+
+
+def iter_import_records(stream, fmt='csv'):
+    """Yield parsed order rows from a binary stream of CSV or NDJSON"""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        records = csv.DictReader(text_stream)
+    else:
+        records = (json.loads(line) for line in text_stream if line.strip())
+    for record in records:
+        yield parse_order_record(record)
+
+
+def sync_order_id_sequence():
+    """Move the PostgreSQL order id sequence past any explicitly imported ids"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    sequence = db.session.execute(text("SELECT pg_get_serial_sequence('\"order\"', 'id')")).scalar()
+    max_id = db.session.query(func.max(Order.id)).scalar() or 0
+    last_value = db.session.execute(text(f'SELECT last_value FROM {sequence}')).scalar()
+    if max_id > last_value:
+        db.session.execute(text('SELECT setval(:sequence, :value)'), {'sequence': sequence, 'value': max_id})
+
+
+class MenuItemResolver:
+    """Maps item names to MenuItem ids for imports
+
+    Names that aren't in the database (e.g. items deleted long ago) are added
+    as inactive items so the imported orders keep their names.
+    """
+    
+    def __init__(self):
+        self.ids = {name: item_id for item_id, name in db.session.query(MenuItem.id, MenuItem.name)}
+        self.created = 0
+    
+    def resolve(self, name, category, price):
+        item_id = self.ids.get(name)
+        if item_id is None:
+            item = MenuItem(name=name, price=price, category=category, is_active=False)
+            db.session.add(item)
+            db.session.flush()
+            item_id = self.ids[name] = item.id
+            self.created += 1
+        return item_id
+    
+    def order_row(self, record):
+        """Convert a parse_order_record() dict to Order column values"""
+        row = {
+            'sandwich_id': self.resolve(record['sandwich'], 'sandwich', record['sandwich_price']),
+            'crisps_id': self.resolve(record['crisps'], 'crisps', record['crisps_price']),
+            'snack_id': self.resolve(record['snack'], 'snack', record['snack_price']),
+            'offer_applied': record['offer_applied'],
+            'order_date': record['order_date'],
+            'quantity': record['quantity'],
+        }
+        for name, column in EXPORT_PRICE_COLUMNS:
+            row[column] = to_pence(record[name])
+        if 'id' in record:
+            row['id'] = record['id']
+        return row
+
+
+def import_orders(records, chunk_size=None):
+    """Insert parsed order records in chunked multi-row inserts, one transaction per chunk
+
+    Rollups are updated in the same transaction as each chunk. Returns the
+    number of orders imported; a chunk that fails is rolled back and the
+    error re-raised, leaving earlier chunks committed.
+    """
+    if chunk_size is None:
+        chunk_size = app.config['IMPORT_CHUNK_SIZE']
+    
+    resolver = MenuItemResolver()
+    imported = 0
+    chunk = []
+    reserved = deque()
+    
+    def flush_chunk():
+        for row in chunk:
+            if 'id' not in row:
+                row['id'] = reserved.popleft()
+        order_id_allocator.release(reserved)
+        reserved.clear()
+        try:
+            insert_orders(chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    for record in records:
+        if not chunk:
+            # Reserved before the resolver can write a new MenuItem in this chunk's transaction
+            reserved.extend(order_id_allocator.allocate(chunk_size))
+        chunk.append(resolver.order_row(record))
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+            imported += len(chunk)
+            chunk = []
+            orders_changed()
+    
+    if chunk:
+        flush_chunk()
+        imported += len(chunk)
+        orders_changed()
+    
+    sync_order_id_sequence()
+    if resolver.created:
+        commit_menu_change()
+    else:
+        db.session.commit()
+    return imported
+
+
+@app.route('/api/orders/export')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.EXPORTS)
+def api_orders_export():
+    """Stream orders as CSV or NDJSON (?format=, ?start=, ?end= YYYY-MM-DD)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        start = parse_date_arg(request.args.get('start'))
+        end = parse_date_arg(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+    
+    filename = f'orders.{fmt}'
+    return Response(stream_with_context(iter_order_export(fmt, start, end)),
+                    mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/api/orders/import', methods=['POST'])
+@admin_required
+def api_orders_import():
+    """Bulk load orders from a CSV or NDJSON upload (?format=csv|ndjson)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+    try:
+        imported = import_orders(iter_import_records(stream, fmt))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid order record: {e}'}), 400
     except Exception as e:
-        print(f"Database initialization error: {e}")
-        # Continue anyway - tables might already exist
+        return jsonify({'error': f'Import failed: {e}'}), 400
+    
+    return jsonify({'imported': imported})
+
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Delete Idempotency-Keys older than IDEMPOTENCY_KEY_TTL_HOURS (run from cron)"""
+    click.echo(f'Deleted {purge_idempotency_keys()} expired idempotency keys')
+
+
+@app.cli.command('export-orders')
+@click.argument('output', type=click.File('w'))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--start', help='First order date to include (YYYY-MM-DD).')
+@click.option('--end', help='Order date to stop before (YYYY-MM-DD).')
+def export_orders_command(output, fmt, start, end):
+    """Write orders to a CSV or NDJSON file (use - for stdout)"""
+    for chunk in iter_order_export(fmt, parse_date_arg(start), parse_date_arg(end)):
+        output.write(chunk)
+
+
+@app.cli.command('import-orders')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+def import_orders_command(source, fmt):
+    """Load orders from a CSV or NDJSON file produced by export-orders"""
+    imported = import_orders(iter_import_records(source, fmt))
+    click.echo(f'Imported {imported} orders')
+
+
+# ORDER ARCHIVE
+order_archive = OrderArchive(app.config['ORDER_ARCHIVE_DIR'])
+
+
+def archive_rows_query(start_day, end_day):
+    """Order rows for days in [start_day, end_day), in the column order append_segment reads"""
+    return select(Order.order_date, Order.sandwich_id, Order.crisps_id, Order.snack_id,
+                  Order.total_pence, Order.savings_pence, Order.offer_applied, Order.quantity) \
+        .where(Order.order_date >= datetime.combine(start_day, datetime.min.time()),
+               Order.order_date < datetime.combine(end_day, datetime.min.time())) \
+        .order_by(Order.order_date, Order.id) \
+        .execution_options(yield_per=app.config['EXPORT_BATCH_SIZE'])
+
+
+def stale_archive_days(archived, start_day, end_day):
+    """Archived days in [start_day, end_day) whose orders changed after they were archived
+
+    archived is order_archive.daily_totals() for the same range. The daily
+    rollup is updated with every insert, so an order back-dated into an
+    archived day (an import, a generated or re-dated order) leaves the
+    day's rollup disagreeing with the archive.
+    """
+    query = DailySales.query.filter(DailySales.day < end_day)
+    if start_day:
+        query = query.filter(DailySales.day >= start_day)
+    
+    stale = set(archived)
+    for row in query:
+        totals = archived.get(row.day, [0, 0])
+        if totals[0] == row.revenue_pence and totals[1] == row.order_count:
+            stale.discard(row.day)
+        else:
+            stale.add(row.day)
+    return sorted(stale)
+
+
+def compact_orders(before=None, segment_days=31, rebuild=False):
+    """Copy closed days of orders into the columnar archive, returning the rows written
+
+    Days from the archive's watermark up to (not including) before are
+    written, one segment per segment_days so memory stays bounded. Segments
+    holding days that gained orders since they were archived are rewritten
+    first. Orders stay in the Order table; reports simply stop reading them
+    from there.
+    """
+    require_numpy()
+    if rebuild:
+        order_archive.clear()
+    before = before or datetime.utcnow().date()
+    
+    archived = 0
+    start_day = order_archive.watermark()
+    if start_day is None:
+        first = db.session.query(func.min(Order.order_date)).scalar()
+        if first is None:
+            return 0
+        start_day = first.date()
+    else:
+        stale = stale_archive_days(order_archive.daily_totals(None, start_day), None, start_day)
+        for index in sorted({order_archive.segment_index(day) for day in stale}):
+            segment = order_archive.manifest()['segments'][index]
+            segment_start = from_epoch_day(segment['start_day'])
+            if index == 0:
+                # Orders dated before the archive began go into the first segment
+                segment_start = min(segment_start, stale[0])
+            segment_end = from_epoch_day(segment['end_day'])
+            archived += order_archive.rewrite_segment(
+                index, db.session.execute(archive_rows_query(segment_start, segment_end)), segment_start)
+    
+    while start_day < before:
+        end_day = min(start_day + timedelta(days=segment_days), before)
+        archived += order_archive.append_segment(db.session.execute(archive_rows_query(start_day, end_day)),
+                                                 start_day, end_day)
+        start_day = end_day
+    return archived
+
+
+def get_archive_report(start_day=None, end_day=None, limit=5):
+    """Daily sales, top items and offer stats for [start_day, end_day)
+
+    Archived days are aggregated with NumPy over the memory-mapped columns;
+    days after the archive watermark (the live tail), and archived days that
+    gained orders since compact-orders last ran, are grouped in SQL.
+    """
+    require_numpy()
+    watermark = order_archive.watermark()
+    daily = order_archive.daily_totals(start_day, end_day)
+    items = order_archive.item_counts(start_day, end_day)
+    
+    def add_live(first, last):
+        live_daily, live_items = compute_daily_rollups(first, last)
+        for row in live_daily:
+            totals = daily.setdefault(row['day'], [0, 0, 0, 0])
+            totals[0] += row['revenue_pence']
+            totals[1] += row['order_count']
+            totals[2] += row['offer_count']
+            totals[3] += row['savings_pence']
+        for row in live_items:
+            items[row['item_id']] = items.get(row['item_id'], 0) + row['count']
+    
+    if watermark is not None:
+        archived_end = min(end_day, watermark) if end_day else watermark
+        for day in stale_archive_days(daily, start_day, archived_end):
+            next_day = day + timedelta(days=1)
+            daily.pop(day, None)
+            for item_id, count in order_archive.item_counts(day, next_day).items():
+                items[item_id] -= count
+            add_live(day, next_day)
+    
+    tail_start = max(day for day in (start_day, watermark, date(1970, 1, 1)) if day)
+    tail_end = end_day or datetime.utcnow().date() + timedelta(days=2)
+    if tail_start < tail_end:
+        add_live(tail_start, tail_end)
+    items = {item_id: count for item_id, count in items.items() if count}
+    
+    days = sorted(daily)
+    total_orders = sum(daily[day][1] for day in days)
+    offers_applied = sum(daily[day][2] for day in days)
+    total_revenue = sum(daily[day][0] for day in days) / 100
+    
+    return {
+        'stats': {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'total_savings': sum(daily[day][3] for day in days) / 100,
+            'offers_applied': offers_applied,
+            'avg_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+        },
+        'daily_sales': {
+            'dates': [day.isoformat() for day in days],
+            'sales': [daily[day][0] / 100 for day in days],
+            'orders': [daily[day][1] for day in days],
+        },
+        'top_items': top_items_payload(items, limit),
+        'offer_stats': {
+            'labels': ['Lunch Offer Applied', 'Regular Pricing'],
+            'data': [offers_applied, total_orders - offers_applied]
+        },
+        'archive': {'watermark': watermark.isoformat() if watermark else None},
+    }
+
+
+@app.route('/api/analytics/archive')
+@admin_required
+@read_replica.replica_reads
+@admission.admit(admission.EXPORTS)
+def api_archive_report():
+    """API endpoint for long-range reports over the archive plus recent orders
+
+    Optional start/end query arguments (YYYY-MM-DD, end exclusive) limit the range.
+    """
+    try:
+        start = parse_date_arg(request.args.get('start'))
+        end = parse_date_arg(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    start_day = start.date() if start else None
+    end_day = end.date() if end else None
+    try:
+        report = dashboard_cache.get_or_compute(('archive', start_day, end_day, read_replica.reading_replica()),
+                                                lambda: get_archive_report(start_day, end_day))
+    except ArchiveUnavailable as error:
+        return jsonify({'error': str(error)}), 501
+    return jsonify(report)
+
+
+@app.cli.command('compact-orders')
+@click.option('--before', help='Archive days before this date (YYYY-MM-DD). Defaults to today (UTC).')
+@click.option('--segment-days', default=31, show_default=True, help='Days of orders per archive segment.')
+@click.option('--rebuild', is_flag=True, help='Delete the archive and rewrite it from the Order table.')
+def compact_orders_command(before, segment_days, rebuild):
+    """Write closed days of orders to the memory-mapped columnar archive"""
+    before_day = date.fromisoformat(before) if before else None
+    archived = compact_orders(before_day, segment_days=segment_days, rebuild=rebuild)
+    watermark = order_archive.watermark()
+    click.echo(f'Archived {archived} orders; archive covers days before '
+               f'{watermark.isoformat() if watermark else "none"}')
+
+
+# SCHEMA MIGRATIONS
+def create_missing_indexes():
+    """Create any model index that doesn't exist yet, returning the names created
+
+    db.create_all() only adds indexes when it creates a table, so existing
+    databases need this to pick up new indexes. On PostgreSQL the indexes are
+    built CONCURRENTLY so order inserts aren't blocked while they build.
+    """
+    created = []
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+                if conn.dialect.name == 'postgresql':
+                    ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                conn.exec_driver_sql(ddl)
+                created.append(index.name)
+    
+    return created
+
+
+@app.cli.command('migrate-indexes')
+def migrate_indexes_command():
+    """Add missing model indexes to an existing database"""
+    created = create_missing_indexes()
+    if created:
+        click.echo('Created indexes: ' + ', '.join(created))
+    else:
+        click.echo('All indexes already exist')
+
+
+# Name/float columns of the original Order table, converted by migrate-orders
+LEGACY_ORDER_COLUMNS = ('sandwich', 'crisps', 'snack', 'sandwich_price', 'crisps_price',
+                        'snack_price', 'total_price', 'savings')
+
+
+def legacy_order_columns():
+    """Names of the pre-compact Order columns still present in the database"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns(Order.__tablename__)}
+    return [name for name in LEGACY_ORDER_COLUMNS if name in columns]
+
+
+def prepare_order_storage():
+    """Make an existing database ready for compact orders, returning the legacy columns left
+
+    Only additive, quick DDL: new Order columns (item ids, pence,
+    quantity...) are added, PostgreSQL stops requiring the old name/price
+    columns, and the rollups are recreated keyed by item id and in integer
+    pence (they stay empty until migrate_order_storage() rebuilds them). Rows written before
+    this have no item ids or pence until they are converted, so run
+    migrate_order_storage() before the new code serves requests.
+    """
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    if Order.__tablename__ not in tables:
+        return []
+    existing = {column['name']: column for column in inspector.get_columns(Order.__tablename__)}
+    legacy = [name for name in LEGACY_ORDER_COLUMNS if name in existing]
+    rollup_columns = {column['name'] for column in inspector.get_columns(DailyItemSales.__tablename__)} \
+        if DailyItemSales.__tablename__ in tables else set()
+    sales_columns = {column['name'] for column in inspector.get_columns(DailySales.__tablename__)} \
+        if DailySales.__tablename__ in tables else set()
+    
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        table = quote(Order.__tablename__)
+        for column in Order.__table__.columns:
+            if column.name in existing:
+                continue
+            # Added as NULLable (or with a server default); old rows are filled in by migrate_order_storage()
+            ddl = f'ALTER TABLE {table} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=conn.dialect)}'
+            if column.server_default is not None:
+                ddl += f' DEFAULT {column.server_default.arg}'
+            for foreign_key in column.foreign_keys:
+                ddl += f' REFERENCES {quote(foreign_key.column.table.name)} (id)'
+            conn.execute(text(ddl))
+        if conn.dialect.name == 'postgresql':
+            for name in legacy:
+                if not existing[name]['nullable']:
+                    conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {quote(name)} DROP NOT NULL'))
+        if rollup_columns and 'item_id' not in rollup_columns:
+            conn.execute(text(f'DROP TABLE {quote(DailyItemSales.__tablename__)}'))
+            DailyItemSales.__table__.create(conn)
+        if sales_columns and 'revenue_pence' not in sales_columns:
+            conn.execute(text(f'DROP TABLE {quote(DailySales.__tablename__)}'))
+            DailySales.__table__.create(conn)
+    return legacy
+
+
+def rollups_need_rebuild():
+    """True when there are orders but the sales rollup is empty (e.g. just recreated in pence)"""
+    return db.session.query(Order.id).first() is not None and db.session.query(DailySales.day).first() is None
+
+
+def migrate_order_storage(batch_size=5000, drop_legacy=True, echo=print):
+    """Convert legacy Order rows to item ids and integer pence, returning the rows converted
+
+    Rows are converted by id range, one short transaction per batch_size ids.
+    Run it before starting the new code: history, exports and analytics
+    can't read unconverted rows. Old item names without a MenuItem
+    are added as inactive items. The rollups are rebuilt afterwards and, with
+    drop_legacy, the old columns are dropped.
+    """
+    legacy = prepare_order_storage()
+    if not legacy:
+        if rollups_need_rebuild():
+            rebuild_rollups()
+            echo('Rebuilt the daily rollups')
+        echo('Orders already use item ids and pence')
+        return 0
+    
+    quote = db.engine.dialect.identifier_preparer.quote
+    table = quote(Order.__tablename__)
+    
+    # Every item name in the old rows needs a MenuItem to point at
+    resolver = MenuItemResolver()
+    for category, name_column, price_column in (('sandwich', 'sandwich', 'sandwich_price'),
+                                                ('crisps', 'crisps', 'crisps_price'),
+                                                ('snack', 'snack', 'snack_price')):
+        for name, price in db.session.execute(text(
+                f'SELECT {name_column}, MAX({price_column}) FROM {table} '
+                f'WHERE {name_column} IS NOT NULL GROUP BY {name_column}')):
+            resolver.resolve(name, category, price)
+    if resolver.created:
+        echo(f'Added {resolver.created} retired item(s) to the menu as inactive')
+        commit_menu_change()
+    else:
+        db.session.commit()
+    
+    def item_id(column):
+        return f'(SELECT id FROM {MenuItem.__tablename__} WHERE name = {table}.{column})'
+    
+    def pence(column):
+        return f'CAST(ROUND(COALESCE({column}, 0) * 100) AS INTEGER)'
+    
+    update = text(
+        f'UPDATE {table} SET '
+        f'sandwich_id = {item_id("sandwich")}, crisps_id = {item_id("crisps")}, snack_id = {item_id("snack")}, '
+        f'sandwich_pence = {pence("sandwich_price")}, crisps_pence = {pence("crisps_price")}, '
+        f'snack_pence = {pence("snack_price")}, total_pence = {pence("total_price")}, '
+        f'savings_pence = {pence("savings")} '
+        f'WHERE id > :low AND id <= :high AND total_pence IS NULL')
+    
+    converted = 0
+    while True:
+        # Repeat until nothing is left, in case an old worker still running wrote rows meanwhile
+        low, high = db.session.execute(text(
+            f'SELECT MIN(id), MAX(id) FROM {table} WHERE total_pence IS NULL')).one()
+        if low is None:
+            break
+        converted_in_pass = 0
+        for start in range(low - 1, high, batch_size):
+            converted_in_pass += db.session.execute(update, {'low': start, 'high': start + batch_size}).rowcount
+            db.session.commit()
+            echo(f'  {converted + converted_in_pass} orders converted')
+        if not converted_in_pass:
+            raise RuntimeError('Some orders could not be converted; check their item names and prices')
+        converted += converted_in_pass
+    
+    rebuild_rollups()
+    
+    if drop_legacy:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for name in legacy:
+                conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {quote(name)}'))
+            if conn.dialect.name == 'postgresql':
+                for column in Order.__table__.columns:
+                    if not column.nullable and not column.primary_key:
+                        conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {quote(column.name)} SET NOT NULL'))
+    return converted
+
+
+@app.cli.command('migrate-orders')
+@click.option('--batch-size', default=5000, show_default=True, help='Order ids converted per transaction.')
+@click.option('--keep-legacy', is_flag=True, help='Keep the old name/price columns (to allow a rollback).')
+def migrate_orders_command(batch_size, keep_legacy):
+    """Convert stored orders to MenuItem ids and integer pence"""
+    converted = migrate_order_storage(batch_size=batch_size, drop_legacy=not keep_legacy, echo=click.echo)
+    click.echo(f'Converted {converted} orders')
+
+
+def hot_queries():
+    """The most frequent read queries, as (description, statement) pairs"""
+    some_date = datetime(2026, 1, 1)
+    recent_day = (datetime.utcnow() - timedelta(days=30)).date()
+    return [
+        ('history first page', history_page_query(None, 50).statement),
+        ('history later page', history_page_query(encode_history_cursor(some_date, 1000), 50).statement),
+        ('orders in a date range', db.session.query(func.date(Order.order_date), func.count(Order.id))
+            .filter(Order.order_date >= some_date, Order.order_date < some_date + timedelta(days=31))
+            .group_by(func.date(Order.order_date)).statement),
+        ('active menu items', MenuItem.query.filter_by(is_active=True).statement),
+        ('menu item by name and category', MenuItem.query.filter_by(name='BLT', category='sandwich').statement),
+        ('daily sales since date', db.session.query(DailySales.day, DailySales.revenue_pence)
+            .filter(DailySales.day >= recent_day).statement),
+        ('units sold per item', db.session.query(DailyItemSales.item_id, func.sum(DailyItemSales.count))
+            .group_by(DailyItemSales.item_id).statement),
+    ]
+
+
+def explain_query(statement):
+    """Return the database's query plan for a statement as a list of lines"""
+    dialect = db.session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return [row[-1] for row in rows]
+    rows = db.session.execute(text('EXPLAIN ' + sql)).all()
+    return [row[0] for row in rows]
+
+
+def is_full_scan(plan, table):
+    """True if a plan line reads every row of table without an index"""
+    for line in plan:
+        # SQLite: "SCAN order" (without "USING ... INDEX"); PostgreSQL: "Seq Scan on order"
+        if line.startswith(f'SCAN {table}') and 'INDEX' not in line:
+            return True
+        if f'Seq Scan on {table}' in line or f'Seq Scan on "{table}"' in line:
+            return True
+    return False
+
+
+@app.cli.command('explain-queries')
+@click.option('--strict', is_flag=True, help='Exit with an error if a hot query does a full scan of order.')
+def explain_queries_command(strict):
+    """Show the query plan for each hot query and flag full table scans"""
+    full_scans = []
+    for description, statement in hot_queries():
+        plan = explain_query(statement)
+        table = statement.get_final_froms()[0].name
+        scan = is_full_scan(plan, table)
+        click.echo(f"{'FULL SCAN' if scan else 'indexed  '}  {description}")
+        for line in plan:
+            click.echo(f'             {line}')
+        if scan and table == 'order':
+            full_scans.append(description)
+    
+    if strict and full_scans:
+        click.echo('Full scans of order: ' + ', '.join(full_scans))
+        raise SystemExit(1)
+
+
+# DATABASE SETUP
+def init_db():
+    """Create missing tables and indexes and seed the default menu"""
+    db.create_all()
+    prepare_order_storage()
+    created = create_missing_indexes()
+    initialize_default_menu()
+    initialize_default_promotions()
+    return created
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database schema, default menu and lunch offer (run once per deploy, not per worker)"""
+    created = init_db()
+    click.echo('Database tables created successfully')
+    if created:
+        click.echo('Created indexes: ' + ', '.join(created))
+    click.echo('Default menu initialized')
+    if legacy_order_columns():
+        click.echo('Orders still use the old name/price columns: run `flask --app app migrate-orders` '
+                   'before starting the app')
+    elif rollups_need_rebuild():
+        click.echo('The daily rollups are empty: run `flask --app app migrate-orders` before starting the app')
+
+
+# STARTUP TIMING
+startup_timing = {'import_seconds': time.perf_counter() - IMPORT_STARTED, 'first_request_seconds': None}
+
+
+@app.before_request
+def record_first_request():
+    """Record how long this worker took from import to its first request"""
+    if startup_timing['first_request_seconds'] is None:
+        startup_timing['first_request_seconds'] = time.perf_counter() - IMPORT_STARTED
+        print(f"Worker {os.getpid()}: import took {startup_timing['import_seconds'] * 1000:.0f}ms, "
+              f"first request {startup_timing['first_request_seconds'] * 1000:.0f}ms after import")
+
+
+metrics.registry.gauge('lunchmenu_import_seconds', 'Time to import the app module in this worker',
+                       lambda: startup_timing['import_seconds'])
+metrics.registry.gauge('lunchmenu_first_request_seconds', 'Time from app import to the first request in this worker',
+                       lambda: startup_timing['first_request_seconds'])
+
+
+# REQUEST PROFILER
+# Created last, so it wraps the finished app; gunicorn.conf.py restarts its
+# watcher thread in each forked worker
+request_profiler = RequestProfiler(app, app.config['PROFILER_DIR'],
+                                   poll_interval=app.config['PROFILER_POLL_SECONDS'],
+                                   sample_interval=app.config['PROFILER_SAMPLE_INTERVAL_MS'] / 1000)
+request_profiler.start()
+
+
+@app.route('/admin/profiler')
+@admin_required
+def admin_profiler():
+    """Arm the request profiler and look at or download what it collected"""
+    endpoint = request.args.get('show')
+    profiles = request_profiler.profiles()
+    return render_template('admin_profiler.html',
+                         state=request_profiler.state(),
+                         profiles=profiles,
+                         endpoints=sorted(name for name in app.view_functions if name != 'static'),
+                         selected=endpoint if endpoint in profiles else None,
+                         report=request_profiler.top_functions(endpoint) if endpoint in profiles else '',
+                         now=time.time(),
+                         business_name=BUSINESS_NAME)
+
+
+@app.route('/admin/profiler/arm', methods=['POST'])
+@admin_required
+def admin_profiler_arm():
+    """Start profiling the next N requests, or a fraction of requests, to one endpoint"""
+    try:
+        count = int(request.form['count']) if request.form.get('count') else None
+        rate = float(request.form.get('percent') or 100) / 100
+        request_profiler.arm(request.form.get('endpoint', ''), rate=rate, count=count,
+                             minutes=float(request.form.get('minutes') or 10))
+    except ValueError as e:
+        flash(str(e), 'error')
+    else:
+        flash(f"Profiling {request.form['endpoint']}", 'success')
+    return redirect(url_for('admin_profiler'))
+
+
+@app.route('/admin/profiler/disarm', methods=['POST'])
+@admin_required
+def admin_profiler_disarm():
+    """Stop profiling (workers notice within PROFILER_POLL_SECONDS)"""
+    request_profiler.disarm()
+    flash('Profiler disarmed', 'success')
+    return redirect(url_for('admin_profiler'))
+
+
+@app.route('/admin/profiler/clear', methods=['POST'])
+@admin_required
+def admin_profiler_clear():
+    """Delete the collected profiles"""
+    request_profiler.clear()
+    flash('Profiles cleared', 'success')
+    return redirect(url_for('admin_profiler'))
+
+
+@app.route('/admin/profiler/<name>.<fmt>')
+@admin_required
+def admin_profiler_download(name, fmt):
+    """Download an endpoint's profile as pstats (.prof) or collapsed stacks (.collapsed) for flamegraphs"""
+    if fmt == 'prof':
+        data = request_profiler.pstats_bytes(name)
+        mimetype = 'application/octet-stream'
+    elif fmt == 'collapsed':
+        data = request_profiler.collapsed(name) if name in request_profiler.profiles() else None
+        mimetype = 'text/plain'
+    else:
+        abort(404)
+    if data is None:
+        abort(404)
+    return Response(data, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+# Workers no longer run DDL at import: run `flask --app app init-db` once per
+# deploy. AUTO_INIT_DB=1 restores create-on-import (handy with `flask run`).
+if os.environ.get('AUTO_INIT_DB') == '1':
+    with app.app_context():
+        try:
+            init_db()
+        except Exception as e:
+            print(f"Database initialization error: {e}")
 
 
 # Run the application
 if __name__ == '__main__':
+    with app.app_context():
+        init_db()
+        print("Database ready")
     port = int(os.environ.get('PORT', 5001))
-    app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=port)
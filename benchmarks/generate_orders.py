@@ -0,0 +1,124 @@
+"""
+Synthetic Order History Generator - seeds a database with N realistic orders
+Orders are spread over recent days (busy weekdays, quiet Saturdays, closed
+Sundays, a lunchtime peak) and across the active MenuItems with a skewed
+popularity, then priced with the same pricing engine as the web app
+
+Usage:
+    python benchmarks/generate_orders.py --orders 100000 --database /tmp/bench.db
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Relative weight of each weekday (Monday=0); Sunday is closed
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.05, 1.1, 1.2, 0.5, 0.0]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=10000, help='number of orders to create (1k to 10M)')
+    parser.add_argument('--days', type=int, default=365, help='spread orders over this many days up to today')
+    parser.add_argument('--database', default=os.path.join(ROOT, 'benchmarks', 'bench.db'),
+                        help='SQLite file to seed (ignored if DATABASE_URL is set)')
+    parser.add_argument('--batch-size', type=int, default=10000, help='orders per multi-row INSERT')
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible data')
+    parser.add_argument('--append', action='store_true', help='keep existing orders instead of deleting them')
+    return parser.parse_args(argv)
+
+
+def load_app(database):
+    """Import the Flask app pointed at the benchmark database"""
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+    import app as lunch_app
+    return lunch_app
+
+
+def weighted_items(names, rng):
+    """Give menu items a skewed (Zipf-like) popularity in a random order"""
+    names = list(names)
+    rng.shuffle(names)
+    return names, [1.0 / (rank + 1) for rank in range(len(names))]
+
+
+def order_dates(count, days, rng):
+    """Yield count order timestamps over the last N days, oldest first"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    day_list = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    weights = [WEEKDAY_WEIGHTS[day.weekday()] for day in day_list]
+    if not any(weights):
+        weights = [1.0] * len(day_list)
+
+    days_chosen = sorted(rng.choices(range(len(day_list)), weights=weights, k=count))
+    for index in days_chosen:
+        # Lunchtime peak around 12:30, with a tail from opening to close
+        minutes = rng.gauss(12.5 * 60, 50) if rng.random() < 0.8 else rng.uniform(7 * 60, 18 * 60)
+        minutes = min(max(minutes, 7 * 60), 18 * 60)
+        yield day_list[index] + timedelta(minutes=minutes, seconds=rng.random() * 60)
+
+
+def generate(lunch_app, count, days, batch_size, seed, append=False):
+    """Insert count synthetic orders in batches and rebuild the rollups"""
+    rng = random.Random(seed)
+    db = lunch_app.db
+
+    with lunch_app.app.app_context():
+        lunch_app.init_db()
+        if not append:
+            # Idempotency keys and catering headers point at order ids, so they go too
+            for model in (lunch_app.IdempotencyKey, lunch_app.DailyItemSales, lunch_app.DailySales,
+                          lunch_app.Order, lunch_app.CateringOrder):
+                model.query.delete()
+            db.session.commit()
+
+        menu = lunch_app.menu_cache.get()
+        sandwiches, sandwich_weights = weighted_items(menu.sandwiches, rng)
+        crisps, crisp_weights = weighted_items(menu.crisps, rng)
+        snacks, snack_weights = weighted_items(menu.snacks, rng)
+
+        started = time.perf_counter()
+        batch = []
+        written = 0
+        for order_date in order_dates(count, days, rng):
+            quote = lunch_app.quote_order(
+                rng.choices(sandwiches, sandwich_weights)[0],
+                rng.choices(crisps, crisp_weights)[0],
+                rng.choices(snacks, snack_weights)[0],
+                menu=menu)
+            batch.append(lunch_app.build_order_row(quote, menu, order_date))
+            if len(batch) >= batch_size:
+                db.session.execute(db.insert(lunch_app.Order), batch)
+                db.session.commit()
+                written += len(batch)
+                batch = []
+                print(f"  {written:,} orders written", end='\r', flush=True)
+
+        if batch:
+            db.session.execute(db.insert(lunch_app.Order), batch)
+            db.session.commit()
+            written += len(batch)
+
+        elapsed = time.perf_counter() - started
+        print(f"Wrote {written:,} orders in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f}/s)")
+
+        started = time.perf_counter()
+        lunch_app.rebuild_rollups()
+        print(f"Rebuilt rollups in {time.perf_counter() - started:.1f}s")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lunch_app = load_app(args.database)
+    generate(lunch_app, args.orders, args.days, args.batch_size, args.seed, append=args.append)
+
+
+if __name__ == '__main__':
+    main()
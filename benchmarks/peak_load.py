@@ -0,0 +1,204 @@
+"""
+Peak Load Test - lunchtime rush against a fixed pool of server threads
+Many simulated clients send a mix of orders, reporting requests and menu
+views to a thread pool the size of one gunicorn worker's GUNICORN_THREADS,
+while every commit is slowed down to mimic an overloaded database. Latency
+is measured from when a client sends a request, so time spent waiting for a
+free server thread counts. The test runs with admission control off and
+then on, and prints per-route p50/p99 latency and how many requests were
+shed with a 503.
+
+With admission control on, every admitted request must finish within its
+class's queue budget plus the route's service time (its p99 when requests
+are sent one at a time), and reporting must still be served during the
+rush. The script exits with status 1 if either check fails.
+
+Usage:
+    python benchmarks/generate_orders.py --orders 100000 --database /tmp/bench.db
+    python benchmarks/peak_load.py --database /tmp/bench.db --clients 32 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run_benchmarks import load_app, percentile
+
+# Route name, weight, route class
+MIX = (
+    ('calculate', 30, 'orders'),
+    ('api_order', 20, 'orders'),
+    ('history', 15, 'reporting'),
+    ('dashboard', 10, 'reporting'),
+    ('menu', 25, None),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default=os.path.join(ROOT, 'benchmarks', 'bench.db'),
+                        help='SQLite file seeded by generate_orders.py (ignored if DATABASE_URL is set)')
+    parser.add_argument('--clients', type=int, default=32, help='simulated clients sending requests back to back')
+    parser.add_argument('--threads', type=int, default=4, help='server threads (GUNICORN_THREADS)')
+    parser.add_argument('--seconds', type=float, default=10, help='length of each run')
+    parser.add_argument('--slow-commit-ms', type=float, default=50, help='extra time every commit takes')
+    parser.add_argument('--tolerance-ms', type=float, default=50,
+                        help='slack allowed over queue budget + service time for admitted requests')
+    parser.add_argument('--min-reporting-ok', type=float, default=0.5,
+                        help='share of reporting requests that must succeed with admission on')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def build_requests(lunch_app):
+    """{route name: callable(client)}"""
+    with lunch_app.app.app_context():
+        menu = lunch_app.menu_cache.get()
+        sandwiches, crisps, snacks = list(menu.sandwiches), list(menu.crisps), list(menu.snacks)
+
+    def order_form():
+        return {'sandwich': random.choice(sandwiches), 'crisp': random.choice(crisps),
+                'snack': random.choice(snacks)}
+
+    return {
+        'calculate': lambda client: client.post('/calculate', data=order_form()),
+        'api_order': lambda client: client.post('/api/orders', json=order_form()),
+        'history': lambda client: client.get('/history'),
+        'dashboard': lambda client: client.get('/api/analytics/dashboard?days=30'),
+        'menu': lambda client: client.get('/menu'),
+    }
+
+
+def service_times(lunch_app, requests, samples=20):
+    """{route: p99 ms} with requests sent one at a time, so nothing queues"""
+    client = lunch_app.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    times = {}
+    for name, _, _ in MIX:
+        # The first request loads the menu and compiles templates
+        requests[name](client)
+        latencies = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            requests[name](client)
+            latencies.append((time.perf_counter() - started) * 1000)
+        times[name] = percentile(sorted(latencies), 0.99)
+    return times
+
+
+def run(lunch_app, requests, args, admission_on):
+    """One timed run; returns {route: [(latency_ms, status), ...]}"""
+    lunch_app.admission.controller.enabled = admission_on
+    local = threading.local()
+
+    def serve(name, sent_at):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = lunch_app.app.test_client()
+            with client.session_transaction() as session:
+                session['admin_logged_in'] = True
+        try:
+            # Stamp the request the way Render's router or nginx would
+            client.environ_base['HTTP_X_REQUEST_START'] = f't={int(sent_at * 1e6)}'
+            return requests[name](client).status_code
+        except Exception:
+            return 500
+
+    results = {name: [] for name, _, _ in MIX}
+    names = [name for name, _, _ in MIX]
+    weights = [weight for _, weight, _ in MIX]
+    deadline = time.monotonic() + args.seconds
+
+    with ThreadPoolExecutor(max_workers=args.threads) as server:
+        def client_loop(seed):
+            rng = random.Random(seed)
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                status = server.submit(serve, name, time.time()).result()
+                results[name].append(((time.perf_counter() - started) * 1000, status))
+
+        clients = [threading.Thread(target=client_loop, args=(args.seed + index,)) for index in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    return results
+
+
+def print_results(title, results, seconds):
+    print(f"\n{title}")
+    print(f"{'route':<12}{'class':<11}{'req/s':>7}{'ok':>7}{'503':>7}{'errors':>8}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'ok p99':>9}")
+    print('-' * 79)
+    for name, _, route_class in MIX:
+        samples = results[name]
+        latencies = sorted(latency for latency, _ in samples)
+        ok = sorted(latency for latency, status in samples if status < 400)
+        shed = sum(1 for _, status in samples if status == 503)
+        errors = sum(1 for _, status in samples if status >= 400 and status != 503)
+        print(f"{name:<12}{route_class or '-':<11}{len(samples) / seconds:>7.0f}{len(ok):>7}{shed:>7}{errors:>8}"
+              f"{percentile(latencies, 0.50):>9.1f}{percentile(latencies, 0.99):>9.1f}{percentile(ok, 0.99):>9.1f}")
+
+
+def check_bounds(lunch_app, results, service, args):
+    """Print each admitted route's latency bound; return the checks that failed"""
+    failures = []
+    print(f"\n{'route':<12}{'queue ms':>9}{'service':>9}{'bound':>9}{'ok p99':>9}")
+    print('-' * 48)
+    for name, _, route_class in MIX:
+        if route_class is None:
+            continue
+        queue_ms = lunch_app.admission.controller.classes[route_class].queue_seconds * 1000
+        bound = queue_ms + service[name] + args.tolerance_ms
+        ok_p99 = percentile(sorted(latency for latency, status in results[name] if status < 400), 0.99)
+        print(f"{name:<12}{queue_ms:>9.0f}{service[name]:>9.1f}{bound:>9.1f}{ok_p99:>9.1f}")
+        if ok_p99 > bound:
+            failures.append(f'{name}: admitted p99 {ok_p99:.0f}ms is over {bound:.0f}ms')
+
+    reporting = [status for name, _, route_class in MIX if route_class == 'reporting'
+                 for _, status in results[name]]
+    served = sum(1 for status in reporting if status < 400) / len(reporting) if reporting else 1.0
+    if served < args.min_reporting_ok:
+        failures.append(f'reporting: only {served:.0%} of requests served (minimum {args.min_reporting_ok:.0%})')
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('GUNICORN_THREADS', str(args.threads))
+    lunch_app = load_app(args.database)
+    requests = build_requests(lunch_app)
+
+    if args.slow_commit_ms:
+        from sqlalchemy import event
+        with lunch_app.app.app_context():
+            event.listen(lunch_app.db.engine, 'commit', lambda conn: time.sleep(args.slow_commit_ms / 1000))
+
+    service = service_times(lunch_app, requests)
+    for admission_on in (False, True):
+        results = run(lunch_app, requests, args, admission_on)
+        print_results(f"Admission control {'on' if admission_on else 'off'} ({args.clients} clients, "
+                      f"{args.threads} server threads, +{args.slow_commit_ms:.0f}ms per commit)",
+                      results, args.seconds)
+    print(f"\nAdmission limits: {lunch_app.admission.controller.stats()}")
+
+    failures = check_bounds(lunch_app, results, service, args)
+    if failures:
+        print('\nAdmission control did not bound latency:')
+        for line in failures:
+            print(f'  {line}')
+        sys.exit(1)
+    print('\nAdmitted requests stayed within queue budget + service time')
+
+
+if __name__ == '__main__':
+    main()
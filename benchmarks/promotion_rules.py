@@ -0,0 +1,118 @@
+"""
+Promotion Rules Benchmark - per-basket pricing cost as the number of rules grows
+Compiles a PromotionBook from randomly generated rules (meal deals, item
+prices and multi-buys with random locations, days and time windows) and
+times pricing baskets at random locations and times of day. No database is
+needed; the menu is the default one from app.py
+
+Usage:
+    python benchmarks/promotion_rules.py --rules 0 10 100 1000 5000 --quotes 200000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, time as time_of_day
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import promotions
+from menu_cache import build_snapshot
+
+MENU = [
+    ('Ham & Cheese', 3.50, 'sandwich', False), ('Tuna Mayo', 3.50, 'sandwich', False),
+    ('Chicken Salad', 3.50, 'sandwich', False), ('BLT', 3.50, 'sandwich', False),
+    ('Egg Mayo', 3.50, 'sandwich', False), ('Cheese & Pickle', 3.50, 'sandwich', False),
+    ('Prawn Mayo', 4.50, 'sandwich', True), ('Steak & Onion', 4.50, 'sandwich', True),
+    ('Ready Salted', 1.50, 'crisps', False), ('Salt & Vinegar', 1.50, 'crisps', False),
+    ('Cheese & Onion', 1.50, 'crisps', False), ('Prawn Cocktail', 1.50, 'crisps', False),
+    ('BBQ', 1.50, 'crisps', False), ('Sour Cream', 1.50, 'crisps', False),
+    ('Paprika', 1.50, 'crisps', False), ('Spicy Chili', 1.50, 'crisps', False),
+    ('Apple', 1.00, 'snack', False), ('Banana', 1.00, 'snack', False),
+    ('Chocolate Bar', 2.00, 'snack', False), ('Granola Bar', 2.00, 'snack', False),
+    ('Cookie', 1.50, 'snack', False), ('Brownie', 2.00, 'snack', False),
+    ('Fruit Pot', 2.50, 'snack', False), ('Yogurt', 2.00, 'snack', False),
+]
+LOCATIONS = ['City Centre', 'Riverside', 'Business District']
+
+
+def build_menu():
+    items = [SimpleNamespace(id=index, name=name, price=price, category=category, is_premium=premium,
+                             is_active=True)
+             for index, (name, price, category, premium) in enumerate(MENU, 1)]
+    return build_snapshot(items, version=1)
+
+
+def random_rules(count, rng):
+    """count random rules, about a third of each kind"""
+    rules = []
+    for rule_id in range(1, count + 1):
+        kind = rng.choice(promotions.RULE_KINDS)
+        start = rng.randrange(0, 24 * 60, 15) if rng.random() < 0.7 else None
+        end = min(start + rng.randrange(15, 6 * 60, 15), 24 * 60 - 1) if start is not None else None
+        rules.append(SimpleNamespace(
+            id=rule_id,
+            name=f'Rule {rule_id}',
+            kind=kind,
+            price=round(rng.uniform(0.5, 6.0), 2),
+            item_id=rng.randint(1, len(MENU)),
+            applies_to=rng.choice(('standard', 'all', 'item')),
+            min_quantity=rng.randint(2, 5),
+            location=rng.choice(LOCATIONS) if rng.random() < 0.5 else None,
+            days=rng.randint(1, promotions.EVERY_DAY),
+            start_time=time_of_day(start // 60, start % 60) if start is not None else None,
+            end_time=time_of_day(end // 60, end % 60) if end is not None else None,
+            starts_on=None,
+            ends_on=None,
+        ))
+    return [promotions.rule_from_row(row) for row in rules]
+
+
+def measure(menu, rules, quotes, rng):
+    """(compile_ms, ns per quote, price lists built) for one rule count"""
+    started = time.perf_counter()
+    book = promotions.PromotionBook(menu, rules, date.today())
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    sandwiches, crisps, snacks = list(menu.sandwiches), list(menu.crisps), list(menu.snacks)
+    requests = [(rng.choice(LOCATIONS + [None]), rng.randrange(24 * 60),
+                 rng.choice(sandwiches), rng.choice(crisps), rng.choice(snacks)) for _ in range(quotes)]
+
+    # One untimed pass builds every price list the requests touch, as a warm worker would have
+    for location, minute, sandwich, crisp, snack in requests:
+        book.table(location, minute).quote(sandwich, crisp, snack)
+
+    started = time.perf_counter()
+    for location, minute, sandwich, crisp, snack in requests:
+        book.table(location, minute).quote(sandwich, crisp, snack)
+    per_quote_ns = (time.perf_counter() - started) * 1e9 / quotes
+    return compile_ms, per_quote_ns, len(book._tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rules', type=int, nargs='+', default=[0, 10, 100, 1000, 5000])
+    parser.add_argument('--quotes', type=int, default=200000, help='baskets priced per rule count')
+    parser.add_argument('--runs', type=int, default=3, help='timed runs per rule count (median is shown)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    menu = build_menu()
+
+    print(f"{'rules':>7}{'compile ms':>12}{'ns/quote':>10}{'price lists':>13}")
+    print('-' * 42)
+    for count in args.rules:
+        rules = random_rules(count, rng)
+        runs = [measure(menu, rules, args.quotes, rng) for _ in range(args.runs)]
+        print(f"{count:>7}{statistics.median(run[0] for run in runs):>12.1f}"
+              f"{statistics.median(run[1] for run in runs):>10.0f}{runs[-1][2]:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark Runner - drives the Flask test client against the main routes
+Reports p50/p95/p99 latency, throughput, SQL queries per request and peak
+RSS for each scenario, writes the results as JSON and compares them with a
+saved baseline so regressions are visible
+
+Usage:
+    python benchmarks/generate_orders.py --orders 100000 --database /tmp/bench.db
+    python benchmarks/run_benchmarks.py --database /tmp/bench.db --output results.json
+    python benchmarks/run_benchmarks.py --database /tmp/bench.db --baseline baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default=os.path.join(ROOT, 'benchmarks', 'bench.db'),
+                        help='SQLite file seeded by generate_orders.py (ignored if DATABASE_URL is set)')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per scenario')
+    parser.add_argument('--scenario', action='append', help='only run these scenarios (repeatable)')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'),
+                        help='where to write the JSON results')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='relative slowdown that counts as a regression (default 0.20 = 20%%)')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def load_app(database):
+    """Import the Flask app pointed at the benchmark database"""
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+    import app as lunch_app
+    return lunch_app
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the database via engine events"""
+
+    def __init__(self, engine):
+        self.count = 0
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def build_scenarios(lunch_app, client, rng):
+    """Return {name: callable} for each benchmarked request"""
+    with lunch_app.app.app_context():
+        menu = lunch_app.menu_cache.get()
+        sandwiches, crisps, snacks = list(menu.sandwiches), list(menu.crisps), list(menu.snacks)
+        first_page = client.get('/api/history').get_json() or {}
+    deep_cursor = first_page.get('next_cursor')
+
+    def order_form():
+        return {'sandwich': rng.choice(sandwiches), 'crisp': rng.choice(crisps), 'snack': rng.choice(snacks)}
+
+    keys = itertools.count()
+
+    def idempotent_order():
+        return client.post('/api/orders', json=order_form(), headers={'Idempotency-Key': f'bench-{next(keys)}'})
+
+    scenarios = {
+        'menu': lambda: client.get('/menu'),
+        'calculate': lambda: client.post('/calculate', data=order_form()),
+        'api_order': lambda: client.post('/api/orders', json=order_form()),
+        'api_order_batch': lambda: client.post('/api/orders', json={'orders': [order_form() for _ in range(10)]}),
+        'api_order_idempotent': idempotent_order,
+        'quote_cart': lambda: client.post('/api/quote', json={'baskets': [order_form() for _ in range(20)]}),
+        'catering_order': lambda: client.post('/api/catering-orders', json={
+            'customer_name': 'Benchmark', 'lines': [dict(order_form(), quantity=rng.randint(1, 20)) for _ in range(10)]}),
+        'history': lambda: client.get('/history'),
+        'history_api': lambda: client.get('/api/history'),
+        'analytics': lambda: client.get('/analytics'),
+        'daily_sales': lambda: client.get('/api/analytics/daily-sales?days=30'),
+        'top_items': lambda: client.get('/api/analytics/top-items'),
+        'offer_stats': lambda: client.get('/api/analytics/offer-stats'),
+        'dashboard': lambda: client.get('/api/analytics/dashboard?days=30'),
+    }
+    if lunch_app.order_archive.watermark() is not None:
+        scenarios['archive_report'] = lambda: client.get('/api/analytics/archive')
+    if deep_cursor:
+        scenarios['history_page_2'] = lambda: client.get('/api/history?cursor=' + deep_cursor)
+    return scenarios
+
+
+def run_scenario(request, counter, warmup, count):
+    """Time count requests after warmup, returning the scenario's result dict"""
+    for _ in range(warmup):
+        request()
+
+    latencies = []
+    queries = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        before = counter.count
+        t0 = time.perf_counter()
+        response = request()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        queries.append(counter.count - before)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'max_queries': max(queries) if queries else 0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return human-readable regressions of results against a baseline"""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+        if previous['throughput_rps'] and current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput_rps {previous['throughput_rps']} -> {current['throughput_rps']}")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{name}: queries_per_request {previous['queries_per_request']}"
+                               f" -> {current['queries_per_request']}")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'RSS MB':>9}")
+    print('-' * 76)
+    for name, r in results['scenarios'].items():
+        print(f"{name:<22}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['throughput_rps']:>9.0f}{r['queries_per_request']:>9.2f}{r['peak_rss_mb']:>9.1f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lunch_app = load_app(args.database)
+    rng = random.Random(args.seed)
+
+    client = lunch_app.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+    with lunch_app.app.app_context():
+        counter = QueryCounter(lunch_app.db.engine)
+        order_count = lunch_app.Order.query.count()
+
+    scenarios = build_scenarios(lunch_app, client, rng)
+    selected = args.scenario or list(scenarios)
+
+    results = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': lunch_app.app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        'orders_in_database': order_count,
+        'scenarios': {},
+    }
+    for name in selected:
+        results['scenarios'][name] = run_scenario(scenarios[name], counter, args.warmup, args.requests)
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+
+    print_table(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Startup Time Benchmark - measures import-to-first-request for a fresh worker
+Each run starts a new Python process, imports the app and serves one /menu
+request through the test client, the same work a newly forked worker does
+
+Usage:
+    python benchmarks/startup_time.py --database /tmp/bench.db --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/menu')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'first_request_ms': (served - started) * 1000,
+                  'status': response.status_code}))
+"""
+
+
+def measure_once(env):
+    """Run one cold start in a child process and return its timings"""
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default=os.path.join(ROOT, 'benchmarks', 'bench.db'),
+                        help='SQLite file created with `flask init-db` (ignored if DATABASE_URL is set)')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.abspath(args.database))
+
+    runs = [measure_once(env) for _ in range(args.runs)]
+    for key in ('import_ms', 'first_request_ms'):
+        values = sorted(run[key] for run in runs)
+        print(f"{key:<18} median {statistics.median(values):8.1f}   min {values[0]:8.1f}   max {values[-1]:8.1f}")
+    if any(run['status'] != 200 for run in runs):
+        print("Warning: /menu did not return 200 - has `flask init-db` been run?")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Gunicorn Production Settings - used automatically by `gunicorn app:app`
+Every value can be overridden with an environment variable
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# gthread workers: a few processes, each serving several requests at once
+# while others wait on the database
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# The app does no database work at import, so it is safe to load it once in
+# the master and fork workers from it (faster rolling restarts, shared memory)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 20))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to cap memory growth, staggered with jitter
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool rather than sharing the master's sockets,
+    its own order feed socket so it hears every other worker's orders, and its
+    own profiler watcher thread"""
+    from app import app, db, order_feed, request_profiler
+    with app.app_context():
+        db.engine.dispose(close=False)
+    order_feed.start()
+    request_profiler.start()
+
+
+def worker_exit(server, worker):
+    """Write any queued write-behind orders and end open order streams before the worker goes away"""
+    from app import order_feed, order_queue
+    if not order_queue.drain(timeout=graceful_timeout):
+        server.log.warning('Order queue not empty at worker exit')
+    order_feed.close()
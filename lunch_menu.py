@@ -1,10 +1,24 @@
 """
 Simple Lunch Offer Menu - Python Learning Project
 This script demonstrates variables, dictionaries, lists, and conditional logic
+
+Batch mode prices a whole file of baskets (one "sandwich,crisps,snack" per
+line) without any prompts:
+    python lunch_menu.py --batch orders.csv
+    python lunch_menu.py --batch - --menu db < orders.csv
 """
 
+import argparse
+import csv
+import os
+import sys
+from types import SimpleNamespace
+
+# The web app prices orders with the same module, so the rules can't drift apart
+from pricing import LUNCH_OFFER_PRICE, QuoteTable, UnknownItemError, is_offer_eligible, quote_basket, to_pence
+
 # VARIABLES: Think of these as labeled boxes that store information
-lunch_offer_price = 5.00  # A number variable (float for decimals)
+lunch_offer_price = LUNCH_OFFER_PRICE  # A number variable (float for decimals): 5.00
 regular_price_sandwich = 3.50
 regular_price_crisps = 1.50
 regular_price_snack = 2.00
@@ -51,6 +65,11 @@ snacks = {
 # These are "premium" items
 premium_sandwiches = ["Prawn Mayo", "Steak & Onion", "Chicken & Bacon", "Slice of homemade cake"]
 
+# The menu as pricing.py expects it: an object with the three dictionaries
+# and the premium list as attributes
+menu = SimpleNamespace(sandwiches=sandwiches, crisps=crisps, snacks=snacks,
+                       premium_sandwiches=premium_sandwiches)
+
 # FUNCTION: A reusable block of code that performs a task
 def display_menu(menu_dict, category_name):
     """Display a menu category with numbered options"""
@@ -77,21 +96,94 @@ def get_user_choice(items, category_name):
 
 def check_offer_eligibility(sandwich_choice):
     """Check if the selected items qualify for the lunch offer"""
-    # CONDITIONAL LOGIC: Make decisions based on conditions
-    if sandwich_choice in premium_sandwiches:
-        return False  # Premium sandwiches don't qualify
-    else:
-        return True  # Regular sandwiches qualify
+    # Premium sandwiches don't qualify (the rule lives in pricing.py)
+    return is_offer_eligible(menu, sandwich_choice)
 
 
 def calculate_total(sandwich, crisp, snack, qualifies_for_offer):
     """Calculate the total price"""
     if qualifies_for_offer:
         return lunch_offer_price
-    else:
-        # Add up individual prices
-        total = sandwiches[sandwich] + crisps[crisp] + snacks[snack]
-        return total
+    # Add up individual prices
+    return quote_basket(menu, sandwich, crisp, snack, offer_price=lunch_offer_price).regular_total
+
+
+# BATCH MODE: GENERATORS
+# Each step below is a generator - it handles one basket at a time and hands
+# it on, so a million-line file never has to fit in memory
+
+def load_database_prices(database_url=None):
+    """The web app's menu with the promotions in force now, instead of the dictionaries above"""
+    if database_url:
+        os.environ['DATABASE_URL'] = database_url
+    import app as lunch_app
+    with lunch_app.app.app_context():
+        return lunch_app.get_quote_table()
+
+
+def read_baskets(lines):
+    """Yield (line_number, sandwich, crisp, snack) from CSV lines
+
+    A header row (sandwich,crisps,snack in any order) is optional; blank
+    lines are skipped.
+    """
+    header_names = {'sandwich': 0, 'sandwiches': 0, 'crisp': 1, 'crisps': 1, 'snack': 2, 'snacks': 2}
+    columns = (0, 1, 2)
+    for line_number, row in enumerate(csv.reader(lines), 1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        cells = [cell.strip() for cell in row]
+        if line_number == 1 and cells[0].lower() in header_names:
+            positions = {header_names.get(cell.lower()): index for index, cell in enumerate(cells)}
+            columns = tuple(positions.get(kind, kind) for kind in (0, 1, 2))
+            continue
+        cells += [''] * (max(columns) + 1 - len(cells))
+        yield line_number, cells[columns[0]], cells[columns[1]], cells[columns[2]]
+
+
+def price_baskets(baskets, prices):
+    """Yield (line_number, basket, quote, error) for each basket, priced with a QuoteTable"""
+    for line_number, sandwich, crisp, snack in baskets:
+        try:
+            yield line_number, (sandwich, crisp, snack), prices.quote(sandwich, crisp, snack), None
+        except UnknownItemError as e:
+            yield line_number, (sandwich, crisp, snack), None, str(e)
+
+
+def write_results(results, output):
+    """Write one CSV row per priced basket and return the running totals
+
+    Money is added up in whole pence so the totals of a million baskets
+    don't drift.
+    """
+    writer = csv.writer(output)
+    writer.writerow(['line', 'sandwich', 'crisps', 'snack', 'offer_applied', 'total', 'savings', 'error'])
+    totals = {'orders': 0, 'offers': 0, 'errors': 0, 'revenue_pence': 0, 'savings_pence': 0}
+
+    for line_number, (sandwich, crisp, snack), quote, error in results:
+        if error:
+            totals['errors'] += 1
+            writer.writerow([line_number, sandwich, crisp, snack, '', '', '', error])
+            continue
+        totals['orders'] += 1
+        totals['offers'] += 1 if quote.offer_applied else 0
+        totals['revenue_pence'] += to_pence(quote.total)
+        totals['savings_pence'] += to_pence(quote.savings)
+        writer.writerow([line_number, sandwich, crisp, snack, quote.offer_applied,
+                         f'{quote.total:.2f}', f'{quote.savings:.2f}', ''])
+    return totals
+
+
+def run_batch(source, output, prices):
+    """Price every basket in source and write the results, then the totals, to output"""
+    totals = write_results(price_baskets(read_baskets(source), prices), output)
+    # Totals go after the results as comment lines, so the CSV part stays easy to parse
+    output.write(f"# orders: {totals['orders']}\n")
+    output.write(f"# lunch offers applied: {totals['offers']}\n")
+    output.write(f"# revenue: £{totals['revenue_pence'] / 100:.2f}\n")
+    output.write(f"# customer savings: £{totals['savings_pence'] / 100:.2f}\n")
+    output.write(f"# errors: {totals['errors']}\n")
+    return totals
 
 
 # MAIN PROGRAM STARTS HERE
@@ -142,6 +234,33 @@ def main():
     print("=" * 50)
 
 
+def cli(argv=None):
+    """Run batch mode if --batch is given, otherwise the interactive menu"""
+    parser = argparse.ArgumentParser(description='Lunch offer menu')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='price every "sandwich,crisps,snack" line in FILE (- for stdin) and exit')
+    parser.add_argument('--menu', choices=['module', 'db'], default='module',
+                        help="price with this file's dictionaries (default) or the web app's menu and promotions")
+    parser.add_argument('--database', help='database URL for --menu db (defaults to DATABASE_URL / orders.db)')
+    args = parser.parse_args(argv)
+
+    if not args.batch:
+        main()
+        return
+
+    if args.menu == 'db':
+        prices = load_database_prices(args.database)
+    else:
+        prices = QuoteTable(menu, lunch_offer_price)
+    if args.batch == '-':
+        totals = run_batch(sys.stdin, sys.stdout, prices)
+    else:
+        with open(args.batch, newline='', encoding='utf-8') as source:
+            totals = run_batch(source, sys.stdout, prices)
+    if totals['errors']:
+        sys.exit(1)
+
+
 # This runs the program when you execute the script
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,133 @@
+"""
+Menu Snapshot Cache - keeps an immutable copy of the active menu in memory
+Each worker builds the snapshot once and only rebuilds it when the shared
+menu version (bumped by admin edits) moves on
+"""
+
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+
+MenuEntry = namedtuple('MenuEntry', ['id', 'name', 'category', 'price', 'is_active'])
+
+MenuSnapshot = namedtuple('MenuSnapshot', [
+    'version',             # Menu version this snapshot was built from
+    'sandwiches',          # {name: price} of active items (read-only)
+    'crisps',              # {name: price} of active items (read-only)
+    'snacks',              # {name: price} of active items (read-only)
+    'premium_sandwiches',  # Tuple of premium sandwich names
+    'items',               # {id: MenuEntry} for every item, active or not (read-only)
+    'item_ids',            # {name: id} for every item (read-only)
+    'built_at',            # time.time() when the snapshot was built
+])
+
+
+def build_snapshot(items, version):
+    """Build an immutable MenuSnapshot from MenuItem-like rows
+
+    Inactive items only go into items/item_ids, so orders placed before an
+    item was taken off the menu can still be named.
+    """
+    sandwiches = {}
+    crisps = {}
+    snacks = {}
+    premium = []
+    entries = {}
+
+    for item in items:
+        entries[item.id] = MenuEntry(item.id, item.name, item.category, item.price, bool(item.is_active))
+        if not item.is_active:
+            continue
+        if item.category == 'sandwich':
+            sandwiches[item.name] = item.price
+            if item.is_premium:
+                premium.append(item.name)
+        elif item.category == 'crisps':
+            crisps[item.name] = item.price
+        elif item.category == 'snack':
+            snacks[item.name] = item.price
+
+    return MenuSnapshot(
+        version=version,
+        sandwiches=MappingProxyType(sandwiches),
+        crisps=MappingProxyType(crisps),
+        snacks=MappingProxyType(snacks),
+        premium_sandwiches=tuple(premium),
+        items=MappingProxyType(entries),
+        item_ids=MappingProxyType({entry.name: entry.id for entry in entries.values()}),
+        built_at=time.time(),
+    )
+
+
+class MenuCache:
+    """Per-worker menu snapshot, rebuilt only when the menu version changes
+
+    load_items() returns every menu row (active or not) and load_version() returns the
+    current shared version number. The version is re-read at most once every
+    check_interval seconds, so a busy worker pays for one tiny query per
+    interval rather than one menu query per request.
+    """
+
+    def __init__(self, load_items, load_version, check_interval=2.0):
+        self.load_items = load_items
+        self.load_version = load_version
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.version_checks = 0
+
+    def get(self):
+        """Return the current snapshot, rebuilding it if it is stale"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                self.hits += 1
+                return snapshot
+
+            version = self.load_version()
+            self.version_checks += 1
+
+            if snapshot is not None and snapshot.version == version:
+                self._checked_at = time.monotonic()
+                self.hits += 1
+                return snapshot
+
+            self.misses += 1
+            snapshot = build_snapshot(self.load_items(), version)
+            self.rebuilds += 1
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        """Drop the local snapshot so the next get() rebuilds it"""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'built_at': snapshot.built_at if snapshot else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds,
+            'version_checks': self.version_checks,
+            'check_interval': self.check_interval,
+        }
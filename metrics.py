@@ -0,0 +1,217 @@
+"""
+Request Metrics - per-route latency histograms, SQL counters and pool waits
+Hooks Flask's request lifecycle, template signals and SQLAlchemy engine
+events, and renders everything in the Prometheus text format. Each worker
+keeps its own numbers in memory; recording a request costs a handful of
+perf_counter() calls and dictionary updates
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+# Upper bounds in seconds, as used by the Prometheus client libraries
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def format_labels(names, values):
+    """Render a Prometheus label set such as {endpoint="menu"}"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{format_labels(self.labels, key)} {value}' for key, value in values]
+
+
+class Histogram:
+    """Cumulative bucket histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ('le',), key + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and gauge callbacks and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, callback):
+        """Register a gauge whose value is read from callback() at scrape time"""
+        self._gauges.append((name, help_text, callback))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        for name, help_text, callback in self._gauges:
+            try:
+                value = callback()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.histogram(
+    'lunchmenu_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method'))
+request_count = registry.counter(
+    'lunchmenu_requests_total', 'Requests by endpoint and status code', ('endpoint', 'method', 'status'))
+sql_statements = registry.histogram(
+    'lunchmenu_request_sql_statements', 'SQL statements issued per request', ('endpoint',), COUNT_BUCKETS)
+sql_time = registry.histogram(
+    'lunchmenu_request_sql_seconds', 'Time spent executing SQL per request', ('endpoint',))
+template_time = registry.histogram(
+    'lunchmenu_template_render_seconds', 'Jinja template render time', ('template',))
+pool_wait = registry.histogram(
+    'lunchmenu_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled DB connection')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each connection checkout waits"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started)
+
+
+# SQLALCHEMY EVENTS (all engines)
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_time += elapsed
+
+
+# TEMPLATE SIGNALS
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_render_started', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if has_request_context() and g.get('metrics_render_started'):
+        template_time.observe(time.perf_counter() - g.metrics_render_started.pop(), template.name)
+
+
+# FLASK REQUEST HOOKS
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_sql_count = 0
+    g.metrics_sql_time = 0.0
+
+
+def _finish_request(response):
+    started = g.pop('metrics_start', None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    request_latency.observe(time.perf_counter() - started, endpoint, request.method)
+    request_count.inc(1, endpoint, request.method, response.status_code)
+    sql_statements.observe(g.metrics_sql_count, endpoint)
+    sql_time.observe(g.metrics_sql_time, endpoint)
+    return response
+
+
+def init_app(app):
+    """Register the request hooks and template signals on a Flask app"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
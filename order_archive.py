@@ -0,0 +1,260 @@
+"""
+Columnar Order Archive - compact, memory-mapped storage for closed days
+Orders are stored column by column as NumPy arrays: epoch-day numbers,
+integer pence, an offer flag, meal quantities and MenuItem ids. Reports read
+the arrays through mmap and aggregate them with vectorised NumPy calls, so
+even millions of archived orders are summed in milliseconds without loading
+them into Python objects
+
+Layout of the archive directory:
+    manifest.json               format version + list of segments
+    seg-<first>-<last>/*.npy    one file per column, rows sorted by order date
+                                (-r<n> is added when a segment is rewritten)
+
+NumPy is optional for the web app; everything here needs it.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from array import array
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+EPOCH = date(1970, 1, 1)
+FORMAT = 3
+ITEM_COLUMNS = ('sandwich_id', 'crisps_id', 'snack_id')
+COLUMNS = ('epoch_day', 'total_pence', 'savings_pence', 'offer', 'quantity') + ITEM_COLUMNS
+
+
+class ArchiveUnavailable(RuntimeError):
+    """Raised when NumPy isn't installed or the archive needs rebuilding"""
+
+
+def require_numpy():
+    if np is None:
+        raise ArchiveUnavailable('The order archive needs NumPy: pip install numpy')
+
+
+def to_epoch_day(day):
+    return (day - EPOCH).days
+
+
+def from_epoch_day(number):
+    return EPOCH + timedelta(days=int(number))
+
+
+class OrderArchive:
+    """Reads and appends segments in an archive directory"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._manifest = {'format': FORMAT, 'segments': []}
+        self._segments = []
+
+    # MANIFEST
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def manifest(self):
+        """Return the manifest, reloading segments if another process changed it"""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            return self._manifest
+        with self._lock:
+            if mtime != self._loaded_mtime:
+                with open(self._manifest_path()) as f:
+                    manifest = json.load(f)
+                if manifest.get('format') != FORMAT:
+                    raise ArchiveUnavailable('The order archive uses an old format: '
+                                             'run `flask compact-orders --rebuild`')
+                self._manifest = manifest
+                self._segments = [self._open_segment(segment) for segment in self._manifest['segments']]
+                self._loaded_mtime = mtime
+            return self._manifest
+
+    def _write_manifest(self, manifest):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self._manifest_path())
+
+    def _open_segment(self, segment):
+        require_numpy()
+        directory = os.path.join(self.path, segment['name'])
+        return {column: np.load(os.path.join(directory, column + '.npy'), mmap_mode='r') for column in COLUMNS}
+
+    def loaded_segments(self):
+        """Memory-mapped column arrays for every segment"""
+        self.manifest()
+        return self._segments
+
+    def watermark(self):
+        """First day that is not archived (orders from this day on are in the live table)"""
+        segments = self.manifest()['segments']
+        return from_epoch_day(segments[-1]['end_day']) if segments else None
+
+    # WRITING
+    def _save_columns(self, rows, directory):
+        """Write rows as one .npy file per column into directory, returning the row count"""
+        # array.array keeps the columns at a few bytes per order while they grow
+        columns = {'epoch_day': array('i'), 'total_pence': array('i'), 'savings_pence': array('i'),
+                   'offer': array('b'), 'quantity': array('H')}
+        columns.update({column: array('I') for column in ITEM_COLUMNS})
+
+        for order_date, sandwich_id, crisps_id, snack_id, total_pence, savings_pence, offer_applied, quantity in rows:
+            columns['epoch_day'].append(to_epoch_day(order_date.date()))
+            columns['total_pence'].append(total_pence)
+            columns['savings_pence'].append(savings_pence or 0)
+            columns['offer'].append(1 if offer_applied else 0)
+            columns['quantity'].append(quantity)
+            columns['sandwich_id'].append(sandwich_id)
+            columns['crisps_id'].append(crisps_id)
+            columns['snack_id'].append(snack_id)
+
+        dtypes = {'epoch_day': np.int32, 'total_pence': np.int32, 'savings_pence': np.int32,
+                  'offer': np.bool_, 'quantity': np.uint16}
+        for column, values in columns.items():
+            np.save(os.path.join(directory, column + '.npy'),
+                    np.frombuffer(values, dtype=values.typecode).astype(dtypes.get(column, np.uint32)))
+        return len(columns['epoch_day'])
+
+    def append_segment(self, rows, start_day, end_day):
+        """Write rows for days in [start_day, end_day) as a new segment
+
+        rows yields (order_date, sandwich_id, crisps_id, snack_id, total_pence,
+        savings_pence, offer_applied, quantity) sorted by order_date. Returns
+        the row count.
+        """
+        require_numpy()
+        os.makedirs(self.path, exist_ok=True)
+        manifest = json.loads(json.dumps(self.manifest()))
+
+        temp_dir = tempfile.mkdtemp(dir=self.path)
+        count = self._save_columns(rows, temp_dir)
+        name = f'seg-{start_day.isoformat()}-{(end_day - timedelta(days=1)).isoformat()}'
+        if count:
+            final_dir = os.path.join(self.path, name)
+            if os.path.exists(final_dir):
+                shutil.rmtree(final_dir)
+            os.rename(temp_dir, final_dir)
+        else:
+            shutil.rmtree(temp_dir)
+
+        # Empty ranges still move the watermark forward, but get no files
+        segment = {'name': name, 'start_day': to_epoch_day(start_day), 'end_day': to_epoch_day(end_day),
+                   'rows': count}
+        if count:
+            manifest['segments'].append(segment)
+        elif manifest['segments']:
+            manifest['segments'][-1]['end_day'] = segment['end_day']
+        else:
+            return 0
+        self._write_manifest(manifest)
+        return count
+
+    def segment_index(self, day):
+        """Index of the segment holding day (days before the archive map to the first segment)"""
+        number = to_epoch_day(day)
+        segments = self.manifest()['segments']
+        for index, segment in enumerate(segments):
+            if number < segment['end_day']:
+                return index
+        raise ValueError(f'{day} is not before the archive watermark')
+
+    def rewrite_segment(self, index, rows, start_day=None):
+        """Replace a segment's rows, e.g. after orders were added to days it covers
+
+        rows is as for append_segment and covers the segment's days, from
+        start_day when that moves the segment's first day earlier. The new
+        files go in a new folder, so processes still reading the old mmaps
+        are unaffected. Returns the row count.
+        """
+        require_numpy()
+        manifest = json.loads(json.dumps(self.manifest()))
+        segment = manifest['segments'][index]
+        old_dir = os.path.join(self.path, segment['name'])
+        if start_day is not None:
+            segment['start_day'] = min(segment['start_day'], to_epoch_day(start_day))
+
+        temp_dir = tempfile.mkdtemp(dir=self.path)
+        count = self._save_columns(rows, temp_dir)
+        revision = segment.get('revision', 0) + 1
+        first = from_epoch_day(segment['start_day'])
+        last = from_epoch_day(segment['end_day'] - 1)
+        segment.update(name=f'seg-{first.isoformat()}-{last.isoformat()}-r{revision}', rows=count,
+                       revision=revision)
+        os.rename(temp_dir, os.path.join(self.path, segment['name']))
+        self._write_manifest(manifest)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return count
+
+    def clear(self):
+        """Delete the whole archive"""
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        with self._lock:
+            self._loaded_mtime = None
+            self._manifest = {'format': FORMAT, 'segments': []}
+            self._segments = []
+
+    # VECTORISED ANALYTICS
+    def _slices(self, start_day=None, end_day=None):
+        """Yield each segment with the row range for days in [start_day, end_day)"""
+        for segment in self.loaded_segments():
+            days = segment['epoch_day']
+            lo = 0 if start_day is None else int(np.searchsorted(days, to_epoch_day(start_day), 'left'))
+            hi = len(days) if end_day is None else int(np.searchsorted(days, to_epoch_day(end_day), 'left'))
+            if hi > lo:
+                yield segment, lo, hi
+
+    def daily_totals(self, start_day=None, end_day=None):
+        """{day: [revenue_pence, meal_count, offer_count, savings_pence]} for archived days"""
+        totals = {}
+        for segment, lo, hi in self._slices(start_day, end_day):
+            days = segment['epoch_day'][lo:hi]
+            base = int(days[0])
+            offsets = days - base
+            quantity = segment['quantity'][lo:hi]
+            revenue = np.bincount(offsets, weights=segment['total_pence'][lo:hi])
+            counts = np.bincount(offsets, weights=quantity)
+            offers = np.bincount(offsets, weights=quantity * segment['offer'][lo:hi])
+            savings = np.bincount(offsets, weights=segment['savings_pence'][lo:hi])
+            for offset in np.flatnonzero(counts):
+                day = from_epoch_day(base + offset)
+                row = totals.setdefault(day, [0, 0, 0, 0])
+                row[0] += int(revenue[offset])
+                row[1] += int(counts[offset])
+                row[2] += int(offers[offset])
+                row[3] += int(savings[offset])
+        return totals
+
+    def item_counts(self, start_day=None, end_day=None):
+        """{item_id: meals} over archived days, all three item columns together"""
+        counts = np.zeros(0)
+        for segment, lo, hi in self._slices(start_day, end_day):
+            for column in ITEM_COLUMNS:
+                column_counts = np.bincount(segment[column][lo:hi], weights=segment['quantity'][lo:hi])
+                if len(column_counts) > len(counts):
+                    counts = np.pad(counts, (0, len(column_counts) - len(counts)))
+                counts[:len(column_counts)] += column_counts
+        return {int(item_id): int(counts[item_id]) for item_id in np.flatnonzero(counts)}
+
+    def offer_counts(self, start_day=None, end_day=None):
+        """(offer_meals, total_meals) over archived days"""
+        offers = total = 0
+        for segment, lo, hi in self._slices(start_day, end_day):
+            quantity = segment['quantity'][lo:hi]
+            offers += int(quantity[segment['offer'][lo:hi]].sum())
+            total += int(quantity.sum())
+        return offers, total
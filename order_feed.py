@@ -0,0 +1,242 @@
+"""
+Live Order Feed - pushes committed orders to kitchen screens as Server-Sent Events
+Each worker keeps the most recent events in a bounded ring buffer. Every
+subscriber waits on one shared condition and keeps only its position in the
+buffer, so an idle stream costs a sleeping thread and no database work at
+all; each event is encoded once, however many screens are watching
+
+Workers share events over Unix datagram sockets in a common directory: a
+worker sends each event it publishes to every other worker's socket. Two
+`flask run` processes pointed at the same ORDER_FEED_SOCKET_DIR show the
+fan-out on one machine. order_feed_server.py joins the same directory to
+serve many streams from one asyncio process instead of worker threads.
+"""
+
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+
+class SocketFanout:
+    """Sends events to, and receives events from, the other workers on this machine"""
+
+    def __init__(self, directory, receive):
+        self.directory = directory
+        self.receive = receive
+        self._socket = None
+        self._path = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.received = 0
+        self.send_errors = 0
+
+    def start(self):
+        """Bind this process's socket and start its receiver thread (again after a fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f'{os.getpid()}.sock')
+            if os.path.exists(self._path):
+                os.unlink(self._path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(self._path)
+            self._pid = os.getpid()
+            threading.Thread(target=self._receive_loop, args=(self._socket,), name='order-feed-receiver',
+                             daemon=True).start()
+
+    def _receive_loop(self, sock):
+        while True:
+            try:
+                message = sock.recv(65536)
+            except OSError:
+                return
+            try:
+                self.receive(message)
+            except ValueError:
+                continue
+            self.received += 1
+
+    def send(self, message):
+        """Send one message to every other worker's socket, removing sockets of dead workers"""
+        self.start()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        own = os.path.basename(self._path)
+        for name in names:
+            if name == own or not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                self._socket.sendto(message, path)
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nobody is listening there any more
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except OSError:
+                # e.g. the receiver's buffer is full; the event is dropped for that worker
+                self.send_errors += 1
+
+    def close(self):
+        with self._lock:
+            if self._socket is not None and self._pid == os.getpid():
+                self._socket.close()
+                try:
+                    os.unlink(self._path)
+                except FileNotFoundError:
+                    pass
+            self._socket = None
+            self._pid = None
+
+
+class OrderFeed:
+    """Ring buffer of encoded events with blocking reads for subscribers
+
+    Entries are (sequence, event_id, location, data). sequence numbers are
+    local to the worker and only used to find a subscriber's place; event
+    ids (order ids) are what clients see and send back as Last-Event-ID.
+    """
+
+    def __init__(self, size=1000, socket_dir=None):
+        self._events = deque(maxlen=size)
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._closed = False
+        self.fanout = SocketFanout(socket_dir, self._receive) if socket_dir and hasattr(socket, 'AF_UNIX') else None
+        self.subscribers = 0
+        self.published = 0
+
+    def start(self):
+        """Start receiving other workers' events (call once per process, e.g. after a fork)"""
+        if self.fanout is not None:
+            self.fanout.start()
+
+    # PUBLISHING
+    @staticmethod
+    def encode(event_id, payload):
+        """One SSE message, encoded once for every subscriber"""
+        return f'id: {event_id}\nevent: order\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'.encode()
+
+    def publish(self, events, location=None):
+        """Add (event_id, payload) events here and send them to the other workers"""
+        entries = [(str(event_id), location or '', self.encode(event_id, payload)) for event_id, payload in events]
+        self._append(entries)
+        self.published += len(entries)
+        if self.fanout is not None:
+            for event_id, entry_location, data in entries:
+                self.fanout.send(f'{event_id}\n{entry_location}\n'.encode() + data)
+
+    def _receive(self, message):
+        event_id, location, data = message.split(b'\n', 2)
+        self._append([(event_id.decode(), location.decode(), data)])
+
+    def _append(self, entries):
+        with self._condition:
+            for event_id, location, data in entries:
+                self._sequence += 1
+                self._events.append((self._sequence, event_id, location, data))
+            self._condition.notify_all()
+
+    # SUBSCRIBING
+    def try_subscribe(self, limit):
+        """Count a new subscriber, or return False if limit are already connected"""
+        with self._condition:
+            if self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+        self.start()
+        return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def position(self, last_event_id=None):
+        """Sequence number to resume after: just after last_event_id, or now for new subscribers
+
+        If last_event_id has already left the buffer, everything still buffered
+        is sent again (clients can drop repeats by order id).
+        """
+        with self._condition:
+            if last_event_id is None:
+                return self._sequence
+            for sequence, event_id, _, _ in reversed(self._events):
+                if event_id == last_event_id:
+                    return sequence
+            return self._events[0][0] - 1 if self._events else self._sequence
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _newer(self, after):
+        newer = min(self._sequence - after, len(self._events))
+        return list(itertools.islice(reversed(self._events), newer))[::-1]
+
+    def entries_after(self, after):
+        """Entries newer than sequence `after`, without waiting"""
+        with self._condition:
+            return self._newer(after)
+
+    def wait(self, after, timeout):
+        """Entries newer than sequence `after`, waiting up to timeout seconds for one to arrive"""
+        with self._condition:
+            if self._sequence <= after and not self._closed:
+                self._condition.wait(timeout)
+            return self._newer(after)
+
+    @staticmethod
+    def select(entries, location=None):
+        """The SSE bytes of entries for one location ('' or None: every location)"""
+        return b''.join(data for _, _, entry_location, data in entries
+                        if not location or entry_location in ('', location))
+
+    def stream(self, last_event_id=None, location=None, heartbeat=15.0, max_seconds=300.0):
+        """Yield SSE bytes for new events until max_seconds pass or the feed closes
+
+        Ending the stream now and then lets the client reconnect (with
+        Last-Event-ID) and frees the worker thread for a while.
+        """
+        after = self.position(last_event_id)
+        deadline = time.monotonic() + max_seconds
+        yield b'retry: 2000\n\n'
+        while not self._closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            entries = self.wait(after, min(heartbeat, remaining))
+            if not entries:
+                yield b': keepalive\n\n'
+                continue
+            after = entries[-1][0]
+            chunk = self.select(entries, location)
+            if chunk:
+                yield chunk
+
+    def close(self):
+        """End every open stream (worker shutdown)"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self.fanout is not None:
+            self.fanout.close()
+
+    def stats(self):
+        """Return feed counters as a dictionary"""
+        return {
+            'subscribers': self.subscribers,
+            'buffered': len(self._events),
+            'published': self.published,
+            'fanout_sent': self.fanout.sent if self.fanout else 0,
+            'fanout_received': self.fanout.received if self.fanout else 0,
+        }
@@ -0,0 +1,201 @@
+"""
+Order Feed Server - serves /stream/orders from one asyncio process
+Kitchen screens keep their order stream open all day. Served by the Flask
+app, every open stream holds a gunicorn thread; served from here, an idle
+stream is a sleeping coroutine and a socket, so hundreds of screens cost
+next to nothing and never take a thread away from orders or the menu.
+
+The server joins the workers' ORDER_FEED_SOCKET_DIR like one more worker, so
+it hears every order any worker commits, and keeps its own ring buffer for
+reconnecting screens (Last-Event-ID). It needs no database. Streams are
+authorised with ?token=ORDER_FEED_TOKEN, or with an admin session cookie
+when SECRET_KEY matches the app's.
+
+Usage:
+    export ORDER_FEED_SOCKET_DIR=/tmp/lunchmenu-feed
+    python order_feed_server.py --port 10001
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import threading
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+
+from order_feed import OrderFeed
+
+
+STREAM_PATH = '/stream/orders'
+
+
+class FeedServer:
+    """Serves an OrderFeed's events to many SSE clients from one event loop"""
+
+    def __init__(self, feed, token=None, secret_key=None, heartbeat=15.0, max_seconds=300.0, max_subscribers=1000):
+        self.feed = feed
+        self.token = token
+        self.heartbeat = heartbeat
+        self.max_seconds = max_seconds
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._sessions = None
+        self._session_max_age = None
+        if secret_key:
+            # Read the app's admin session cookie the way Flask signs it
+            signer_app = Flask(__name__)
+            signer_app.secret_key = secret_key
+            self._sessions = SecureCookieSessionInterface().get_signing_serializer(signer_app)
+            self._session_max_age = signer_app.permanent_session_lifetime.total_seconds()
+        self._loop = None
+        self._changed = None
+
+    # WAKING STREAMS
+    def _relay(self):
+        """Wait on the feed in a thread and wake the event loop whenever events arrive"""
+        after = self.feed.position()
+        while not self.feed.closed:
+            entries = self.feed.wait(after, 1.0)
+            if entries:
+                after = entries[-1][0]
+                self._loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    # REQUESTS
+    def authorized(self, query, headers):
+        """True for the feed token or an admin session cookie"""
+        if self.token and secrets.compare_digest(query.get('token', ''), self.token):
+            return True
+        if self._sessions is None:
+            return False
+        try:
+            morsel = SimpleCookie(headers.get('cookie', '')).get('session')
+        except CookieError:
+            return False
+        if morsel is None:
+            return False
+        try:
+            session = self._sessions.loads(morsel.value, max_age=self._session_max_age)
+        except BadSignature:
+            return False
+        return bool(session.get('admin_logged_in'))
+
+    async def respond(self, writer, status, body, headers=()):
+        head = f'HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\nConnection: close\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers)
+        writer.write(head.encode() + b'\r\n' + body.encode())
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        method, _, target = lines[0].partition(' ')
+        target = target.rpartition(' ')[0] or target
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        try:
+            if method != 'GET' or url.path != STREAM_PATH:
+                await self.respond(writer, '404 Not Found', 'Not found')
+            elif not self.authorized(query, headers):
+                await self.respond(writer, '401 Unauthorized', 'Unauthorized')
+            elif self.subscribers >= self.max_subscribers:
+                await self.respond(writer, '503 Service Unavailable', 'Too many open order streams',
+                                   [('Retry-After', '5')])
+            else:
+                self.subscribers += 1
+                try:
+                    await self.stream(writer, headers.get('last-event-id') or query.get('last_event_id'),
+                                      query.get('location'))
+                finally:
+                    self.subscribers -= 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, writer, last_event_id=None, location=None):
+        """Write SSE events until max_seconds pass, the feed closes or the client goes away"""
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'X-Accel-Buffering: no\r\nConnection: close\r\n\r\nretry: 2000\n\n')
+        await writer.drain()
+        after = self.feed.position(last_event_id)
+        deadline = self._loop.time() + self.max_seconds
+        while not self.feed.closed:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return
+            # Taken before reading the buffer, so an event arriving in between still wakes us
+            changed = self._changed
+            entries = self.feed.entries_after(after)
+            if not entries:
+                try:
+                    await asyncio.wait_for(changed.wait(), min(self.heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    writer.write(b': keepalive\n\n')
+                    await writer.drain()
+                continue
+            after = entries[-1][0]
+            chunk = OrderFeed.select(entries, location)
+            if chunk:
+                writer.write(chunk)
+                await writer.drain()
+
+    async def serve(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.feed.start()
+        threading.Thread(target=self._relay, name='order-feed-relay', daemon=True).start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f'Order feed on http://{host}:{port}{STREAM_PATH}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('ORDER_FEED_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('ORDER_FEED_PORT', 10001)))
+    parser.add_argument('--max-subscribers', type=int,
+                        default=int(os.environ.get('ORDER_FEED_SERVER_MAX_SUBSCRIBERS', 1000)),
+                        help='most open streams (each needs a file descriptor)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    socket_dir = os.environ.get('ORDER_FEED_SOCKET_DIR')
+    if not socket_dir:
+        raise SystemExit('Set ORDER_FEED_SOCKET_DIR to the directory the app workers use')
+    feed = OrderFeed(int(os.environ.get('ORDER_FEED_BUFFER', 1000)), socket_dir)
+    server = FeedServer(feed, token=os.environ.get('ORDER_FEED_TOKEN'), secret_key=os.environ.get('SECRET_KEY'),
+                        heartbeat=float(os.environ.get('ORDER_FEED_HEARTBEAT', 15)),
+                        max_seconds=float(os.environ.get('ORDER_FEED_MAX_SECONDS', 300)),
+                        max_subscribers=args.max_subscribers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        feed.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Write-Behind Order Queue - batches order inserts for lunchtime spikes
+Orders are put on a bounded in-process queue and a background thread
+flushes them in groups, committing every batch_size orders or every
+flush_interval seconds, whichever comes first
+"""
+
+import queue
+import threading
+import time
+
+
+class QueueFullError(Exception):
+    """Raised when the queue stays full for longer than the submit timeout"""
+
+
+class WriteBehindQueue:
+    """Bounded queue drained by one background writer thread
+
+    max_size counts submitted entries (one per submit() call), not items.
+
+    flush(batch) is called with a list of queued items and must write them
+    in a single transaction. If it raises, the same batch is retried with
+    backoff, so a database outage fills the queue and callers get
+    QueueFullError (backpressure) instead of orders being dropped.
+    """
+
+    def __init__(self, flush, max_size=1000, batch_size=50, flush_interval=0.1,
+                 retry_delay=0.5, max_retry_delay=5.0):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closing = threading.Event()
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.flush_errors = 0
+
+    def start(self):
+        """Start the writer thread (safe to call repeatedly, e.g. after fork)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._closing.clear()
+                self._thread = threading.Thread(target=self._run, name='order-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, items, timeout=0.5):
+        """Queue a list of items as one entry, waiting up to timeout seconds for space
+
+        The items are written together in the same batch, or not queued at all.
+        """
+        if self._closing.is_set():
+            raise QueueFullError('Order queue is shutting down')
+        self.start()
+        try:
+            self._queue.put(list(items), timeout=timeout)
+        except queue.Full:
+            self.rejected += len(items)
+            raise QueueFullError('Order queue is full') from None
+        self.submitted += len(items)
+
+    def _next_batch(self):
+        """Block for the first entry, then collect more until full or the interval ends
+
+        Returns (items, entry_count).
+        """
+        try:
+            batch = list(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return [], 0
+        entries = 1
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.extend(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            entries += 1
+        return batch, entries
+
+    def _write(self, batch):
+        """Flush one batch, retrying with backoff until it succeeds or we're closing"""
+        delay = self.retry_delay
+        while True:
+            try:
+                self.flush(batch)
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Order queue flush error ({len(batch)} orders): {e}")
+                if self._closing.is_set() and delay >= self.max_retry_delay:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            self.flushed += len(batch)
+            self.batches += 1
+            return
+
+    def _run(self):
+        """Writer thread loop: flush batches until closed and empty"""
+        while True:
+            batch, entries = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    print(f"Order queue gave up on {len(batch)} orders during shutdown")
+                finally:
+                    for _ in range(entries):
+                        self._queue.task_done()
+            elif self._closing.is_set():
+                return
+
+    def drain(self, timeout=10.0):
+        """Stop accepting orders and wait for everything queued to be written"""
+        self._closing.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self._queue.qsize() == 0
+
+    def stats(self):
+        """Return queue counters as a dictionary"""
+        return {
+            'queued': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'flush_errors': self.flush_errors,
+        }
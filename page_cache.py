@@ -0,0 +1,65 @@
+"""
+Rendered Page Cache - keeps finished HTML (plain and gzipped) in memory
+Pages are keyed by template plus whatever their output depends on (e.g. the
+menu version), so each variant is rendered, hashed and compressed once and
+then served with a strong ETag and 304 Not Modified handling
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+
+CachedPage = namedtuple('CachedPage', ['body', 'gzip_body', 'etag', 'gzip_etag'])
+
+
+def build_page(html, min_gzip_size=500):
+    """Encode, hash and (if it's worth it) gzip a rendered page"""
+    body = html.encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    gzip_body = None
+    if len(body) >= min_gzip_size:
+        # mtime=0 keeps the compressed bytes (and so its ETag) stable
+        gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+    # A different representation needs a different strong ETag
+    return CachedPage(body, gzip_body, etag, etag + '-gz')
+
+
+class PageCache:
+    """Small LRU cache of CachedPage entries"""
+
+    def __init__(self, max_entries=64, min_gzip_size=500):
+        self.max_entries = max_entries
+        self.min_gzip_size = min_gzip_size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """Return the cached page for key, calling render() to build it on a miss"""
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+
+        page = build_page(render(), self.min_gzip_size)
+
+        with self._lock:
+            self.misses += 1
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        return {'entries': len(self._pages), 'hits': self.hits, 'misses': self.misses}
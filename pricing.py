@@ -0,0 +1,173 @@
+"""
+Pricing Engine - quotes a lunch basket from a single menu lookup
+Works with anything that has sandwiches/crisps/snacks price dictionaries and
+a premium_sandwiches collection (e.g. a MenuSnapshot from menu_cache.py)
+
+QuoteTable prices every sandwich x crisps x snack combination of a menu up
+front, so quoting a basket is one dictionary lookup. promotions.py builds one
+QuoteTable per set of promotion rules in force
+"""
+
+from collections import namedtuple
+from collections.abc import Mapping
+
+
+LUNCH_OFFER_PRICE = 5.00
+
+
+Quote = namedtuple('Quote', [
+    'sandwich',
+    'crisp',
+    'snack',
+    'sandwich_price',
+    'crisp_price',
+    'snack_price',
+    'regular_total',   # Sum of the individual item prices
+    'offer_applied',   # True if the lunch offer was applied
+    'total',           # Price the customer pays
+    'savings',         # regular_total - total when the offer applies
+])
+
+
+class UnknownItemError(ValueError):
+    """Raised when a basket contains an item that isn't on the active menu"""
+
+    def __init__(self, category, name):
+        super().__init__(f'Unknown {category}: {name}')
+        self.category = category
+        self.name = name
+
+
+def to_pence(amount):
+    """Convert a price in pounds to whole pence (orders store money as integers)"""
+    return int(round((amount or 0) * 100))
+
+
+def is_offer_eligible(menu, sandwich):
+    """Premium sandwiches don't qualify for the lunch offer"""
+    return sandwich not in menu.premium_sandwiches
+
+
+def deal_price(menu, sandwich, offer_price=LUNCH_OFFER_PRICE):
+    """Meal deal price for a basket with this sandwich, or None if no deal applies
+
+    offer_price is either one price for every non-premium sandwich or a
+    {sandwich: price} mapping (sandwiches missing from it get no deal).
+    """
+    if isinstance(offer_price, Mapping):
+        return offer_price.get(sandwich)
+    return offer_price if is_offer_eligible(menu, sandwich) else None
+
+
+def quote_basket(menu, sandwich, crisp, snack, offer_price=LUNCH_OFFER_PRICE):
+    """Price one sandwich + crisps + snack basket against a menu
+
+    The meal deal only applies when it is cheaper than buying the items
+    separately. Names that can't be menu keys at all (lists or dicts from a
+    JSON body) are unknown items too.
+    """
+    try:
+        sandwich_price = menu.sandwiches[sandwich]
+    except (KeyError, TypeError):
+        raise UnknownItemError('sandwich', sandwich) from None
+    try:
+        crisp_price = menu.crisps[crisp]
+    except (KeyError, TypeError):
+        raise UnknownItemError('crisps', crisp) from None
+    try:
+        snack_price = menu.snacks[snack]
+    except (KeyError, TypeError):
+        raise UnknownItemError('snack', snack) from None
+
+    regular_total = sandwich_price + crisp_price + snack_price
+    offer = deal_price(menu, sandwich, offer_price)
+    offer_applied = offer is not None and offer < regular_total
+
+    if offer_applied:
+        total = offer
+        savings = regular_total - offer
+    else:
+        total = regular_total
+        savings = 0
+
+    return Quote(sandwich, crisp, snack,
+                 sandwich_price, crisp_price, snack_price,
+                 regular_total, offer_applied, total, savings)
+
+
+class QuoteTable:
+    """Every basket on one menu, priced in advance
+
+    Menus with more than max_combinations baskets aren't precomputed; their
+    quotes are worked out on demand instead. multi_buys maps an item name to
+    (quantity, price): every `quantity` of that item in one order costs
+    `price` in total, counting the item on every line that doesn't already
+    have the meal deal.
+    """
+
+    def __init__(self, menu, offer_price=LUNCH_OFFER_PRICE, max_combinations=100000, multi_buys=None):
+        self.menu = menu
+        self.version = getattr(menu, 'version', None)
+        self.offer_price = offer_price
+        self.multi_buys = multi_buys or {}
+        self.quotes = {}
+        if len(menu.sandwiches) * len(menu.crisps) * len(menu.snacks) <= max_combinations:
+            self.quotes = {(sandwich, crisp, snack): quote_basket(menu, sandwich, crisp, snack, offer_price)
+                           for sandwich in menu.sandwiches
+                           for crisp in menu.crisps
+                           for snack in menu.snacks}
+
+    def quote(self, sandwich, crisp, snack):
+        """Return the Quote for a basket, raising UnknownItemError if an item isn't on the menu"""
+        try:
+            quote = self.quotes.get((sandwich, crisp, snack))
+        except TypeError:
+            # An unhashable name; quote_basket() says which item is wrong
+            quote = None
+        if quote is None:
+            return quote_basket(self.menu, sandwich, crisp, snack, self.offer_price)
+        return quote
+
+    def order_pence(self, lines):
+        """[(total_pence, savings_pence)] for an order's (quote, quantity) lines, with multi-buys applied
+
+        An item's units are counted across the whole order, so three different
+        baskets with the same snack make a group of three. Each group's
+        discount is spread over the units in it (in line order), so the lines
+        add up to exactly the order's discount.
+        """
+        grouped = {}
+        if self.multi_buys:
+            units = {}
+            for quote, quantity in lines:
+                if not quote.offer_applied:
+                    for name in (quote.sandwich, quote.crisp, quote.snack):
+                        if name in self.multi_buys:
+                            units[name] = units.get(name, 0) + quantity
+            grouped = {name: count - count % self.multi_buys[name][0] for name, count in units.items()}
+
+        counted = {}
+        result = []
+        for quote, quantity in lines:
+            total = to_pence(quote.total) * quantity
+            savings = to_pence(quote.savings) * quantity
+            if grouped and not quote.offer_applied:
+                for name, price in ((quote.sandwich, quote.sandwich_price), (quote.crisp, quote.crisp_price),
+                                    (quote.snack, quote.snack_price)):
+                    if not grouped.get(name):
+                        continue
+                    group, group_price = self.multi_buys[name]
+                    group_discount = to_pence(price) * group - to_pence(group_price)
+                    if group_discount <= 0:
+                        continue
+                    before = counted.get(name, 0)
+                    counted[name] = before + quantity
+                    discount = (min(counted[name], grouped[name]) * group_discount // group
+                                - min(before, grouped[name]) * group_discount // group)
+                    total -= discount
+                    savings += discount
+            result.append((total, savings))
+        return result
+
+    def __len__(self):
+        return len(self.quotes)
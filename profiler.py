@@ -0,0 +1,307 @@
+"""
+Request Profiler - on-demand profiles of live requests for one endpoint
+An admin arms the profiler for an endpoint, either for the next few requests
+or for a random fraction of requests over a few minutes. Each profiled
+request is run under cProfile while a sampler thread records its Python
+stack every few milliseconds; results are summed per endpoint and can be
+downloaded as a pstats file (snakeviz, `python -m pstats`) or as collapsed
+stacks for flamegraph.pl / speedscope
+
+The arm state and the profiles live in PROFILER_DIR, so every gunicorn
+worker on the machine takes part and downloads include all of them. A
+watcher thread in each worker checks the arm state once per poll_interval
+and only then swaps a profiling wrapper in front of the app: while the
+profiler is disarmed, requests run no profiler code at all.
+"""
+
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from werkzeug.exceptions import HTTPException
+
+
+ARM_FILE = 'armed.json'
+# Touched by clear(); workers drop totals collected before it
+CLEARED_FILE = 'cleared.marker'
+
+
+class RequestProfiler:
+    """Arms, runs and collects profiles for a Flask app's requests"""
+
+    def __init__(self, app, directory, poll_interval=1.0, sample_interval=0.005):
+        self.app = app
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.sample_interval = sample_interval
+        self._plain_wsgi_app = app.wsgi_app
+        self._state = None
+        self._state_mtime = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # cProfile can only profile one thread at a time on newer Pythons
+        self._running = threading.Lock()
+        self._profiles = {}
+
+    # ARMING (any worker)
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_json(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self._path(name))
+
+    def arm(self, endpoint, rate=1.0, count=None, minutes=10):
+        """Profile requests to endpoint: each with probability rate, at most count in total, for minutes"""
+        if endpoint not in self.app.view_functions:
+            raise ValueError(f'Unknown endpoint: {endpoint}')
+        if not 0 < rate <= 1:
+            raise ValueError('The sample rate must be more than 0 and at most 1')
+        if count is not None and count < 1:
+            raise ValueError('Profile at least one request')
+        self._write_json(ARM_FILE, {'id': secrets.token_hex(4), 'endpoint': endpoint, 'rate': rate,
+                                    'count': count, 'expires_at': time.time() + minutes * 60})
+        self._poll()
+
+    def disarm(self):
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name == ARM_FILE or name.startswith('claim-'):
+                os.unlink(self._path(name))
+        self._poll()
+
+    def state(self):
+        """The arm settings in force, or None when disarmed or expired"""
+        try:
+            with open(self._path(ARM_FILE)) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return state if state['expires_at'] > time.time() else None
+
+    # WATCHING (each worker)
+    def start(self):
+        """Start this process's watcher thread (again after a fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._profiles = {}
+        threading.Thread(target=self._watch, name='request-profiler', daemon=True).start()
+
+    def _watch(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._poll()
+            time.sleep(self.poll_interval)
+
+    def _poll(self):
+        """Install or remove the profiling wrapper to match the arm file"""
+        try:
+            mtime = os.stat(self._path(ARM_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        state = self._state
+        if mtime != self._state_mtime:
+            state = self.state() if mtime is not None else None
+            self._state_mtime = mtime
+        if state is not None and state['expires_at'] <= time.time():
+            state = None
+        self._state = state
+        self.app.wsgi_app = self._plain_wsgi_app if state is None else self._profiled_wsgi_app
+
+    # PROFILING
+    def _claim(self, state):
+        """True if this request may be profiled; count-limited arms hand out numbered claim files"""
+        if state['rate'] < 1 and random.random() >= state['rate']:
+            return False
+        if state['count'] is None:
+            return True
+        for number in range(state['count']):
+            try:
+                os.close(os.open(self._path(f"claim-{state['id']}-{number}"), os.O_CREAT | os.O_EXCL))
+                return True
+            except FileExistsError:
+                continue
+        return False
+
+    def _profiled_wsgi_app(self, environ, start_response):
+        state = self._state
+        if state is None:
+            return self._plain_wsgi_app(environ, start_response)
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None
+        if endpoint != state['endpoint'] or not self._claim(state) or not self._running.acquire(blocking=False):
+            return self._plain_wsgi_app(environ, start_response)
+
+        samples = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(threading.get_ident(), stop, samples),
+                                   name='request-profiler-sampler', daemon=True)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+
+        def finish():
+            profile.disable()
+            stop.set()
+            sampler.join()
+            self._running.release()
+            self._record(endpoint, profile, samples, time.perf_counter() - started)
+
+        sampler.start()
+        profile.enable()
+        try:
+            response = self._call_profiled(environ, start_response)
+        except BaseException:
+            finish()
+            raise
+        # Streamed bodies are still being produced, so stop once the server closes the response
+        return ProfiledBody(response, finish)
+
+    def _call_profiled(self, environ, start_response):
+        return self._plain_wsgi_app(environ, start_response)
+
+    def _sample(self, thread_id, stop, samples):
+        """Record the profiled thread's stack every sample_interval
+
+        Only stacks inside the app call or the response body's iteration are
+        kept (the server's own frames above them are cut off).
+        """
+        tops = (self._call_profiled.__code__, ProfiledBody.__next__.__code__)
+        while not stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and frame.f_code not in tops:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if frame is not None and stack:
+                samples[';'.join(reversed(stack))] += 1
+
+    def _record(self, endpoint, profile, samples, seconds):
+        """Add one request's profile to this worker's totals and save them for downloads"""
+        try:
+            cleared_at = os.stat(self._path(CLEARED_FILE)).st_mtime
+        except FileNotFoundError:
+            cleared_at = 0
+        with self._lock:
+            totals = self._profiles.get(endpoint)
+            if totals is None or totals['since'] < cleared_at:
+                totals = self._profiles[endpoint] = {'stats': pstats.Stats(profile), 'collapsed': Counter(),
+                                                     'requests': 0, 'seconds': 0.0, 'since': time.time()}
+            else:
+                totals['stats'].add(profile)
+            totals['collapsed'].update(samples)
+            totals['requests'] += 1
+            totals['seconds'] += seconds
+
+            name = f'{safe_name(endpoint)}.{os.getpid()}'
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(totals['stats'].stats, f)
+            os.replace(temp_path, self._path(name + '.prof'))
+            self._write_json(name + '.json', {'endpoint': endpoint, 'requests': totals['requests'],
+                                              'seconds': totals['seconds'], 'collapsed': totals['collapsed']})
+
+    # RESULTS (all workers)
+    def _worker_files(self, endpoint):
+        prefix = safe_name(endpoint) + '.'
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        return sorted(self._path(name[:-5]) for name in names if name.startswith(prefix) and name.endswith('.json'))
+
+    def profiles(self):
+        """{endpoint: {'requests', 'seconds', 'samples'}} summed over every worker"""
+        summary = {}
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        for name in sorted(names):
+            if not name.endswith('.json') or name == ARM_FILE:
+                continue
+            with open(self._path(name)) as f:
+                data = json.load(f)
+            totals = summary.setdefault(data['endpoint'], {'requests': 0, 'seconds': 0.0, 'samples': 0})
+            totals['requests'] += data['requests']
+            totals['seconds'] += data['seconds']
+            totals['samples'] += sum(data['collapsed'].values())
+        return summary
+
+    def stats(self, endpoint):
+        """pstats.Stats for an endpoint over every worker, or None if it has no profiles"""
+        files = [path + '.prof' for path in self._worker_files(endpoint) if os.path.exists(path + '.prof')]
+        if not files:
+            return None
+        return pstats.Stats(*files, stream=io.StringIO())
+
+    def pstats_bytes(self, endpoint):
+        """Contents of a .prof file for the endpoint (what Stats.dump_stats() writes)"""
+        stats = self.stats(endpoint)
+        return marshal.dumps(stats.stats) if stats is not None else None
+
+    def top_functions(self, endpoint, limit=30, sort='cumulative'):
+        """The pstats report for the top functions, as text"""
+        stats = self.stats(endpoint)
+        if stats is None:
+            return ''
+        stats.stream = io.StringIO()
+        stats.sort_stats(sort).print_stats(limit)
+        return stats.stream.getvalue()
+
+    def collapsed(self, endpoint):
+        """Collapsed stacks ('frame;frame;frame count' lines) for the endpoint over every worker"""
+        totals = Counter()
+        for path in self._worker_files(endpoint):
+            with open(path + '.json') as f:
+                totals.update(json.load(f)['collapsed'])
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(totals.items()))
+
+    def clear(self):
+        """Delete every saved profile, in every worker (the arm state is kept)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._profiles = {}
+            with open(self._path(CLEARED_FILE), 'w'):
+                pass
+            for name in os.listdir(self.directory):
+                if name.endswith(('.prof', '.json')) and name != ARM_FILE:
+                    os.unlink(self._path(name))
+
+
+class ProfiledBody:
+    """WSGI response body that ends a request's profile when the server closes it"""
+
+    def __init__(self, body, finish):
+        self._body = iter(body)
+        self._close = getattr(body, 'close', None)
+        self._finish = finish
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._body)
+
+    def close(self):
+        try:
+            if self._close is not None:
+                self._close()
+        finally:
+            self._finish()
+
+
+def safe_name(endpoint):
+    """Endpoint name usable in a file name"""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', endpoint)
@@ -0,0 +1,229 @@
+"""
+Promotion Rules - compiles the offers admins define into ready-made price lists
+Rules are rows in the database (PromotionRule in app.py). They are compiled
+once per menu version and day into a PromotionBook: for every location, a
+sorted list of the minutes where the set of live rules changes. Each distinct
+set of rules gets its own QuoteTable, built the first time it is needed, so
+pricing a basket is a bisect and a dictionary lookup however many rules exist
+
+Rule kinds:
+    meal_deal   sandwich + crisps + snack for `price` (applies_to: standard
+                sandwiches, all sandwiches, or the one sandwich in item_id)
+    item_price  item_id costs `price` instead of its menu price
+    multi_buy   every min_quantity of item_id in one order costs `price`
+                (counted across all the order's lines)
+
+Each rule can be limited to a location, days of the week, a time of day and
+a date range. When several rules of a kind fit, the customer gets the lowest
+price.
+"""
+
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from types import MappingProxyType
+
+from pricing import QuoteTable
+
+
+MEAL_DEAL = 'meal_deal'
+ITEM_PRICE = 'item_price'
+MULTI_BUY = 'multi_buy'
+RULE_KINDS = (MEAL_DEAL, ITEM_PRICE, MULTI_BUY)
+
+# Which sandwiches a meal deal covers
+DEAL_SCOPES = ('standard', 'all', 'item')
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+EVERY_DAY = 0b1111111
+DAY_MINUTES = 24 * 60
+
+
+Rule = namedtuple('Rule', [
+    'id',
+    'name',
+    'kind',            # One of RULE_KINDS
+    'price',           # Pounds
+    'item_id',         # MenuItem id for item_price/multi_buy (and meal deals for one sandwich)
+    'applies_to',      # One of DEAL_SCOPES (meal deals only)
+    'min_quantity',    # Group size for multi_buy
+    'location',        # Store name, or None for every location
+    'days',            # Bit mask of weekdays, Monday = 1
+    'start_minute',    # Minute of the day the rule starts, or None for midnight
+    'end_minute',      # Minute of the day it stops (exclusive), or None for midnight
+    'starts_on',       # First date, or None
+    'ends_on',         # Last date (inclusive), or None
+])
+
+
+def minute_of_day(value):
+    """Minutes since midnight of a datetime or time"""
+    return value.hour * 60 + value.minute
+
+
+def rule_from_row(row):
+    """Copy a PromotionRule-like row into an immutable Rule"""
+    return Rule(
+        id=row.id,
+        name=row.name,
+        kind=row.kind,
+        price=row.price,
+        item_id=row.item_id,
+        applies_to=row.applies_to or 'standard',
+        min_quantity=row.min_quantity,
+        location=row.location or None,
+        days=EVERY_DAY if row.days is None else row.days,
+        start_minute=minute_of_day(row.start_time) if row.start_time else None,
+        end_minute=minute_of_day(row.end_time) if row.end_time else None,
+        starts_on=row.starts_on,
+        ends_on=row.ends_on,
+    )
+
+
+def runs_on(rule, day):
+    """True if the rule is live at some point on this date"""
+    if rule.starts_on and day < rule.starts_on:
+        return False
+    if rule.ends_on and day > rule.ends_on:
+        return False
+    return bool(rule.days >> day.weekday() & 1)
+
+
+def rule_windows(rule):
+    """[start, end) minute ranges of the day the rule is live; windows past midnight wrap"""
+    start = rule.start_minute or 0
+    end = rule.end_minute or DAY_MINUTES
+    if end > start:
+        return [(start, end)]
+    return [(start, DAY_MINUTES), (0, end)] if end else [(start, DAY_MINUTES)]
+
+
+def describe_days(days):
+    """'Every day', 'Mon-Fri' style summary of a weekday mask"""
+    if days == EVERY_DAY:
+        return 'Every day'
+    if days == 0b0011111:
+        return 'Mon-Fri'
+    if days == 0b1100000:
+        return 'Sat-Sun'
+    return ', '.join(name for bit, name in enumerate(WEEKDAYS) if days >> bit & 1) or 'Never'
+
+
+def build_price_list(menu, rules, max_combinations=100000):
+    """QuoteTable for a menu with a fixed set of live rules applied"""
+    prices = {'sandwich': dict(menu.sandwiches), 'crisps': dict(menu.crisps), 'snack': dict(menu.snacks)}
+    deals = {}
+    multi_buys = {}
+
+    # Price overrides first, so deals and multi-buys compare against the price actually charged
+    overrides = {}
+    for rule in rules:
+        entry = menu.items.get(rule.item_id) if rule.kind == ITEM_PRICE else None
+        if entry is not None and entry.name in prices.get(entry.category, ()):
+            overrides[entry] = min(overrides.get(entry, rule.price), rule.price)
+    for entry, price in overrides.items():
+        prices[entry.category][entry.name] = price
+
+    for rule in rules:
+        if rule.kind == MEAL_DEAL:
+            if rule.applies_to == 'item':
+                entry = menu.items.get(rule.item_id)
+                sandwiches = [entry.name] if entry is not None and entry.name in prices['sandwich'] else []
+            elif rule.applies_to == 'all':
+                sandwiches = prices['sandwich']
+            else:
+                sandwiches = [name for name in prices['sandwich'] if name not in menu.premium_sandwiches]
+            for name in sandwiches:
+                deals[name] = min(deals.get(name, rule.price), rule.price)
+        elif rule.kind == MULTI_BUY and rule.min_quantity and rule.min_quantity > 1:
+            entry = menu.items.get(rule.item_id)
+            if entry is None:
+                continue
+            best = multi_buys.get(entry.name)
+            # Keep the offer with the lowest price per item
+            if best is None or rule.price / rule.min_quantity < best[1] / best[0]:
+                multi_buys[entry.name] = (rule.min_quantity, rule.price)
+
+    priced_menu = menu._replace(sandwiches=MappingProxyType(prices['sandwich']),
+                                crisps=MappingProxyType(prices['crisps']),
+                                snacks=MappingProxyType(prices['snack']))
+    return QuoteTable(priced_menu, MappingProxyType(deals), max_combinations, multi_buys)
+
+
+class PromotionBook:
+    """Promotion rules compiled for one menu snapshot and one date
+
+    table(location, minute) returns the QuoteTable in force. Rules without a
+    location apply everywhere, so unknown locations get just those.
+    """
+
+    def __init__(self, menu, rules, day, max_combinations=100000):
+        self.menu = menu
+        self.version = menu.version
+        self.day = day
+        self.max_combinations = max_combinations
+        self.rules = {rule.id: rule for rule in rules if runs_on(rule, day)}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+        locations = {rule.location for rule in self.rules.values() if rule.location}
+        self._timelines = {
+            location: self._timeline([rule for rule in self.rules.values()
+                                      if rule.location is None or rule.location == location])
+            for location in locations | {None}
+        }
+
+    @staticmethod
+    def _timeline(rules):
+        """(starts, keys, tables): from minute starts[i] on, the live rule ids are keys[i]
+
+        tables[i] caches the QuoteTable for keys[i] once it has been built.
+        """
+        changes = {0: ([], [])}
+        for rule in rules:
+            for start, end in rule_windows(rule):
+                changes.setdefault(start, ([], []))[0].append(rule.id)
+                if end < DAY_MINUTES:
+                    changes.setdefault(end, ([], []))[1].append(rule.id)
+
+        starts = []
+        keys = []
+        live = set()
+        for minute in sorted(changes):
+            starting, ending = changes[minute]
+            live.difference_update(ending)
+            live.update(starting)
+            key = frozenset(live)
+            if keys and keys[-1] == key:
+                continue
+            starts.append(minute)
+            keys.append(key)
+        return starts, keys, [None] * len(keys)
+
+    def live_rules(self, location=None, minute=0):
+        """The Rules in force at a location and minute of the day"""
+        starts, keys, _ = self._timelines.get(location) or self._timelines[None]
+        return [self.rules[rule_id] for rule_id in keys[bisect_right(starts, minute) - 1]]
+
+    def table(self, location=None, minute=0):
+        """The QuoteTable for a location at a minute of the day"""
+        starts, keys, tables = self._timelines.get(location) or self._timelines[None]
+        index = bisect_right(starts, minute) - 1
+        table = tables[index]
+        if table is None:
+            table = tables[index] = self._price_list(keys[index])
+        return table
+
+    def _price_list(self, key):
+        """The QuoteTable for a set of live rule ids, shared by every slice with the same rules"""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                table = build_price_list(self.menu, [self.rules[rule_id] for rule_id in key],
+                                         self.max_combinations)
+                self._tables[key] = table
+            return table
+
+    def __len__(self):
+        """Baskets priced in advance so far, across every price list"""
+        return sum(len(table) for table in list(self._tables.values()))
@@ -0,0 +1,95 @@
+"""
+Read Replica Routing - sends reporting reads to a replica of the database
+Routes decorated with @replica_reads run their queries on order and rollup
+tables against the 'replica' bind, so long history and analytics scans don't
+compete with order inserts on the primary. Everything else, including every
+write and the menu/promotion lookups, stays on the primary
+
+A replica runs a little behind the primary, so a browser session that wrote
+anything in the last lag_window seconds keeps reading the primary: admins
+and customers always see their own changes straight away.
+
+Locally, two SQLite files stand in for the pair: copy the primary file to
+make a "replica" that lags until it is copied again.
+"""
+
+import time
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+import metrics
+
+
+REPLICA_BIND = 'replica'
+
+routed_requests = metrics.registry.counter(
+    'lunchmenu_read_routing_total', 'Read-only requests by the database they read from', ('database',))
+
+
+def replica_enabled(app=None):
+    app = app or current_app
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+class RoutingSession(Session):
+    """db.session that sends reads of replica_tables to the replica inside @replica_reads routes
+
+    Statements that write (INSERT/UPDATE/DELETE or a flush) always go to the
+    primary and mark the request as a writer.
+    """
+
+    def __init__(self, db, replica_tables=(), **kwargs):
+        super().__init__(db, **kwargs)
+        self.replica_tables = frozenset(replica_tables)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.primary_write = True
+            elif g.get('read_replica') and self._reads_replica_table(mapper, clause):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_replica_table(self, mapper, clause):
+        if mapper is not None:
+            return sa.inspect(mapper).local_table.name in self.replica_tables
+        froms = clause.get_final_froms() if hasattr(clause, 'get_final_froms') else ()
+        return any(getattr(table, 'name', None) in self.replica_tables for table in froms)
+
+
+def reading_replica():
+    """True inside a request whose reporting reads go to the replica (cache keys should include it)"""
+    return has_request_context() and bool(g.get('read_replica'))
+
+
+def note_write():
+    """Mark this request as a writer (for writes that happen after the response, e.g. write-behind)"""
+    if has_request_context():
+        g.primary_write = True
+
+
+def replica_reads(view):
+    """Read orders and rollups from the replica in this route, unless the session wrote recently"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_enabled():
+            wrote_at = session.get('db_write_at')
+            if wrote_at is None or time.time() - wrote_at > current_app.config['DATABASE_REPLICA_LAG_WINDOW']:
+                g.read_replica = True
+            routed_requests.inc(1, 'replica' if g.get('read_replica') else 'primary')
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def remember_writes(response):
+    """Record when this session last wrote, so its next reads skip the lagging replica"""
+    if g.get('primary_write') and replica_enabled():
+        session['db_write_at'] = time.time()
+    return response
+
+
+def init_app(app):
+    app.after_request(remember_writes)
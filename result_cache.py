@@ -0,0 +1,61 @@
+"""
+Result Cache - memoises expensive results for a short time
+Entries expire after ttl seconds and can be dropped early with invalidate()
+(e.g. when new orders arrive), so repeated dashboard refreshes share one
+computation instead of each hitting the database
+"""
+
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe dictionary of results that expire after ttl seconds"""
+
+    def __init__(self, ttl=30.0, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, or compute() and cache it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = compute()
+
+        with self._lock:
+            # Don't store a result computed from data that was invalidated meanwhile
+            if generation == self._generation:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        return {
+            'entries': len(self._entries),
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,55 @@
+"""
+Shared fixtures: the app is imported once, against a fresh SQLite database
+in a temporary directory (app.py reads its configuration at import time, so
+the environment is set up before the import)
+"""
+
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+TEST_DIR = tempfile.mkdtemp(prefix='lunchmenu-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'orders.db')
+os.environ['ORDER_ARCHIVE_DIR'] = os.path.join(TEST_DIR, 'order_archive')
+os.environ['PROFILER_DIR'] = os.path.join(TEST_DIR, 'profiler')
+os.environ['SECRET_KEY'] = 'test'
+for name in ('DATABASE_REPLICA_URL', 'ORDER_FEED_SOCKET_DIR', 'ORDER_DURABILITY', 'AUTO_INIT_DB'):
+    os.environ.pop(name, None)
+
+import app as lunch_app  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    with lunch_app.app.app_context():
+        lunch_app.init_db()
+    return lunch_app.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(client):
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements run while the test uses it, collected as a list of strings"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = lunch_app.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,81 @@
+"""Admission control keeps a thread free for the menu, counting every route class, and never starves reporting"""
+
+import threading
+import time
+
+import pytest
+
+import admission
+
+
+@pytest.fixture
+def controller():
+    controller = admission.AdmissionController()
+    controller.enabled = True
+    controller.thread_limit = 3
+    controller.configure(admission.ORDERS, 3, 0.01, priority=0, max_queue=2)
+    controller.configure(admission.REPORTING, 1, 0.01, priority=1, max_queue=2)
+    controller.configure(admission.STREAMS, 2, 0.01, priority=2, max_queue=2)
+    return controller
+
+
+def test_thread_limit_is_shared_by_every_route_class(controller):
+    controller.acquire(admission.STREAMS)
+    controller.acquire(admission.STREAMS)
+    controller.acquire(admission.ORDERS)
+
+    with pytest.raises(admission.Rejected):
+        controller.acquire(admission.ORDERS)
+    with pytest.raises(admission.Rejected):
+        controller.acquire(admission.REPORTING)
+
+    controller.release(admission.STREAMS)
+    controller.acquire(admission.ORDERS)
+    assert controller.active == 3
+
+
+def test_reserved_reporting_slot_is_not_held_back_by_waiting_orders():
+    controller = admission.AdmissionController()
+    controller.configure(admission.ORDERS, 1, 1.0, priority=0, max_queue=2)
+    controller.configure(admission.REPORTING, 2, 0.01, priority=1, max_queue=2, reserved=1)
+    controller.acquire(admission.ORDERS)
+    waiting_order = threading.Thread(target=controller.acquire, args=(admission.ORDERS,))
+    waiting_order.start()
+    while controller.classes[admission.ORDERS].waiting == 0:
+        time.sleep(0.001)
+
+    controller.acquire(admission.REPORTING)
+    # Past its reserved slot, reporting gives way to the waiting order again
+    with pytest.raises(admission.Rejected):
+        controller.acquire(admission.REPORTING)
+
+    controller.release(admission.ORDERS)
+    waiting_order.join()
+    assert controller.classes[admission.ORDERS].active == 1
+
+
+def test_open_order_stream_holds_an_admission_slot(admin_client, monkeypatch):
+    monkeypatch.setattr(admission.controller, 'enabled', True)
+    active = admission.controller.active
+
+    response = admin_client.get('/stream/orders')
+    assert response.status_code == 200
+    assert admission.controller.classes[admission.STREAMS].active == 1
+    assert admission.controller.active == active + 1
+
+    response.close()
+    assert admission.controller.active == active
+
+
+def test_running_export_leaves_history_its_slots(admin_client, client, monkeypatch):
+    monkeypatch.setattr(admission.controller, 'enabled', True)
+
+    export = admin_client.get('/api/orders/export')
+    assert export.status_code == 200
+    assert admission.controller.classes[admission.EXPORTS].active == 1
+
+    assert client.get('/history').status_code == 200
+    assert client.get('/api/history').status_code == 200
+
+    export.close()
+    assert admission.controller.classes[admission.EXPORTS].active == 0
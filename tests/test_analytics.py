@@ -0,0 +1,87 @@
+"""The analytics APIs agree with the same numbers worked out in Python from every order, and new orders clear the cached dashboard"""
+
+from collections import Counter, defaultdict
+
+import pytest
+
+import app as lunch_app
+
+BASKETS = [{'sandwich': 'BLT', 'crisp': 'BBQ', 'snack': 'Apple'},
+           {'sandwich': 'Prawn Mayo', 'crisp': 'Paprika', 'snack': 'Cookie'},
+           {'sandwich': 'Egg Mayo', 'crisp': 'BBQ', 'snack': 'Banana'}]
+
+
+@pytest.fixture
+def expected(app, admin_client):
+    """Place a mix of orders, then total every order in Python"""
+    admin_client.post('/api/orders', json={'orders': BASKETS})
+    admin_client.post('/api/catering-orders', json={
+        'customer_name': 'Analytics Ltd', 'lines': [dict(BASKETS[1], quantity=4), dict(BASKETS[2], quantity=2)]})
+
+    with app.app_context():
+        lunch_app.dashboard_cache.invalidate()
+        items = {item.id: item for item in lunch_app.MenuItem.query}
+        totals = {'orders': 0, 'offers': 0, 'revenue_pence': 0, 'savings_pence': 0}
+        daily = defaultdict(lambda: [0, 0])
+        counts = Counter()
+        for order in lunch_app.Order.query:
+            totals['orders'] += order.quantity
+            totals['offers'] += order.quantity if order.offer_applied else 0
+            totals['revenue_pence'] += order.total_pence
+            totals['savings_pence'] += order.savings_pence
+            day = daily[order.order_date.date().isoformat()]
+            day[0] += order.total_pence
+            day[1] += order.quantity
+            for item_id in (order.sandwich_id, order.crisps_id, order.snack_id):
+                counts[items[item_id].category, items[item_id].name] += order.quantity
+    return {'totals': totals, 'daily': daily, 'counts': counts}
+
+
+def test_offer_stats(admin_client, expected):
+    data = admin_client.get('/api/analytics/offer-stats').get_json()['data']
+
+    totals = expected['totals']
+    assert data == [totals['offers'], totals['orders'] - totals['offers']]
+
+
+def test_daily_sales(admin_client, expected):
+    sales = admin_client.get('/api/analytics/daily-sales?days=3650').get_json()
+
+    in_range = {day: values for day, values in expected['daily'].items() if day >= sales['dates'][0]}
+    assert sales['dates'] == sorted(in_range)
+    assert sales['sales'] == [in_range[day][0] / 100 for day in sales['dates']]
+    assert sales['orders'] == [in_range[day][1] for day in sales['dates']]
+
+
+def test_top_items(admin_client, expected):
+    top = admin_client.get('/api/analytics/top-items').get_json()
+
+    for category, key in (('sandwich', 'sandwiches'), ('crisps', 'crisps'), ('snack', 'snacks')):
+        ranked = sorted(((name, count) for (item_category, name), count in expected['counts'].items()
+                         if item_category == category), key=lambda item: (-item[1], item[0]))[:5]
+        assert top[key] == {'labels': [name for name, _ in ranked], 'data': [count for _, count in ranked]}
+
+
+def test_dashboard_stats(admin_client, expected):
+    stats = admin_client.get('/api/analytics/dashboard?days=3650').get_json()['stats']
+
+    totals = expected['totals']
+    assert stats['total_orders'] == totals['orders']
+    assert stats['offers_applied'] == totals['offers']
+    assert stats['total_revenue'] == totals['revenue_pence'] / 100
+    assert stats['total_savings'] == totals['savings_pence'] / 100
+
+
+def test_dashboard_cache_is_cleared_by_new_orders(admin_client):
+    url = '/api/analytics/dashboard?days=3650'
+    before = admin_client.get(url).get_json()['stats']
+    hits = lunch_app.dashboard_cache.hits
+    assert admin_client.get(url).get_json()['stats'] == before
+    assert lunch_app.dashboard_cache.hits == hits + 1
+
+    admin_client.post('/api/orders', json={'orders': BASKETS[:2]})
+    admin_client.post('/calculate', data=BASKETS[2])
+
+    after = admin_client.get(url).get_json()['stats']
+    assert after['total_orders'] == before['total_orders'] + 3
+    assert after['total_revenue'] > before['total_revenue']
@@ -0,0 +1,68 @@
+"""JSON APIs answer malformed input with a 400, never a 500, and quote what they charge"""
+
+import pytest
+
+import app as lunch_app
+import promotions
+
+
+@pytest.mark.parametrize('basket', [
+    {'sandwich': ['BLT'], 'crisp': 'Ready Salted', 'snack': 'Apple'},
+    {'sandwich': {'a': 1}, 'crisp': 'Ready Salted', 'snack': 'Apple'},
+    {'sandwich': 'BLT', 'crisp': 'Ready Salted', 'snack': ['Apple']},
+])
+def test_quote_rejects_item_that_is_not_a_name(client, basket):
+    response = client.post('/api/quote', json={'baskets': [basket]})
+
+    assert response.status_code == 200
+    quote = response.get_json()['quotes'][0]
+    assert 'error' in quote
+    assert response.get_json()['totals']['errors'] == 1
+
+
+def test_quote_rejects_location_that_is_not_a_name(client):
+    response = client.post('/api/quote', json={'baskets': [], 'location': ['x']})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('headers', [{}, {'Idempotency-Key': 'malformed-basket'}])
+def test_orders_reject_item_that_is_not_a_name(client, statements, headers):
+    payload = {'orders': [{'sandwich': 'BLT', 'crisp': 'Ready Salted', 'snack': 'Apple'},
+                          {'sandwich': {'a': 1}, 'crisp': ['Ready Salted'], 'snack': 'Apple'}]}
+
+    response = client.post('/api/orders', json=payload, headers=headers)
+
+    assert response.status_code == 400
+    errors = response.get_json()['errors']
+    assert [error['index'] for error in errors] == [1]
+    assert errors[0]['category'] == 'sandwich'
+    assert not any(statement.lstrip().startswith('INSERT INTO "order"') for statement in statements)
+
+
+@pytest.fixture
+def banana_multi_buy(app):
+    """3 Bananas for £2.00, live for the test"""
+    with app.app_context():
+        banana = lunch_app.MenuItem.query.filter_by(name='Banana').one()
+        rule = lunch_app.PromotionRule(name='Banana 3 for £2', kind=promotions.MULTI_BUY, price=2.00,
+                                       item_id=banana.id, applies_to='item', min_quantity=3)
+        lunch_app.db.session.add(rule)
+        lunch_app.commit_menu_change()
+        yield rule
+        lunch_app.db.session.delete(rule)
+        lunch_app.commit_menu_change()
+
+
+def test_quote_totals_match_the_charge_with_a_multi_buy(client, banana_multi_buy):
+    # Premium sandwiches don't get the meal deal, so every basket counts towards the multi-buy
+    batch = [{'sandwich': 'Prawn Mayo', 'crisp': 'BBQ', 'snack': 'Banana'},
+             {'sandwich': 'Steak & Onion', 'crisp': 'BBQ', 'snack': 'Banana'},
+             {'sandwich': 'Prawn Mayo', 'crisp': 'Paprika', 'snack': 'Banana'}]
+
+    quoted = client.post('/api/quote', json={'baskets': batch}).get_json()['totals']
+    placed = client.post('/api/orders', json={'orders': batch}).get_json()
+
+    assert quoted['savings'] == 1.00
+    assert quoted['total'] == placed['total']
+    assert quoted['savings'] == sum(order['savings'] for order in placed['orders'])
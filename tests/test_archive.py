@@ -0,0 +1,68 @@
+"""Orders back-dated into archived days still reach the archive report"""
+
+from datetime import date, datetime
+
+import pytest
+
+import app as lunch_app
+
+pytest.importorskip('numpy')
+
+ARCHIVE_END = date(2020, 1, 10)
+
+
+def record(order_date, sandwich='BLT'):
+    return {'order_date': order_date, 'sandwich': sandwich, 'crisps': 'Ready Salted', 'snack': 'Apple',
+            'sandwich_price': 2.5, 'crisps_price': 0.75, 'snack_price': 0.5, 'total_price': 3.75,
+            'savings': 0, 'offer_applied': False, 'quantity': 1}
+
+
+@pytest.fixture
+def archive(app):
+    with app.app_context():
+        yield lunch_app.order_archive
+        lunch_app.order_archive.clear()
+        lunch_app.Order.query.filter(lunch_app.Order.order_date < datetime(2020, 2, 1)).delete()
+        for model in (lunch_app.DailyItemSales, lunch_app.DailySales):
+            model.query.filter(model.day < date(2020, 2, 1)).delete()
+        lunch_app.db.session.commit()
+
+
+def report():
+    return lunch_app.get_archive_report(date(2019, 12, 1), ARCHIVE_END)
+
+
+def test_back_dated_orders_are_reported_and_compacted(archive):
+    lunch_app.import_orders([record(datetime(2020, 1, 6, 12)), record(datetime(2020, 1, 7, 12))])
+    assert lunch_app.compact_orders(before=ARCHIVE_END) == 2
+    assert report()['stats']['total_orders'] == 2
+
+    # One order for an archived day, one for a day before the archive began
+    lunch_app.import_orders([record(datetime(2020, 1, 6, 13), 'Club'), record(datetime(2019, 12, 30, 12))])
+
+    live = report()
+    assert live['stats']['total_orders'] == 4
+    assert live['daily_sales']['dates'] == ['2019-12-30', '2020-01-06', '2020-01-07']
+    assert live['daily_sales']['orders'] == [1, 2, 1]
+    assert live['top_items']['sandwiches'] == {'labels': ['BLT', 'Club'], 'data': [3, 1]}
+
+    # compact-orders rewrites the affected segment rather than leaving the days to SQL
+    assert lunch_app.compact_orders(before=ARCHIVE_END) == 4
+    watermark = archive.watermark()
+    assert lunch_app.stale_archive_days(archive.daily_totals(None, watermark), None, watermark) == []
+    assert sum(row[1] for row in archive.daily_totals().values()) == 4
+    assert report() == live
+
+
+def test_archived_day_missing_from_the_database_is_dropped(archive):
+    lunch_app.import_orders([record(datetime(2020, 1, 6, 12)), record(datetime(2020, 1, 7, 12))])
+    lunch_app.compact_orders(before=ARCHIVE_END)
+
+    day = date(2020, 1, 7)
+    lunch_app.Order.query.filter(lunch_app.Order.order_date >= datetime(2020, 1, 7),
+                                 lunch_app.Order.order_date < datetime(2020, 1, 8)).delete()
+    lunch_app.rebuild_rollups()
+
+    assert report()['daily_sales']['dates'] == ['2020-01-06']
+    lunch_app.compact_orders(before=ARCHIVE_END)
+    assert day not in archive.daily_totals()
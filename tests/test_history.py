@@ -0,0 +1,54 @@
+"""Order history pages by (order_date, id) keyset: every order exactly once, newest first"""
+
+from datetime import datetime
+
+import app as lunch_app
+
+# Orders sharing a timestamp, so pages have to break ties on id
+SAME_TIME = datetime(2021, 3, 1, 12, 30)
+
+
+def seed_same_time_orders(app, count=7):
+    with app.app_context():
+        lunch_app.import_orders([{
+            'order_date': SAME_TIME, 'sandwich': 'BLT', 'crisps': 'BBQ', 'snack': 'Apple',
+            'sandwich_price': 3.5, 'crisps_price': 1.5, 'snack_price': 1.0, 'total_price': 5.0,
+            'savings': 1.0, 'offer_applied': True, 'quantity': 1,
+        } for _ in range(count)])
+        return [(row.order_date, row.id) for row in lunch_app.Order.query.order_by(
+            lunch_app.Order.order_date.desc(), lunch_app.Order.id.desc())]
+
+
+def test_pages_cover_every_order_once_in_order(app, client):
+    expected = seed_same_time_orders(app)
+
+    seen = []
+    cursor = None
+    while True:
+        query = {'limit': 3, 'cursor': cursor} if cursor else {'limit': 3}
+        response = client.get('/api/history', query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['orders']) <= 3
+        seen.extend((datetime.fromisoformat(order['order_date']), order['id']) for order in page['orders'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_invalid_cursor_is_a_400(client):
+    assert client.get('/api/history?cursor=not-a-cursor').status_code == 400
+
+
+def test_stats_match_the_orders(app, client):
+    seed_same_time_orders(app, count=2)
+    with app.app_context():
+        meals, revenue_pence = lunch_app.db.session.query(
+            lunch_app.func.sum(lunch_app.Order.quantity), lunch_app.func.sum(lunch_app.Order.total_pence)).one()
+
+    stats = client.get('/api/history?limit=1').get_json()['stats']
+
+    assert stats['total_orders'] == meals
+    assert stats['total_revenue'] == revenue_pence / 100
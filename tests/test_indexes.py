@@ -0,0 +1,28 @@
+"""The hot read queries use the model indexes (EXPLAIN QUERY PLAN on a fresh schema)"""
+
+import pytest
+
+import app as lunch_app
+
+EXPECTED_INDEXES = {
+    'history first page': 'ix_order_order_date_id',
+    'history later page': 'ix_order_order_date_id',
+    'orders in a date range': 'ix_order_order_date_id',
+    'active menu items': 'ix_menu_item_is_active_category',
+}
+
+
+@pytest.fixture
+def plans(app):
+    with app.app_context():
+        return {description: lunch_app.explain_query(statement)
+                for description, statement in lunch_app.hot_queries()}
+
+
+@pytest.mark.parametrize('description, index', sorted(EXPECTED_INDEXES.items()))
+def test_hot_query_uses_index(plans, description, index):
+    assert any(f'INDEX {index}' in line for line in plans[description]), plans[description]
+
+
+def test_no_hot_query_scans_every_order(plans):
+    assert [description for description, plan in plans.items() if lunch_app.is_full_scan(plan, 'order')] == []
@@ -0,0 +1,65 @@
+"""lunch_menu.py --batch prices a CSV of baskets and appends the totals"""
+
+import csv
+import io
+
+import lunch_menu
+
+
+def batch(tmp_path, capsys, text):
+    path = tmp_path / 'baskets.csv'
+    path.write_text(text, encoding='utf-8')
+    try:
+        lunch_menu.cli(['--batch', str(path)])
+        code = 0
+    except SystemExit as e:
+        code = e.code
+    output = capsys.readouterr().out
+    rows = list(csv.reader(line for line in output.splitlines() if not line.startswith('#')))
+    totals = [line for line in output.splitlines() if line.startswith('#')]
+    return code, rows, totals
+
+
+def test_batch_prices_each_line_and_totals_in_pence(tmp_path, capsys):
+    code, rows, totals = batch(tmp_path, capsys, 'BLT,BBQ,Apple\n\nPrawn Mayo,Paprika,Kit Kat\n' * 3)
+
+    assert code == 0
+    assert rows[0] == ['line', 'sandwich', 'crisps', 'snack', 'offer_applied', 'total', 'savings', 'error']
+    assert rows[1] == ['1', 'BLT', 'BBQ', 'Apple', 'True', '5.00', '1.00', '']
+    assert rows[2] == ['3', 'Prawn Mayo', 'Paprika', 'Kit Kat', 'False', '8.00', '0.00', '']
+    assert len(rows) == 7
+    assert totals == ['# orders: 6', '# lunch offers applied: 3', '# revenue: £39.00',
+                      '# customer savings: £3.00', '# errors: 0']
+
+
+def test_batch_header_sets_column_order(tmp_path, capsys):
+    code, rows, _ = batch(tmp_path, capsys, 'snack,sandwich,crisps\nApple,BLT,BBQ\n')
+
+    assert code == 0
+    assert rows[1][:4] == ['2', 'BLT', 'BBQ', 'Apple']
+
+
+def test_batch_reports_unknown_items_and_exits_nonzero(tmp_path, capsys):
+    code, rows, totals = batch(tmp_path, capsys, 'BLT,BBQ,Apple\nNope,BBQ,Apple\nBLT,BBQ\n')
+
+    assert code == 1
+    assert rows[2] == ['2', 'Nope', 'BBQ', 'Apple', '', '', '', 'Unknown sandwich: Nope']
+    assert rows[3][0] == '3' and rows[3][-1]
+    assert totals[0] == '# orders: 1'
+    assert totals[-1] == '# errors: 2'
+
+
+def test_batch_is_a_stream():
+    source = iter(['BLT,BBQ,Apple\n'] * 3)
+    results = lunch_menu.price_baskets(lunch_menu.read_baskets(source), lunch_menu.QuoteTable(
+        lunch_menu.menu, lunch_menu.lunch_offer_price))
+
+    # Each basket is priced as it's read, not after the whole file
+    assert next(results)[0] == 1
+    assert len(list(source)) == 2
+
+
+def test_batch_reads_stdin(monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.StringIO('BLT,BBQ,Apple\n'))
+    lunch_menu.cli(['--batch', '-'])
+    assert '# orders: 1' in capsys.readouterr().out
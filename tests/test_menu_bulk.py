@@ -0,0 +1,44 @@
+"""Menu uploads with no items or unusable prices are rejected before anything is planned"""
+
+import pytest
+
+import app as lunch_app
+
+
+def active_items():
+    with lunch_app.app.app_context():
+        return lunch_app.MenuItem.query.filter_by(is_active=True).count()
+
+
+@pytest.mark.parametrize('body, fmt', [
+    (b'{"items": [{"name": "BLT", "category": "sandwich", "price": 3.5}]}', 'csv'),
+    (b'name,category,price,is_premium,is_active\n', 'csv'),
+    (b'', 'csv'),
+    (b'[]', 'json'),
+    (b'{"items": []}', 'json'),
+])
+def test_upload_without_items_changes_nothing(admin_client, body, fmt):
+    before = active_items()
+
+    response = admin_client.post(f'/api/menu/import?format={fmt}&deactivate_missing=1', data=body)
+
+    assert response.status_code == 400
+    assert active_items() == before
+
+
+@pytest.mark.parametrize('price', ['inf', '-inf', 'nan', '1e400'])
+def test_upload_with_non_finite_price_is_rejected(admin_client, price):
+    body = f'name,category,price\nBLT,sandwich,{price}\n'.encode()
+
+    response = admin_client.post('/api/menu/import?format=csv', data=body)
+
+    assert response.status_code == 400
+    with lunch_app.app.app_context():
+        assert lunch_app.MenuItem.query.filter_by(name='BLT').one().price == 3.50
+
+
+@pytest.mark.parametrize('percent', ['inf', 'nan'])
+def test_price_adjustment_by_non_finite_percent_is_rejected(admin_client, percent):
+    response = admin_client.post('/api/menu/adjust-prices', json={'category': 'crisps', 'percent': percent})
+
+    assert response.status_code == 400
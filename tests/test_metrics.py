@@ -0,0 +1,57 @@
+"""/metrics exposes per-route latency, status and SQL counts in the Prometheus text format"""
+
+import pytest
+
+import metrics
+
+
+def scrape(client):
+    """{series: value} from /metrics, e.g. {'lunchmenu_requests_total{...}': 3.0}"""
+    response = client.get('/metrics', headers={'Authorization': 'Bearer metrics-test'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    return {series: float(value) for series, _, value in
+            (line.rpartition(' ') for line in response.get_data(as_text=True).splitlines())
+            if series and not series.startswith('#')}
+
+
+@pytest.fixture
+def metrics_client(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'metrics-test')
+    return client
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram('demo_seconds', 'Demo', ('endpoint',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, 'menu')
+
+    assert histogram.render() == [
+        'demo_seconds_bucket{endpoint="menu",le="0.1"} 1',
+        'demo_seconds_bucket{endpoint="menu",le="1.0"} 3',
+        'demo_seconds_bucket{endpoint="menu",le="+Inf"} 4',
+        'demo_seconds_sum{endpoint="menu"} 6.05',
+        'demo_seconds_count{endpoint="menu"} 4',
+    ]
+
+
+def test_metrics_need_a_token_or_admin_session(app, admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'metrics-test')
+    anonymous = app.test_client()
+
+    assert anonymous.get('/metrics').status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert admin_client.get('/metrics').status_code == 200
+
+
+def test_request_is_counted_with_latency_and_sql(metrics_client):
+    requests = 'lunchmenu_requests_total{endpoint="menu",method="GET",status="200"}'
+    latency = 'lunchmenu_request_duration_seconds_count{endpoint="menu",method="GET"}'
+    sql = 'lunchmenu_request_sql_statements_count{endpoint="menu"}'
+    before = scrape(metrics_client)
+
+    assert metrics_client.get('/menu').status_code == 200
+
+    after = scrape(metrics_client)
+    for series in (requests, latency, sql):
+        assert after[series] == before.get(series, 0) + 1
@@ -0,0 +1,142 @@
+"""The live order feed reaches every subscriber: resumed streams, other workers and the asyncio server"""
+
+import asyncio
+import json
+import os
+import socket
+
+import pytest
+
+import app as lunch_app
+from order_feed import OrderFeed
+from order_feed_server import STREAM_PATH, FeedServer
+
+
+def events(chunk):
+    """(id, payload) for each SSE message in chunk"""
+    found = []
+    for message in chunk.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+        if 'data' in fields:
+            found.append((fields['id'], json.loads(fields['data'])))
+    return found
+
+
+def test_stream_resumes_after_last_event_id_and_filters_by_location():
+    feed = OrderFeed(size=3)
+    feed.publish([(1, {'n': 1})], location='Leeds')
+    feed.publish([(2, {'n': 2})], location='York')
+    feed.publish([(3, {'n': 3}), (4, {'n': 4})])
+
+    # 1 has left the ring buffer, so a screen that saw it gets everything still buffered
+    assert [event_id for event_id, _ in events(OrderFeed.select(feed.entries_after(feed.position('1'))))] == \
+        ['2', '3', '4']
+    assert [event_id for event_id, _ in events(OrderFeed.select(feed.entries_after(feed.position('2')),
+                                                                'Leeds'))] == ['3', '4']
+
+    stream = feed.stream('3', location='Leeds', heartbeat=0.01, max_seconds=0.05)
+    assert next(stream) == b'retry: 2000\n\n'
+    assert events(next(stream)) == [('4', {'n': 4})]
+    feed.close()
+    assert list(stream) == []
+
+
+def test_events_fan_out_to_other_workers(tmp_path):
+    feed = OrderFeed(socket_dir=str(tmp_path))
+    feed.start()
+    # Another worker is another process; a bare socket in the directory stands in for it
+    other = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    other.bind(str(tmp_path / '1.sock'))
+    other.settimeout(2.0)
+    try:
+        feed.publish([(7, {'n': 7})], location='Leeds')
+        message = other.recv(65536)
+        assert message.split(b'\n', 2)[:2] == [b'7', b'Leeds']
+
+        after = feed.position()
+        other.sendto(b'8\nYork\n' + OrderFeed.encode(8, {'n': 8}), str(tmp_path / f'{os.getpid()}.sock'))
+        entries = feed.wait(after, 2.0)
+        assert [(event_id, location) for _, event_id, location, _ in entries] == [('8', 'York')]
+        assert events(entries[0][3]) == [('8', {'n': 8})]
+    finally:
+        other.close()
+        feed.close()
+
+
+def test_flask_stream_sends_new_orders(admin_client, monkeypatch):
+    monkeypatch.setitem(lunch_app.app.config, 'ORDER_FEED_HEARTBEAT', 0.01)
+    response = admin_client.get('/stream/orders')
+    chunks = iter(response.response)
+    try:
+        assert response.mimetype == 'text/event-stream'
+        assert next(chunks) == b'retry: 2000\n\n'
+
+        lunch_app.app.test_client().post('/calculate', data={'sandwich': 'BLT', 'crisp': 'BBQ', 'snack': 'Apple'})
+
+        chunk = next(chunk for chunk in chunks if not chunk.startswith(b':'))
+        [(event_id, payload)] = events(chunk)
+        assert payload['id'] == int(event_id)
+        assert (payload['sandwich'], payload['crisps'], payload['snack']) == ('BLT', 'BBQ', 'Apple')
+    finally:
+        response.close()
+    assert lunch_app.order_feed.subscribers == 0
+
+
+def test_stream_needs_admin_or_token():
+    assert lunch_app.app.test_client().get('/stream/orders').status_code == 401
+
+
+@pytest.fixture
+def feed_server():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    feed = OrderFeed()
+    server = FeedServer(feed, token='screens', heartbeat=0.05, max_seconds=5)
+    yield server, port
+    feed.close()
+
+
+def test_feed_server_streams_to_many_clients(feed_server):
+    server, port = feed_server
+
+    async def subscribe():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {STREAM_PATH}?token=screens HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+        await writer.drain()
+        head = await reader.readuntil(b'retry: 2000\n\n')
+        return reader, writer, head
+
+    async def read_event(reader):
+        while True:
+            message = await reader.readuntil(b'\n\n')
+            if not message.startswith(b':'):
+                return events(message)
+
+    async def scenario():
+        serving = asyncio.create_task(server.serve('127.0.0.1', port))
+        for _ in range(100):
+            try:
+                clients = [await subscribe() for _ in range(3)]
+                break
+            except ConnectionRefusedError:
+                await asyncio.sleep(0.01)
+        try:
+            assert all(head.startswith(b'HTTP/1.1 200 OK') for _, _, head in clients)
+            assert server.subscribers == 3
+
+            unauthorized, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {STREAM_PATH} HTTP/1.1\r\n\r\n'.encode())
+            assert (await unauthorized.readline()).startswith(b'HTTP/1.1 401')
+            writer.close()
+
+            # Published from another thread, like an order arriving from a worker
+            await asyncio.to_thread(server.feed.publish, [(11, {'n': 11})])
+            received = await asyncio.wait_for(asyncio.gather(*(read_event(reader) for reader, _, _ in clients)), 5)
+            assert received == [[('11', {'n': 11})]] * 3
+        finally:
+            for _, writer, _ in clients:
+                writer.close()
+            serving.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+"""The write-behind queue writes every order in batches, retries failures and drains on shutdown"""
+
+import threading
+import time
+
+import pytest
+
+import app as lunch_app
+from order_queue import QueueFullError, WriteBehindQueue
+
+
+class Recorder:
+    """A flush function that records batches, failing the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database unavailable')
+        self.batches.append(list(batch))
+
+
+def test_entries_are_written_together_in_batches():
+    flush = Recorder()
+    queue = WriteBehindQueue(flush, batch_size=4, flush_interval=0.05)
+
+    for entry in range(5):
+        queue.submit([(entry, 'a'), (entry, 'b')])
+    assert queue.drain()
+
+    written = [item for batch in flush.batches for item in batch]
+    assert written == [(entry, part) for entry in range(5) for part in 'ab']
+    # A batch closes once it reaches batch_size, but never splits an entry
+    assert all(len(batch) <= 4 and len(batch) % 2 == 0 for batch in flush.batches)
+    assert queue.stats()['flushed'] == 10
+
+
+def test_failed_batch_is_retried_until_written():
+    flush = Recorder(failures=2)
+    queue = WriteBehindQueue(flush, flush_interval=0.01, retry_delay=0.01)
+
+    queue.submit(['order'])
+    assert queue.drain()
+
+    assert flush.batches == [['order']]
+    assert queue.stats()['flush_errors'] == 2
+
+
+def test_full_queue_pushes_back():
+    release = threading.Event()
+    queue = WriteBehindQueue(lambda batch: release.wait(), max_size=1, batch_size=1, flush_interval=0.01)
+
+    queue.submit(['first'])
+    while queue.stats()['queued']:
+        time.sleep(0.001)
+    # The writer is stuck on 'first': one more entry fits, the next one has to wait
+    queue.submit(['queued'])
+    with pytest.raises(QueueFullError):
+        queue.submit(['rejected'], timeout=0.01)
+    assert queue.stats()['rejected'] == 1
+
+    release.set()
+    assert queue.drain()
+
+
+def test_drain_stops_new_orders():
+    queue = WriteBehindQueue(Recorder(), flush_interval=0.01)
+    queue.submit(['order'])
+    assert queue.drain()
+
+    with pytest.raises(QueueFullError):
+        queue.submit(['late'])
+
+
+def test_queued_orders_and_rollups_are_committed_on_drain(app, client, monkeypatch):
+    queue = WriteBehindQueue(lunch_app.write_order_batch, flush_interval=0.5)
+    monkeypatch.setattr(lunch_app, 'order_queue', queue)
+    monkeypatch.setitem(app.config, 'ORDER_DURABILITY', 'write-behind')
+    with app.app_context():
+        meals_before = lunch_app.get_order_stats()['total_orders']
+
+    response = client.post('/api/orders', json={'orders': [
+        {'sandwich': 'BLT', 'crisp': 'BBQ', 'snack': 'Apple'},
+        {'sandwich': 'Egg Mayo', 'crisp': 'BBQ', 'snack': 'Apple'}]})
+    assert response.status_code == 201
+    ids = [order['id'] for order in response.get_json()['orders']]
+
+    assert queue.drain()
+    with app.app_context():
+        assert lunch_app.Order.query.filter(lunch_app.Order.id.in_(ids)).count() == 2
+        assert lunch_app.get_order_stats()['total_orders'] == meals_before + 2
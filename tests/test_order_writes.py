@@ -0,0 +1,65 @@
+"""Orders reach the database in one INSERT per request, with ids that never collide with queued ones"""
+
+from itertools import product
+
+import pytest
+
+import app as lunch_app
+from order_queue import WriteBehindQueue
+
+SANDWICHES = ('Ham & Cheese', 'Tuna Mayo', 'Chicken Salad', 'BLT', 'Egg Mayo')
+CRISPS = ('Ready Salted', 'Salt & Vinegar')
+
+
+def baskets(count):
+    return [{'sandwich': sandwich, 'crisp': crisp, 'snack': 'Apple'}
+            for sandwich, crisp in list(product(SANDWICHES, CRISPS))[:count]]
+
+
+def order_inserts(statements):
+    return [statement for statement in statements if statement.lstrip().startswith('INSERT INTO "order"')]
+
+
+def test_catering_order_lines_are_one_insert(admin_client, statements):
+    lines = [dict(basket, quantity=3) for basket in baskets(10)]
+
+    response = admin_client.post('/api/catering-orders', json={'customer_name': 'Acme', 'lines': lines})
+
+    assert response.status_code == 201
+    assert len(response.get_json()['lines']) == 10
+    assert len(order_inserts(statements)) == 1
+
+
+@pytest.mark.parametrize('headers', [{}, {'Idempotency-Key': 'one-insert-batch'}])
+def test_order_batch_is_one_insert(client, statements, headers):
+    response = client.post('/api/orders', json={'orders': baskets(10)}, headers=headers)
+
+    assert response.status_code == 201
+    ids = [order['id'] for order in response.get_json()['orders']]
+    assert len(set(ids)) == 10
+    assert len(order_inserts(statements)) == 1
+
+
+@pytest.fixture
+def write_behind(app, monkeypatch):
+    """Queue plain orders like ORDER_DURABILITY=write-behind; the queue holds a batch for half a second"""
+    queue = WriteBehindQueue(lunch_app.write_order_batch, flush_interval=0.5)
+    monkeypatch.setattr(lunch_app, 'order_queue', queue)
+    monkeypatch.setitem(app.config, 'ORDER_DURABILITY', 'write-behind')
+    yield queue
+    queue.drain()
+
+
+def test_idempotent_and_queued_orders_get_distinct_ids(client, write_behind):
+    queued = client.post('/api/orders', json=baskets(1)[0])
+    keyed = client.post('/api/orders', json=baskets(2)[1], headers={'Idempotency-Key': 'write-behind-mix'})
+    queued_again = client.post('/api/orders', json=baskets(3)[2])
+
+    assert [response.status_code for response in (queued, keyed, queued_again)] == [201, 201, 201]
+    ids = [response.get_json()['orders'][0]['id'] for response in (queued, keyed, queued_again)]
+    assert len(set(ids)) == 3
+
+    assert write_behind.drain()
+    assert write_behind.stats()['flush_errors'] == 0
+    with lunch_app.app.app_context():
+        assert lunch_app.Order.query.filter(lunch_app.Order.id.in_(ids)).count() == 3
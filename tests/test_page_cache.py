@@ -0,0 +1,68 @@
+"""Rendered pages are cached with ETags, and static URLs change with the file contents"""
+
+import gzip
+import hashlib
+import os
+import re
+
+import app as lunch_app
+
+
+def test_static_urls_carry_content_hash(client):
+    body = client.get('/').get_data(as_text=True)
+
+    link = re.search(r'href="(/static/css/style\.css\?v=(\w+))"', body)
+    assert link is not None
+    with open(os.path.join(lunch_app.app.static_folder, 'css', 'style.css'), 'rb') as f:
+        assert link.group(2) == hashlib.sha256(f.read()).hexdigest()[:12]
+    assert client.get(link.group(1)).status_code == 200
+
+
+def test_missing_static_file_gets_no_version(app):
+    with app.test_request_context():
+        assert lunch_app.url_for('static', filename='css/missing.css') == '/static/css/missing.css'
+        assert '?v=' not in lunch_app.url_for('static', filename='../app.py')
+
+
+def test_repeat_request_with_etag_gets_304(client):
+    first = client.get('/about')
+    assert first.status_code == 200
+    assert first.headers['ETag']
+    assert first.headers['Cache-Control'] == f"public, max-age={lunch_app.app.config['PAGE_CACHE_MAX_AGE']}"
+    assert 'Accept-Encoding' in first.headers['Vary']
+
+    again = client.get('/about', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_gzip_variant_has_its_own_etag(client):
+    plain = client.get('/about')
+    zipped = client.get('/about', headers={'Accept-Encoding': 'gzip'})
+
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    # The plain ETag doesn't validate the gzipped copy
+    assert client.get('/about', headers={'Accept-Encoding': 'gzip',
+                                         'If-None-Match': plain.headers['ETag']}).status_code == 200
+
+
+def test_menu_change_changes_the_etag(client):
+    first = client.get('/menu')
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+
+    with lunch_app.app.app_context():
+        item = lunch_app.MenuItem.query.filter_by(category='sandwich', is_active=True).first()
+        name, item.name = item.name, item.name + ' Deluxe'
+        lunch_app.commit_menu_change()
+    try:
+        changed = client.get('/menu', headers={'If-None-Match': first.headers['ETag']})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != first.headers['ETag']
+        assert b' Deluxe' in changed.data
+    finally:
+        with lunch_app.app.app_context():
+            lunch_app.MenuItem.query.filter_by(name=name + ' Deluxe').update({'name': name})
+            lunch_app.commit_menu_change()
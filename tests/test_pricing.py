@@ -0,0 +1,78 @@
+"""Orders are priced from one menu snapshot (at most one menu query per order), and multi-buys"""
+
+import re
+from types import SimpleNamespace
+
+import app as lunch_app
+from pricing import QuoteTable, to_pence
+
+MENU_QUERY = re.compile(r'\bFROM menu_item\b')
+
+
+def menu_queries(statements):
+    return [statement for statement in statements if MENU_QUERY.search(statement)]
+
+
+def basket():
+    with lunch_app.app.app_context():
+        menu = lunch_app.menu_cache.get()
+    return {'sandwich': next(iter(menu.sandwiches)), 'crisp': next(iter(menu.crisps)), 'snack': next(iter(menu.snacks))}
+
+
+def test_order_on_cold_cache_reads_menu_once(client, statements):
+    form = basket()
+    lunch_app.menu_cache.invalidate()
+    statements.clear()
+
+    response = client.post('/calculate', data=form)
+
+    assert response.status_code == 200
+    assert any(statement.lstrip().startswith('INSERT INTO "order"') for statement in statements)
+    assert len(menu_queries(statements)) <= 1
+
+
+def test_order_on_warm_cache_reads_no_menu(client, statements):
+    form = basket()
+    client.post('/calculate', data=form)
+    statements.clear()
+
+    response = client.post('/calculate', data=form)
+
+    assert response.status_code == 200
+    assert menu_queries(statements) == []
+
+
+def snack_multi_buy_table(offer_price):
+    """A small menu where 3 Apples cost £1.00 instead of £1.50"""
+    menu = SimpleNamespace(sandwiches={'BLT': 3.00, 'Club': 4.00}, crisps={'Plain': 0.80, 'BBQ': 0.90},
+                           snacks={'Apple': 0.50, 'Cookie': 1.20}, premium_sandwiches=set())
+    return QuoteTable(menu, offer_price, multi_buys={'Apple': (3, 1.00)})
+
+
+def test_multi_buy_counts_item_across_order_lines():
+    table = snack_multi_buy_table({})
+    lines = [(table.quote('BLT', 'Plain', 'Apple'), 1), (table.quote('Club', 'BBQ', 'Apple'), 1),
+             (table.quote('BLT', 'BBQ', 'Apple'), 2), (table.quote('Club', 'Plain', 'Cookie'), 1)]
+
+    pence = table.order_pence(lines)
+
+    regular = sum(to_pence(quote.total) * quantity for quote, quantity in lines)
+    assert sum(total for total, _ in pence) == regular - 50
+    assert sum(savings for _, savings in pence) == 50
+    assert pence[3] == (to_pence(lines[3][0].total), 0)
+
+
+def test_multi_buy_on_one_line_matches_group_count():
+    table = snack_multi_buy_table({})
+
+    assert table.order_pence([(table.quote('BLT', 'Plain', 'Apple'), 7)]) == [(7 * 430 - 100, 100)]
+
+
+def test_multi_buy_skips_lines_with_the_meal_deal():
+    table = snack_multi_buy_table({'Club': 4.50})
+    deal = table.quote('Club', 'BBQ', 'Apple')
+    assert deal.offer_applied
+
+    pence = table.order_pence([(table.quote('BLT', 'Plain', 'Apple'), 2), (deal, 5)])
+
+    assert sum(savings for _, savings in pence) == to_pence(deal.savings) * 5
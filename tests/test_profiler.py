@@ -0,0 +1,75 @@
+"""The request profiler records exactly the requests it was armed for, and nothing once disarmed"""
+
+import marshal
+
+import pytest
+
+import app as lunch_app
+
+
+@pytest.fixture
+def profiler(admin_client):
+    profiler = lunch_app.request_profiler
+    profiler.clear()
+    yield profiler
+    profiler.disarm()
+    profiler.clear()
+
+
+def get(client, url):
+    # Closing the response is what ends its profile (bodies may still be streaming until then)
+    response = client.get(url)
+    response.close()
+    return response
+
+
+def test_count_limited_arm_profiles_that_many_requests(admin_client, profiler):
+    response = admin_client.post('/admin/profiler/arm', data={'endpoint': 'about', 'count': '2'})
+    assert response.status_code == 302
+    assert profiler.state()['endpoint'] == 'about'
+    assert lunch_app.app.wsgi_app == profiler._profiled_wsgi_app
+
+    get(admin_client, '/')
+    for _ in range(3):
+        assert get(admin_client, '/about').status_code == 200
+
+    assert list(profiler.profiles()) == ['about']
+    assert profiler.profiles()['about']['requests'] == 2
+
+    prof = admin_client.get('/admin/profiler/about.prof')
+    assert prof.status_code == 200
+    assert any(function == 'about' for _, _, function in marshal.loads(prof.data))
+    assert admin_client.get('/admin/profiler/about.collapsed').status_code == 200
+    assert 'about' in admin_client.get('/admin/profiler?show=about').get_data(as_text=True)
+    assert admin_client.get('/admin/profiler/home.prof').status_code == 404
+
+
+def test_disarm_removes_the_wrapper(admin_client, profiler):
+    profiler.arm('about')
+    get(admin_client, '/about')
+    admin_client.post('/admin/profiler/disarm')
+
+    assert profiler.state() is None
+    assert lunch_app.app.wsgi_app == profiler._plain_wsgi_app
+    get(admin_client, '/about')
+    assert profiler.profiles()['about']['requests'] == 1
+
+    admin_client.post('/admin/profiler/clear')
+    assert profiler.profiles() == {}
+
+
+def test_arm_rejects_bad_settings(profiler):
+    with pytest.raises(ValueError):
+        profiler.arm('no_such_endpoint')
+    with pytest.raises(ValueError):
+        profiler.arm('about', rate=0)
+    with pytest.raises(ValueError):
+        profiler.arm('about', count=0)
+    assert profiler.state() is None
+
+
+def test_profiler_pages_need_admin(app, profiler):
+    anonymous = app.test_client()
+    assert anonymous.post('/admin/profiler/arm', data={'endpoint': 'about'}).status_code == 302
+    assert profiler.state() is None
+    assert anonymous.get('/admin/profiler/about.prof').status_code == 302
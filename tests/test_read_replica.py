@@ -0,0 +1,97 @@
+"""Reporting reads go to the replica, except for sessions that wrote within the lag window"""
+
+import time
+
+import pytest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+
+import read_replica
+
+
+@pytest.fixture
+def pair(tmp_path):
+    """A small app on a primary and a 'replica' SQLite file that start out different"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'primary.db'}"
+    app.config['SQLALCHEMY_BINDS'] = {read_replica.REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"}
+    app.config['DATABASE_REPLICA_LAG_WINDOW'] = 10
+    db = SQLAlchemy(app, session_options={'class_': read_replica.RoutingSession, 'replica_tables': {'note'}})
+    read_replica.init_app(app)
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(20))
+
+    class Setting(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+
+    @app.route('/notes')
+    @read_replica.replica_reads
+    def notes():
+        return jsonify(notes=[note.text for note in Note.query.order_by(Note.id)],
+                       settings=Setting.query.count(), replica=read_replica.reading_replica())
+
+    @app.route('/notes', methods=['POST'])
+    def add_note():
+        db.session.add(Note(text='new'))
+        db.session.commit()
+        return '', 204
+
+    @app.route('/later', methods=['POST'])
+    def later():
+        read_replica.note_write()
+        return '', 204
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Note(text='primary'), Setting()])
+        db.session.commit()
+        with db.engines[read_replica.REPLICA_BIND].begin() as conn:
+            Note.__table__.create(conn)
+            conn.execute(Note.__table__.insert(), [{'text': 'replica'}])
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def routed(database):
+    return read_replica.routed_requests._values.get((database,), 0)
+
+
+def test_reads_go_to_the_replica(pair):
+    before = routed('replica')
+
+    data = pair.test_client().get('/notes').get_json()
+
+    assert data == {'notes': ['replica'], 'settings': 1, 'replica': True}
+    assert routed('replica') == before + 1
+
+
+def test_session_reads_primary_after_writing(pair, monkeypatch):
+    client = pair.test_client()
+    assert client.post('/notes').status_code == 204
+    before = routed('primary')
+
+    assert client.get('/notes').get_json()['notes'] == ['primary', 'new']
+    assert routed('primary') == before + 1
+    # Other sessions, and this one once the lag window has passed, read the replica
+    assert pair.test_client().get('/notes').get_json()['notes'] == ['replica']
+    now = time.time()
+    monkeypatch.setattr(read_replica.time, 'time', lambda: now + 11)
+    assert client.get('/notes').get_json()['notes'] == ['replica']
+
+
+def test_note_write_marks_the_session(pair):
+    client = pair.test_client()
+    client.post('/later')
+
+    assert client.get('/notes').get_json()['replica'] is False
+
+
+def test_no_replica_configured_reads_primary(pair):
+    del pair.config['SQLALCHEMY_BINDS']
+
+    assert pair.test_client().get('/notes').get_json()['replica'] is False
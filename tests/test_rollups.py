@@ -0,0 +1,33 @@
+"""The rollups each order path maintains in place match a full rebuild from the Order table"""
+
+from datetime import datetime
+
+import app as lunch_app
+
+
+def rollup_rows():
+    sales = sorted((row.day, row.revenue_pence, row.order_count, row.offer_count, row.savings_pence)
+                   for row in lunch_app.DailySales.query)
+    items = sorted((row.day, row.item_id, row.count) for row in lunch_app.DailyItemSales.query)
+    return sales, items
+
+
+def test_incremental_rollups_match_rebuild(app, client, admin_client):
+    basket = {'sandwich': 'Tuna Mayo', 'crisp': 'Sour Cream', 'snack': 'Brownie'}
+    client.post('/calculate', data=basket)
+    client.post('/calculate', data=basket)
+    client.post('/api/orders', json={'orders': [basket, dict(basket, sandwich='Steak & Onion')]})
+    admin_client.post('/api/catering-orders', json={'customer_name': 'Rollup Co',
+                                                    'lines': [dict(basket, quantity=6)]})
+    with app.app_context():
+        # An imported order for a day that has no rollup row yet, and one for a day that does
+        lunch_app.import_orders([{
+            'order_date': order_date, 'sandwich': 'Tuna Mayo', 'crisps': 'Sour Cream', 'snack': 'Brownie',
+            'sandwich_price': 3.5, 'crisps_price': 1.5, 'snack_price': 2.0, 'total_price': 7.0,
+            'savings': 0, 'offer_applied': False, 'quantity': 2,
+        } for order_date in (datetime(2022, 6, 1, 12), datetime.utcnow())])
+
+        incremental = rollup_rows()
+        assert lunch_app.rebuild_rollups(check_only=True) == []
+        lunch_app.rebuild_rollups()
+        assert rollup_rows() == incremental